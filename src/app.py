@@ -1,12 +1,19 @@
+import logging
 import os
-from flask import Flask, send_from_directory, request, jsonify
+from flask import Flask, Response, send_from_directory, request, jsonify
 from flask_cors import CORS
 import work_calculate_ways.pathFinding as pathFinding
+from work_calculate_ways import metrics
 import json
+from work_calculate_ways.graphStore import graph_artifact_path
 from routes.api_routes import api_bp
 from routes.map_routes import map_bp
+from db import DB
 import city
 
+# LOG_LEVEL=DEBUG מציג גם את זמני השלבים ואת פרטי החיפושים של כל בקשה
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
 app = Flask(__name__)
 CORS(app)
 
@@ -29,6 +36,21 @@ def serve_expo_assets(path):
 app.register_blueprint(api_bp, url_prefix='/api')
 app.register_blueprint(map_bp)
 
+# טעינת גרף העיר מקובץ שנבנה מראש (python -m work_calculate_ways.graphStore) כבר בעליית השרת
+if os.path.exists(graph_artifact_path(city.city_name)):
+    pathFinding.init_graph_from_city()
+
+# היסטוגרמות של זמני השלבים והחיפושים בפורמט של Prometheus
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# בדיקת חיות לטוען העומס: עונה 503 כשמסד הנתונים לא זמין
+@app.route('/health')
+def health():
+    db_ok = DB.check_health()
+    return jsonify({"db": "ok" if db_ok else "unavailable"}), 200 if db_ok else 503
+
 # נתיב לשרת את ה-favicon
 @app.route('/favicon.ico')
 def favicon():
@@ -0,0 +1,102 @@
+import json
+import math
+import os
+
+# Synthetic cities for the benchmarks, written as fixtures in the same layout that
+# benchmarks/fixtures.py records from the real APIs:
+#   overpass.json   Overpass "out geom" response with the road ways
+#   elevation.json  [[lon, lat, elevation], ...] for every way point
+#   nominatim.json  {"bbox": [...], "addresses": {address: [lat, lon]}, "route": [start, end]}
+# Ways are written one at a time, so even the 1M node cities never sit in memory whole.
+ORIGIN = (31.60, 34.50)  # lat, lon
+SPACING_M = 80
+METERS_PER_DEGREE = 6371000 * math.pi / 180
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def terrain(lat, lon):
+    """Rolling hills about 2 km apart, with slopes up to about 6 degrees."""
+    return round(35 + 25 * math.sin(lat * 330) * math.cos(lon * 280), 1)
+
+
+def _offset(north_m, east_m):
+    lat = ORIGIN[0] + north_m / METERS_PER_DEGREE
+    lon = ORIGIN[1] + east_m / (METERS_PER_DEGREE * math.cos(math.radians(ORIGIN[0])))
+    # rounded, so that a crossing computed from two ways is the same node
+    return round(lat, 7), round(lon, 7)
+
+
+def grid_ways(nodes):
+    """A square street grid with about `nodes` crossings; every fifth street is a main road."""
+    side = max(2, round(math.sqrt(nodes)))
+    points = [[_offset(i * SPACING_M, j * SPACING_M) for j in range(side)] for i in range(side)]
+    for i in range(side):
+        highway = "secondary" if i % 5 == 0 else "residential"
+        yield f"Row {i}", highway, points[i]
+        yield f"Column {i}", highway, [row[i] for row in points]
+
+
+def radial_ways(nodes):
+    """Spokes out of a center crossed by ring roads, about `nodes` crossings in total."""
+    spokes = max(4, round(math.sqrt(nodes)))
+    rings = max(1, round(nodes / spokes))
+    points = [[_offset((r + 1) * SPACING_M * math.cos(2 * math.pi * s / spokes),
+                       (r + 1) * SPACING_M * math.sin(2 * math.pi * s / spokes))
+               for r in range(rings)] for s in range(spokes)]
+    center = _offset(0, 0)
+    for s in range(spokes):
+        yield f"Spoke {s}", "secondary" if s % 4 == 0 else "residential", [center] + points[s]
+    for r in range(rings):
+        ring = [points[s][r] for s in range(spokes)]
+        yield f"Ring {r}", "tertiary" if r % 5 == 0 else "residential", ring + ring[:1]
+
+
+LAYOUTS = {"grid": grid_ways, "radial": radial_ways}
+
+
+def write_city(directory, layout, nodes):
+    """Write the fixture of a synthetic city into directory. Returns its nominatim.json content."""
+    os.makedirs(directory, exist_ok=True)
+    bbox = [math.inf, math.inf, -math.inf, -math.inf]
+    seen = set()
+    with open(os.path.join(directory, "overpass.json"), "w", encoding="utf-8") as overpass, \
+            open(os.path.join(directory, "elevation.json"), "w", encoding="utf-8") as elevation:
+        overpass.write('{"version": 0.6, "generator": "benchmarks.cities", "elements": [\n')
+        elevation.write("[\n")
+        first_way = first_point = True
+        for way_id, (name, highway, points) in enumerate(LAYOUTS[layout](nodes), start=1):
+            lats = [lat for lat, _ in points]
+            lons = [lon for _, lon in points]
+            bbox = [min(bbox[0], *lats), min(bbox[1], *lons), max(bbox[2], *lats), max(bbox[3], *lons)]
+            way = {"type": "way", "id": way_id,
+                   "bounds": {"minlat": min(lats), "minlon": min(lons), "maxlat": max(lats), "maxlon": max(lons)},
+                   "geometry": [{"lat": lat, "lon": lon} for lat, lon in points],
+                   "tags": {"highway": highway, "name": name}}
+            overpass.write(("" if first_way else ",\n") + json.dumps(way, ensure_ascii=False))
+            first_way = False
+            for lat, lon in points:
+                if (lon, lat) in seen:
+                    continue
+                seen.add((lon, lat))
+                elevation.write(("" if first_point else ",\n") + json.dumps([lon, lat, terrain(lat, lon)]))
+                first_point = False
+        overpass.write("\n]}\n")
+        elevation.write("\n]\n")
+
+    # the route runs between opposite corners, a tenth of the way in
+    lat_span, lon_span = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    start = [bbox[0] + lat_span * 0.1, bbox[1] + lon_span * 0.1]
+    end = [bbox[2] - lat_span * 0.1, bbox[3] - lon_span * 0.1]
+    nominatim = {"bbox": bbox, "addresses": {"benchmark start": start, "benchmark end": end},
+                 "route": ["benchmark start", "benchmark end"]}
+    with open(os.path.join(directory, "nominatim.json"), "w", encoding="utf-8") as f:
+        json.dump(nominatim, f, ensure_ascii=False, indent=1)
+    return nominatim
+
+
+def city_fixture(cache_dir, layout, size):
+    """The fixture directory of a synthetic city, generated on first use."""
+    directory = os.path.join(cache_dir, f"{layout}-{size}")
+    if not os.path.exists(os.path.join(directory, "nominatim.json")):
+        write_city(directory, layout, SIZES[size])
+    return directory
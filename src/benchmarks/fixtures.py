@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+from work_calculate_ways import elevationFetch, geoCoding, osm
+from work_calculate_ways.elevationStub import start_stub_server
+from work_calculate_ways.osmStream import iter_file_elements
+from work_calculate_ways.regionCache import BUILD_PADDING
+
+# Recorded Overpass/elevation/Nominatim answers (layout in benchmarks/cities.py),
+# replayed through local stubs: Overpass ways are streamed from the fixture file,
+# elevations come from the HTTP elevation stub, and geocoding answers from the
+# recorded table. Record a real route once with
+#   python -m benchmarks.fixtures record <directory> "<start address>" "<end address>"
+
+
+def load_fixture(directory):
+    with open(os.path.join(directory, "nominatim.json"), "r", encoding="utf-8") as f:
+        nominatim = json.load(f)
+    with open(os.path.join(directory, "elevation.json"), "r", encoding="utf-8") as f:
+        elevations = {(lon, lat): elevation for lon, lat, elevation in json.load(f)}
+    return nominatim, elevations
+
+
+@contextmanager
+def replay(directory):
+    """Serve every external API the routes use from the fixture in directory. Yields its nominatim.json."""
+    nominatim, elevations = load_fixture(directory)
+    addresses = {address: tuple(coords) for address, coords in nominatim["addresses"].items()}
+    overpass_path = os.path.join(directory, "overpass.json")
+    server, url = start_stub_server(elevation=lambda lat, lon: elevations.get((lon, lat), 0.0))
+
+    patched = [
+        (osm, "stream_osm_data_bboxes", lambda bboxes: iter_file_elements(overpass_path)),
+        (elevationFetch, "ELEVATION_API_URL", url),
+        # the stub has no rate limit to respect
+        (elevationFetch, "_bucket", elevationFetch.TokenBucket(1e9, 1e9)),
+        (geoCoding, "fetch_geocode_address", addresses.get),
+        (geoCoding, "fetch_bbox_from_city_name", lambda city_name: tuple(nominatim["bbox"])),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in patched]
+    for module, name, value in patched:
+        setattr(module, name, value)
+    try:
+        yield nominatim
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+        server.shutdown()
+
+
+def record(directory, start_address, end_address):
+    """Record the answers a route between two addresses needs from the real APIs."""
+    start = geoCoding.fetch_geocode_address(start_address)
+    end = geoCoding.fetch_geocode_address(end_address)
+    if not (start and end):
+        sys.exit("❌ Could not geocode one or both addresses")
+    # the same bbox a region build for this route fetches
+    bbox = [min(start[0], end[0]) - BUILD_PADDING, min(start[1], end[1]) - BUILD_PADDING,
+            max(start[0], end[0]) + BUILD_PADDING, max(start[1], end[1]) + BUILD_PADDING]
+    elements = osm.stream_osm_data_bboxes([bbox])
+    if elements is None:
+        sys.exit("❌ Failed to fetch OSM data")
+
+    os.makedirs(directory, exist_ok=True)
+    points = set()
+    with open(os.path.join(directory, "overpass.json"), "w", encoding="utf-8") as f:
+        f.write('{"version": 0.6, "elements": [\n')
+        for i, element in enumerate(elements):
+            f.write(("" if i == 0 else ",\n") + json.dumps(element, ensure_ascii=False))
+            points.update((c["lon"], c["lat"]) for c in element.get("geometry", []))
+        f.write("\n]}\n")
+    elevations = osm.fetch_elevation_data(list(points))
+    with open(os.path.join(directory, "elevation.json"), "w", encoding="utf-8") as f:
+        json.dump([[lon, lat, elevation] for (lon, lat), elevation in elevations.items()], f)
+    with open(os.path.join(directory, "nominatim.json"), "w", encoding="utf-8") as f:
+        json.dump({"bbox": bbox, "addresses": {start_address: list(start), end_address: list(end)},
+                   "route": [start_address, end_address]}, f, ensure_ascii=False, indent=1)
+    print(f"✅ Recorded {len(points)} points and {len(elevations)} elevations into {directory}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 5 or sys.argv[1] != "record":
+        sys.exit('usage: python -m benchmarks.fixtures record <directory> "<start address>" "<end address>"')
+    record(*sys.argv[2:])
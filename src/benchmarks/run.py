@@ -0,0 +1,218 @@
+"""
+Benchmarks of the routing pipeline, per stage and for the whole POST /api/path flow,
+on synthetic cities (benchmarks/cities.py) and recorded fixtures (benchmarks/fixtures.py).
+Every city runs in its own process and working directory, so no cache or store leaks
+from one city into the next. Run from src/:
+
+    python -m benchmarks.run                                  # grid and radial, 1k and 10k nodes
+    python -m benchmarks.run --cities grid-100k,radial-1m --repeat 3
+    python -m benchmarks.run --fixture fixtures/tel-aviv      # a recorded city
+    python -m benchmarks.run --output new.json --baseline old.json
+
+Results are written as JSON (median and min seconds per stage); with --baseline, every
+stage is compared against the same stage there and the exit status is 1 on regressions.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CITIES = "grid-1k,grid-10k,radial-1k,radial-10k"
+DEFAULT_REPEAT = 5
+REGRESSION_THRESHOLD = 1.25  # median more than 25% slower than the baseline
+NOISE_FLOOR_SECONDS = 0.001  # differences below this are never regressions
+MAX_SLOPE = 4.0
+
+
+def measure(fn, repeat=DEFAULT_REPEAT, before=None):
+    """Run fn repeat times, quietly. Returns (last result, {"median_s", "min_s", "runs"})."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        with redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - started)
+    return result, {"median_s": statistics.median(times), "min_s": min(times), "runs": repeat}
+
+
+def bench_fixture(directory, repeat):
+    """Time every stage on one fixture, in the current process and working directory."""
+    from benchmarks.fixtures import replay
+    from db import DB
+    from flask import Flask
+    from routes.api_routes import api_bp
+    from work_calculate_ways import regionCache, routeCache
+    from work_calculate_ways.csrGraph import CSRGraph
+    from work_calculate_ways.osm import elements_to_graph, elements_to_csr_graph, simplify_graph
+    from work_calculate_ways.osmStream import iter_file_elements
+    from work_calculate_ways.pathFinding import shortest_path, flattest_path, pareto_paths
+    from work_calculate_ways.spatialIndex import nearest_node
+
+    overpass_path = os.path.join(directory, "overpass.json")
+    stages = {}
+    with replay(directory) as nominatim:
+        _, stages["parse_overpass"] = measure(lambda: sum(1 for _ in iter_file_elements(overpass_path)), repeat)
+        # the first build fetches every elevation from the stub, later ones find them in the store
+        _, stages["osm_to_graph_cold"] = measure(lambda: elements_to_graph(iter_file_elements(overpass_path)), 1)
+        (G, node_data), stages["osm_to_graph"] = measure(
+            lambda: elements_to_graph(iter_file_elements(overpass_path)), repeat)
+        csr, stages["csr_build"] = measure(lambda: CSRGraph.from_networkx(G, node_data), repeat)
+        # region graphs are built straight into arrays, as regionCache caches them
+        (region_graph, region_data), stages["osm_to_csr_graph"] = measure(
+            lambda: elements_to_csr_graph(iter_file_elements(overpass_path)), repeat)
+
+        start_address, end_address = nominatim["route"]
+        (start_lat, start_lon), (end_lat, end_lon) = (nominatim["addresses"][a] for a in (start_address, end_address))
+        start = nearest_node(G, (start_lon, start_lat))
+        goal = nearest_node(G, (end_lon, end_lat))
+
+        (simplified, _), stages["simplify_graph"] = measure(
+            lambda: simplify_graph(G, node_data, target_nodes=300, start_node=start, goal_node=goal), repeat)
+        _, stages["simplify_graph_csr"] = measure(
+            lambda: simplify_graph(region_graph, region_data, target_nodes=300, start_node=start, goal_node=goal),
+            repeat)
+        _, stages["shortest_path"] = measure(lambda: shortest_path(G, start, goal), repeat)
+        _, stages["shortest_path_csr"] = measure(lambda: shortest_path(csr, start, goal), repeat)
+        _, stages["flattest_path"] = measure(lambda: flattest_path(G, start, goal, MAX_SLOPE), repeat)
+        _, stages["pareto_paths"] = measure(lambda: pareto_paths(simplified, start, goal, MAX_SLOPE), repeat)
+
+        # the whole request, with the DB on the SQLite stand-in
+        DB.DB_BACKEND, DB.SQLITE_PATH = "sqlite", "bike_routes.sqlite"
+        app = Flask(__name__)
+        app.register_blueprint(api_bp, url_prefix='/api')
+        client = app.test_client()
+        client.post('/api/register', json={"email": "bench@example.com", "name": "bench", "password": "bench"})
+        body = {"email": "bench@example.com", "start_address": start_address, "end_address": end_address,
+                "max_slope": MAX_SLOPE}
+
+        def request():
+            response = client.post('/api/path', json=body)
+            if response.status_code != 200:
+                raise RuntimeError(f"POST /api/path failed: {response.status_code} {response.get_json()}")
+            return response
+
+        # a new region graph (OSM tiles and elevations cached), a new route, and a cached route
+        _, stages["compute_path_cold"] = measure(request, repeat, before=regionCache.invalidate)
+        _, stages["compute_path"] = measure(request, repeat, before=routeCache.invalidate)
+        _, stages["compute_path_cached"] = measure(request, repeat)
+
+    return {"nodes": G.number_of_nodes(), "edges": G.number_of_edges(),
+            "simplified_nodes": simplified.number_of_nodes(), "stages": stages}
+
+
+def run_isolated(directory, repeat):
+    """bench_fixture in a fresh process, inside a fresh working directory."""
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        out_path = os.path.join(workdir, "result.json")
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_DIR, os.environ.get("PYTHONPATH")])))
+        subprocess.run([sys.executable, "-m", "benchmarks.run", "--single", os.path.abspath(directory),
+                        "--repeat", str(repeat), "--output", out_path],
+                       cwd=workdir, env=env, check=True, stdout=subprocess.DEVNULL)
+        with open(out_path, "r") as f:
+            return json.load(f)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Rows of (city, stage, baseline median, median, ratio, regressed) for stages in both runs."""
+    rows = []
+    for city, result in results["results"].items():
+        base = baseline.get("results", {}).get(city)
+        if base is None:
+            continue
+        for stage, stats in result["stages"].items():
+            base_stats = base["stages"].get(stage)
+            if base_stats is None:
+                continue
+            old, new = base_stats["median_s"], stats["median_s"]
+            ratio = new / old if old > 0 else float("inf")
+            regressed = ratio > threshold and new - old > NOISE_FLOOR_SECONDS
+            rows.append((city, stage, old, new, ratio, regressed))
+    return rows
+
+
+def print_results(results):
+    for city, result in results["results"].items():
+        print(f"\n🏙️ {city}: {result['nodes']} nodes, {result['edges']} edges")
+        for stage, stats in result["stages"].items():
+            print(f"   {stage:<22} median {stats['median_s'] * 1000:10.2f} ms   min {stats['min_s'] * 1000:10.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the routing pipeline.")
+    parser.add_argument("--cities", default=DEFAULT_CITIES,
+                        help="comma separated <grid|radial>-<1k|10k|100k|1m> synthetic cities, '' for none")
+    parser.add_argument("--fixture", action="append", default=[], help="a recorded fixture directory")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--fixture-cache", default=os.path.join(tempfile.gettempdir(), "bike-routes-bench"),
+                        help="where generated synthetic cities are kept between runs")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.single:
+        with open(args.output, "w") as f:
+            json.dump(bench_fixture(args.single, args.repeat), f)
+        return 0
+
+    from benchmarks.cities import city_fixture
+
+    fixtures = {}
+    for city in filter(None, args.cities.split(",")):
+        layout, size = city.split("-")
+        print(f"🏗️ Preparing {city}")
+        fixtures[city] = city_fixture(args.fixture_cache, layout, size)
+    for directory in args.fixture:
+        fixtures[os.path.basename(os.path.normpath(directory))] = directory
+
+    results = {"meta": {"commit": _git_commit(), "python": platform.python_version(),
+                        "platform": platform.platform(), "cpus": os.cpu_count(),
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "repeat": args.repeat},
+               "results": {}}
+    for city, directory in fixtures.items():
+        print(f"⏱️ Benchmarking {city}")
+        results["results"][city] = run_isolated(directory, args.repeat)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=1)
+    print_results(results)
+    print(f"\n✅ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.threshold)
+        print(f"\n📊 Against {args.baseline} (commit {baseline.get('meta', {}).get('commit')}):")
+        for city, stage, old, new, ratio, regressed in rows:
+            print(f"   {'❌' if regressed else '  '} {city:<12} {stage:<22} {old * 1000:10.2f} ms -> "
+                  f"{new * 1000:10.2f} ms  x{ratio:.2f}")
+        regressions = [row for row in rows if row[5]]
+        if regressions:
+            print(f"❌ {len(regressions)} stages slower than x{args.threshold:.2f}")
+            return 1
+        print("✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2 @@
+# Lets pytest import the app's packages (work_calculate_ways, routes, db) from src/,
+# the same way app.py does when run from here.
@@ -1,4 +1,17 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
 import mysql.connector
+from mysql.connector import pooling
+
+from work_calculate_ways.pathCodec import encode_route
+
+logger = logging.getLogger(__name__)
 
 db_config = {
     'host': 'localhost',
@@ -7,10 +20,148 @@ db_config = {
     'database': 'bike_routes'
 }
 
+# Connections come from a pool instead of a new TCP+auth handshake per request. A
+# connection is pinged when it is checked out and reconnected if the server dropped it.
+# Sessions are not reset on return, so the prepared statements of a connection survive
+# between requests. DB_BACKEND=sqlite swaps MySQL for the in-process stand-in in
+# db/sqliteStandIn.py, for running the routes without a MySQL server.
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+POOL_TIMEOUT_SECONDS = 10
+DB_BACKEND = os.environ.get("DB_BACKEND", "mysql")
+SQLITE_PATH = os.environ.get("DB_SQLITE_PATH", "bike_routes.sqlite")
+
+# the hot queries, executed as server-side prepared statements
+STATEMENTS = {
+    "user_id_by_email": "SELECT user_id FROM users WHERE email = %s",
+    "user_login_by_email": "SELECT user_id, name, password FROM users WHERE email = %s",
+    "insert_user": "INSERT INTO users (email, name, password) VALUES (%s, %s, %s)",
+    "insert_route": "INSERT INTO routes (start_lat, start_lon, end_lat, end_lon, user_id, max_slope) "
+                    "VALUES (%s, %s, %s, %s, %s, %s)",
+    "insert_route_path": "INSERT INTO route_paths (route_id, path_polyline, path_format) VALUES (%s, %s, %s)",
+    "route_with_path": "SELECT r.start_lat, r.start_lon, r.end_lat, r.end_lon, r.max_slope, r.total_slope, "
+                       "rp.path_json, rp.path_polyline, rp.path_format "
+                       "FROM routes r JOIN route_paths rp ON r.route_id = rp.route_id WHERE r.route_id = %s",
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(pool_name="bike_routes", pool_size=POOL_SIZE,
+                                                    pool_reset_session=False, **db_config)
+    return _pool
+
+
+def _checkout():
+    deadline = time.monotonic() + POOL_TIMEOUT_SECONDS
+    while True:
+        try:
+            conn = get_pool().get_connection()
+            break
+        except pooling.PoolError:
+            # כל החיבורים בשימוש, מחכים שאחד יחזור לבריכה
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.01)
+    try:
+        conn.ping(reconnect=False)
+    except mysql.connector.Error:
+        conn.reconnect(attempts=2, delay=0)
+        _prepared_cursors(conn).clear()
+    return conn
+
+
 def get_db_connection():
-    return mysql.connector.connect(**db_config)
+    """A connection from the pool; close() hands it back instead of disconnecting."""
+    if DB_BACKEND == "sqlite":
+        from db.sqliteStandIn import connect
+        return connect(SQLITE_PATH)
+    return _checkout()
+
+
+@contextmanager
+def db_connection(commit=False):
+    """
+    with db_connection(commit=True) as conn: ... commits on success, rolls back on
+    error, and always returns the connection to the pool. Without commit the
+    transaction is rolled back on return: sessions are not reset in the pool, so a
+    read would otherwise leave its REPEATABLE READ snapshot open for the next checkout.
+    """
+    conn = get_db_connection()
+    try:
+        yield conn
+        if commit:
+            conn.commit()
+    except Exception:
+        if commit:
+            conn.rollback()
+        raise
+    finally:
+        try:
+            if not commit:
+                conn.rollback()
+        finally:
+            conn.close()
+
+
+def _prepared_cursors(conn):
+    # the cache lives on the physical connection, which outlives each pooled checkout
+    raw = getattr(conn, "_cnx", conn)
+    cursors = getattr(raw, "_prepared_cursors", None)
+    if cursors is None:
+        cursors = {}
+        raw._prepared_cursors = cursors
+    return cursors
+
+
+def execute(conn, name, params=()):
+    """
+    Run one of STATEMENTS on conn as a prepared statement, prepared once per physical
+    connection. Returns (rows, lastrowid); rows are always fully fetched.
+    """
+    cursors = _prepared_cursors(conn)
+    cursor = cursors.get(name)
+    if cursor is None:
+        cursor = conn.cursor(prepared=True)
+        cursors[name] = cursor
+    cursor.execute(STATEMENTS[name], params)
+    rows = cursor.fetchall() if cursor.description else []
+    return rows, cursor.lastrowid
+
+
+def fetch_one(conn, name, params=()):
+    """First row of a prepared SELECT as a dict by column name, or None."""
+    rows, _ = execute(conn, name, params)
+    if not rows:
+        return None
+    cursor = _prepared_cursors(conn)[name]
+    return dict(zip(cursor.column_names, rows[0]))
+
+
+def check_health():
+    """True when a pooled connection answers a ping."""
+    try:
+        with db_connection() as conn:
+            conn.ping(reconnect=True)
+        return True
+    except mysql.connector.Error as err:
+        logger.error("❌ Database health check failed: %s", err)
+        return False
+
 
 def init_db():
+    if DB_BACKEND == "sqlite":
+        from db.sqliteStandIn import init_schema
+        init_schema(SQLITE_PATH)
+        with db_connection(commit=True) as conn:
+            _add_encoded_path_columns(conn)
+        print("✅ Database initialized")
+        return
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -43,10 +194,15 @@ def init_db():
             CREATE TABLE IF NOT EXISTS route_paths (
                 path_id INT AUTO_INCREMENT PRIMARY KEY,
                 route_id INT NOT NULL,
-                path_json JSON NOT NULL,
+                path_json JSON DEFAULT NULL,
+                path_polyline MEDIUMTEXT DEFAULT NULL,
+                path_format VARCHAR(16) DEFAULT NULL,
                 FOREIGN KEY (route_id) REFERENCES routes(route_id)
             )
         ''')
+        # tables created before encoded paths lack their columns; re-encoding the old
+        # rows is left to `python -m db.DB migrate`
+        _add_encoded_path_columns(conn)
 
         conn.commit()
         cursor.close()
@@ -55,5 +211,60 @@ def init_db():
     except mysql.connector.Error as err:
         print(f"❌ Database error: {err}")
 
+
+def _add_encoded_path_columns(conn):
+    cursor = conn.cursor()
+    try:
+        if DB_BACKEND == "sqlite":
+            cursor.execute("PRAGMA table_info(route_paths)")
+            columns = {row[1] for row in cursor.fetchall()}
+        else:
+            cursor.execute("SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                           "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'route_paths'")
+            columns = {row[0] for row in cursor.fetchall()}
+        if "path_polyline" in columns:
+            return
+        if DB_BACKEND == "sqlite":
+            cursor.execute("ALTER TABLE route_paths ADD COLUMN path_polyline TEXT DEFAULT NULL")
+            cursor.execute("ALTER TABLE route_paths ADD COLUMN path_format TEXT DEFAULT NULL")
+        else:
+            cursor.execute("ALTER TABLE route_paths ADD COLUMN path_polyline MEDIUMTEXT DEFAULT NULL, "
+                           "ADD COLUMN path_format VARCHAR(16) DEFAULT NULL, MODIFY path_json JSON DEFAULT NULL")
+        logger.info("✅ Added encoded path columns to route_paths")
+    finally:
+        cursor.close()
+
+
+def migrate_route_paths(batch_size=500):
+    """Re-encode route_paths rows still stored as path_json into path_polyline, in batches."""
+    with db_connection(commit=True) as conn:
+        _add_encoded_path_columns(conn)
+    migrated = 0
+    while True:
+        with db_connection(commit=True) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT path_id, path_json FROM route_paths "
+                               "WHERE path_polyline IS NULL AND path_json IS NOT NULL LIMIT %s", (batch_size,))
+                rows = cursor.fetchall()
+                for path_id, path_json in rows:
+                    # למסלולים ישנים אין גובה לכל נקודה, לכן הם נשמרים בלי ערוץ גובה
+                    encoded, path_format = encode_route(json.loads(path_json))
+                    cursor.execute("UPDATE route_paths SET path_polyline = %s, path_format = %s, path_json = NULL "
+                                   "WHERE path_id = %s", (encoded, path_format, path_id))
+            finally:
+                cursor.close()
+        if not rows:
+            break
+        migrated += len(rows)
+        logger.info("🔄 Migrated %d route paths", migrated)
+    logger.info("✅ Route path migration done (%d rows)", migrated)
+    return migrated
+
 if __name__ == '__main__':
-    init_db()
\ No newline at end of file
+    # python -m db.DB [migrate]
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        migrate_route_paths()
+    else:
+        init_db()
@@ -0,0 +1,116 @@
+import sqlite3
+import threading
+
+import mysql.connector
+
+# In-process stand-in for the MySQL connection API that db.DB and the routes use
+# (cursor(prepared=..., dictionary=...), %s placeholders, lastrowid, column_names,
+# ping/reconnect), backed by SQLite. Selected with DB_BACKEND=sqlite.
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        password TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS routes (
+        route_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        start_lat REAL NOT NULL,
+        start_lon REAL NOT NULL,
+        end_lat REAL NOT NULL,
+        end_lon REAL NOT NULL,
+        user_id INTEGER NOT NULL REFERENCES users(user_id),
+        max_slope REAL DEFAULT NULL,
+        total_slope REAL DEFAULT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS route_paths (
+        path_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        route_id INTEGER NOT NULL REFERENCES routes(route_id),
+        path_json TEXT DEFAULT NULL,
+        path_polyline TEXT DEFAULT NULL,
+        path_format TEXT DEFAULT NULL
+    );
+'''
+
+_lock = threading.Lock()
+_initialized = set()
+
+
+class StandInCursor:
+    def __init__(self, conn, dictionary=False):
+        self._cursor = conn.cursor()
+        self.dictionary = dictionary
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cursor.description or ())
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def execute(self, operation, params=()):
+        try:
+            self._cursor.execute(operation.replace("%s", "?"), tuple(params))
+        except sqlite3.Error as err:
+            # the routes handle mysql.connector.Error only
+            raise mysql.connector.Error(msg=str(err)) from err
+
+    def _row(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class StandInConnection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+
+    def cursor(self, prepared=False, dictionary=False):
+        return StandInCursor(self._conn, dictionary=dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._conn.execute("SELECT 1")
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._conn.close()
+
+
+def init_schema(path):
+    with _lock:
+        if path in _initialized:
+            return
+        conn = sqlite3.connect(path)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        _initialized.add(path)
+
+
+def connect(path):
+    init_schema(path)
+    return StandInConnection(path)
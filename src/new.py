@@ -1,6 +1,7 @@
 import json
 import math
-import re
+
+from work_calculate_ways.elevationIndex import ElevationIndex, parse_coordinate_key
 
 
 # פתרון 1: עיגול קואורדינטות לדיוק קבוע
@@ -17,34 +18,56 @@ def get_elevation_by_exact_match(lat, lon, elevation_data):
     return elevation_data.get(key)
 
 
+# אינדקס מרחבי שנבנה פעם אחת לכל מילון נתוני גובה
+_index_cache = (None, 0, None, None)
+
+
+def get_elevation_index_for(elevation_data):
+    """בניית אינדקס מרחבי על מפתחות המחרוזת של נתוני הגובה (נשמר בין קריאות)"""
+    global _index_cache
+    source, size, index, keys = _index_cache
+    if source is not elevation_data or size != len(elevation_data):
+        keys = {}
+        for coord_key in elevation_data:
+            try:
+                lat, lon = parse_coordinate_key(coord_key)
+            except ValueError:
+                continue
+            # המפתחות כאן הם (lat, lon), והאינדקס עובד לפי (lon, lat)
+            keys[(lon, lat)] = coord_key
+        index = ElevationIndex({coord: elevation_data[key] for coord, key in keys.items()})
+        _index_cache = (elevation_data, len(elevation_data), index, keys)
+    return index, keys
+
+
 # פתרון 2: חיפוש הקואורדינטה הקרובה ביותר
 def get_elevation_by_closest_match(target_lat, target_lon, elevation_data):
     """חיפוש הקואורדינטה הקרובה ביותר"""
-    min_distance = float('inf')
-    closest_elevation = None
-    closest_coord = None
-
-    for coord_key, elevation in elevation_data.items():
-        # חילוץ קואורדינטות מהמפתח
-        match = re.match(r'\(([^,]+),\s*([^)]+)\)', coord_key)
-        if not match:
-            continue
-
-        lat = float(match.group(1))
-        lon = float(match.group(2))
+    index, keys = get_elevation_index_for(elevation_data)
+    _, coord, _ = index.nearest((target_lon, target_lat))
+    if coord is None:
+        return {
+            'elevation': None,
+            'coordinate': None,
+            'distance': float('inf')
+        }
 
-        # חישוב מרחק (אוקלידי פשוט)
-        distance = math.sqrt((target_lat - lat) ** 2 + (target_lon - lon) ** 2)
+    # מרחק אוקלידי פשוט (במעלות), כמו סף ה-tolerance
+    def degrees_distance(c):
+        return math.sqrt((target_lat - c[1]) ** 2 + (target_lon - c[0]) ** 2)
 
-        if distance < min_distance:
-            min_distance = distance
-            closest_elevation = elevation
-            closest_coord = coord_key
+    # האינדקס מדרג לפי מרחק על הקרקע; הקרוב ביותר במעלות נמצא בריבוע שהקרוב על הקרקע פורש
+    reach = degrees_distance(coord)
+    candidates = index.index.within_bbox(target_lat - reach, target_lon - reach,
+                                         target_lat + reach, target_lon + reach)
+    coord = min(candidates or [coord], key=degrees_distance)
+    closest_elevation = index.elevations[coord]
+    distance = degrees_distance(coord)
 
     return {
         'elevation': closest_elevation,
-        'coordinate': closest_coord,
-        'distance': min_distance
+        'coordinate': keys[coord],
+        'distance': distance
     }
 
 
@@ -1,16 +1,38 @@
-import ast
-
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 import mysql.connector
-from db.DB import get_db_connection
+from db.DB import db_connection, execute
 from work_calculate_ways.geoCoding import geocode_address
-from work_calculate_ways.osm import fetch_osm_data_bbox, osm_to_graph, simplify_graph, haversine_distance
-from work_calculate_ways.pathFinding import shortest_path, flattest_path, merge_paths
+from work_calculate_ways.osm import simplify_graph, expand_path
+from work_calculate_ways.pathFinding import pareto_paths, choose_route, one_to_many
+from work_calculate_ways.spatialIndex import nearest_node
+from work_calculate_ways.regionCache import get_region_graph
+from work_calculate_ways import routeCache
+from work_calculate_ways.routeCache import route_key, slope_key
+from work_calculate_ways.pathCodec import encode_route
+from work_calculate_ways.metrics import span, timed
 import json
+import math
 import networkx as nx
+from concurrent.futures import ThreadPoolExecutor
 
 api_bp = Blueprint('api', __name__)
 
+MAX_BATCH_PAIRS = 10000
+MAX_BATCH_SPAN = 0.5  # degrees of latitude or longitude between a batch's addresses, about 50 km
+# threads for the blocking I/O of a request (DB, Nominatim, Overpass), so it can overlap
+io_pool = ThreadPoolExecutor(max_workers=8)
+
+
+def path_coords(path):
+    # צמתי הגרף הם (lon, lat), כך שאין צורך לחפש אותם ב-node_data
+    return [{"latitude": lat, "longitude": lon} for lon, lat in path]
+
+
+def encode_path(node_data, path):
+    """A path of graph nodes as (polyline, format), with its elevations."""
+    return encode_route(path_coords(path), [node_data[node]["elevation"] for node in path])
+
+
 @api_bp.route('/register', methods=['POST'])
 def register_user():
     data = request.get_json()
@@ -22,22 +44,11 @@ def register_user():
         return jsonify({"error": "Missing email, name, or password"}), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT user_id FROM users WHERE email = %s", (email,))
-        if cursor.fetchone():
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Email already registered"}), 400
-
-        cursor.execute("INSERT INTO users (email, name, password) VALUES (%s, %s, %s)",
-                       (email, name, password))
-        conn.commit()
-        user_id = cursor.lastrowid
-
-        cursor.close()
-        conn.close()
+        with db_connection(commit=True) as conn:
+            rows, _ = execute(conn, "user_id_by_email", (email,))
+            if rows:
+                return jsonify({"error": "Email already registered"}), 400
+            _, user_id = execute(conn, "insert_user", (email, name, password))
         return jsonify({"message": "User registered", "user_id": user_id}), 201
     except mysql.connector.Error as err:
         return jsonify({"error": f"Database error: {str(err)}"}), 500
@@ -52,12 +63,9 @@ def login_user():
         return jsonify({"error": "Missing email or password"}), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id, name, password FROM users WHERE email = %s", (email,))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_connection() as conn:
+            rows, _ = execute(conn, "user_login_by_email", (email,))
+        user = rows[0] if rows else None
 
         if not user:
             return jsonify({"error": "User not found"}), 404
@@ -71,126 +79,201 @@ def login_user():
     except mysql.connector.Error as err:
         return jsonify({"error": f"Database error: {str(err)}"}), 500
 
+@timed("db_user_lookup")
+def find_user_id(email):
+    with db_connection() as conn:
+        rows, _ = execute(conn, "user_id_by_email", (email,))
+    return rows[0][0] if rows else None
+
 @api_bp.route('/path', methods=['POST'])
+@timed("compute_path")
 def compute_path():
     data = request.get_json()
     start_address = data.get('start_address')
     end_address = data.get('end_address')
     email = data.get('email')
     max_slope = float(data.get('max_slope', float('inf')))
+    tradeoff = float(data.get('tradeoff', 0.5))  # 0 = הקצר ביותר, 1 = הכי מעט טיפוס
+    path_format = data.get('format', 'json')  # "polyline" מחזיר את המסלולים מקודדים
 
     if not (start_address and end_address and email):
         return jsonify({"error": "Missing start_address, end_address, or email"}), 400
+    if path_format not in ('json', 'polyline'):
+        return jsonify({"error": "format must be json or polyline"}), 400
+
+    # בדיקת המשתמש ושני ה-geocoding רצים במקביל, ובניית הגרף מתחילה ברגע ששתי הכתובות ידועות
+    user_future = io_pool.submit(find_user_id, email)
+    start_future = io_pool.submit(geocode_address, start_address)
+    end_future = io_pool.submit(geocode_address, end_address)
+    start_coords, end_coords = start_future.result(), end_future.result()
+    region_future = None
+    if start_coords and end_coords:
+        region_future = io_pool.submit(get_region_graph,
+                                       min(start_coords[0], end_coords[0]), min(start_coords[1], end_coords[1]),
+                                       max(start_coords[0], end_coords[0]), max(start_coords[1], end_coords[1]))
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id FROM users WHERE email = %s", (email,))
-        user = cursor.fetchone()
-        if not user:
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "User not found"}), 404
-        user_id = user[0]
+        user_id = user_future.result()
     except mysql.connector.Error as err:
-        cursor.close()
-        conn.close()
         return jsonify({"error": f"Database error: {str(err)}"}), 500
+    if user_id is None:
+        return jsonify({"error": "User not found"}), 404
 
-    start_coords = geocode_address(start_address)
-    end_coords = geocode_address(end_address)
-
-    if not start_coords or not end_coords:
-        cursor.close()
-        conn.close()
+    if region_future is None:
         return jsonify({"error": "Could not geocode one or both addresses"}), 400
 
     start_lat, start_lon = start_coords
     end_lat, end_lon = end_coords
 
-    padding = 0.05
-    min_lat = min(start_lat, end_lat) - padding
-    max_lat = max(start_lat, end_lat) + padding
-    min_lon = min(start_lon, end_lon) - padding
-    max_lon = max(start_lon, end_lon) + padding
-
-    osm_data = fetch_osm_data_bbox(min_lat, min_lon, max_lat, max_lon)
-    if not osm_data:
-        cursor.close()
-        conn.close()
+    # הגרף של האזור נבנה פעם אחת ומשותף לכל הבקשות שנופלות בתוכו
+    region = region_future.result()
+    if region is None:
         return jsonify({"error": "Failed to fetch OSM data"}), 500
 
-    road_graph, node_data = osm_to_graph(osm_data)
-    if not road_graph.nodes:
-        cursor.close()
-        conn.close()
+    road_graph = region.graph
+    if not road_graph.number_of_nodes():
         return jsonify({"error": "No road data found"}), 500
 
-    def find_closest_node(coord, nodes):
-        return min(nodes, key=lambda n: haversine_distance(coord, n))
-
-    start_node = find_closest_node((start_lon, start_lat), road_graph.nodes)
-    end_node = find_closest_node((end_lon, end_lat), road_graph.nodes)
-
-    simplified_graph, node_data = simplify_graph(road_graph, node_data, target_nodes=300,
-                                                start_node=start_node, goal_node=end_node)
-    if not nx.has_path(simplified_graph, start_node, end_node):
-        cursor.close()
-        conn.close()
-        return jsonify({"error": "No path after simplification"}), 500
+    start_node = nearest_node(road_graph, (start_lon, start_lat))
+    end_node = nearest_node(road_graph, (end_lon, end_lat))
 
-    with open("elevation.json", "r") as f:
-        raw = json.load(f)
+    # בקשות חוזרות נענות מהמטמון לפי הצמתים המוצמדים, מגבלת השיפוע והחתימה של הגרף
+    cache_key = route_key(region.signature, start_node, end_node, slope_key(max_slope, region.slope_levels))
+    routes = routeCache.get(cache_key)
+    if routes is None:
+        # simplify_graph מחזיר גרף חדש, כך שהגרף המשותף של האזור לא משתנה
+        simplified_graph, _ = simplify_graph(road_graph, region.node_data, target_nodes=300,
+                                            start_node=start_node, goal_node=end_node)
+        if end_node not in simplified_graph or not nx.has_path(simplified_graph, start_node, end_node):
+            return jsonify({"error": "No path after simplification"}), 500
 
-    elevation_dict = {
-        ast.literal_eval(k): v
-        for k, v in raw.items()
-    }
-
-    shortest = shortest_path(simplified_graph, start_node, end_node)
-    flattest = flattest_path(simplified_graph, start_node, end_node, max_slope,elevation_dict)
-
-    if not (shortest and flattest):
-        cursor.close()
-        conn.close()
-        return jsonify({"error": f"Could not compute path with slope <= {max_slope:.2f} degrees"}), 500
-
-    merged_graph = merge_paths(shortest, flattest, simplified_graph, node_data, start_node, end_node)
+        # חיפוש אחד מחזיר את כל המסלולים שאף אחד מהם אינו גם ארוך יותר וגם תלול יותר מאחר
+        front = pareto_paths(simplified_graph, start_node, end_node, max_slope)
+        if not front:
+            return jsonify({"error": f"Could not compute path with slope <= {max_slope:.2f} degrees"}), 500
 
-    final_path = shortest_path(merged_graph, start_node, end_node)
-    if not final_path:
-        cursor.close()
-        conn.close()
-        return jsonify({"error": "No merged path found"}), 500
+        # פריסת הקשתות המכווצות בחזרה לכל נקודות הרחוב לצורך ציור המסלול
+        with span("expand_paths"):
+            routes = [(expand_path(simplified_graph, path), d, c) for path, d, c in front]
+        routeCache.put(cache_key, routes)
 
+    final_path, distance, climb = choose_route(routes, tradeoff)
 
-    path_coords = [{"latitude": node_data[node]["latitude"], "longitude": node_data[node]["longitude"]}
-                   for node in final_path]
+    # המסלול נשמר כ-polyline עם ערוץ גובה, הרבה יותר קטן מרשימת JSON של נקודות
+    encoded_path = encode_path(region.node_data, final_path)
 
     try:
-        cursor.execute('''
-            INSERT INTO routes (start_lat, start_lon, end_lat, end_lon, user_id, max_slope)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ''', (start_lat, start_lon, end_lat, end_lon, user_id, max_slope))
-        route_id = cursor.lastrowid
-
-        cursor.execute('''
-            INSERT INTO route_paths (route_id, path_json)
-            VALUES (%s, %s)
-        ''', (route_id, json.dumps(path_coords)))
-
-        conn.commit()
+        with span("db_insert"), db_connection(commit=True) as conn:
+            # MySQL לא שומר אינסוף, שיפוע בלי הגבלה נשמר כ-NULL
+            _, route_id = execute(conn, "insert_route", (start_lat, start_lon, end_lat, end_lon, user_id,
+                                                         max_slope if math.isfinite(max_slope) else None))
+            execute(conn, "insert_route_path", (route_id, *encoded_path))
     except mysql.connector.Error as err:
-        conn.rollback()
-        cursor.close()
-        conn.close()
         return jsonify({"error": f"Database error: {str(err)}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
-    return jsonify({
-        "path": path_coords,
+    response = {
+        "distance": distance,
+        "climb": climb,
         "route_id": route_id,
         "message": f"Path found with max slope of {max_slope:.2f} degrees"
-    })
\ No newline at end of file
+    }
+    if path_format == 'polyline':
+        response["path"], response["path_format"] = encoded_path
+        response["alternatives"] = []
+        for path, d, c in routes:
+            encoded, _ = encode_path(region.node_data, path)
+            response["alternatives"].append({"path": encoded, "distance": d, "climb": c})
+    else:
+        response["path"] = path_coords(final_path)
+        response["alternatives"] = [{"path": path_coords(path), "distance": d, "climb": c}
+                                    for path, d, c in routes]
+    return jsonify(response)
+
+
+@api_bp.route('/paths/batch', methods=['POST'])
+def compute_paths_batch():
+    """
+    Many routes in one region: either "pairs" of {start_address, end_address} or the full
+    "origins" x "destinations" matrix. One graph serves the whole batch and every origin
+    gets a single one-to-many search; results stream back as NDJSON, one line per origin.
+    """
+    data = request.get_json()
+    email = data.get('email')
+    max_slope = float(data.get('max_slope', float('inf')))
+    include_paths = bool(data.get('include_paths', True))
+    path_format = data.get('format', 'json')
+
+    if data.get('pairs'):
+        pairs = [(pair.get('start_address'), pair.get('end_address')) for pair in data['pairs']]
+    elif data.get('origins') and data.get('destinations'):
+        pairs = [(origin, destination) for origin in data['origins'] for destination in data['destinations']]
+    else:
+        return jsonify({"error": "Missing pairs, or origins and destinations"}), 400
+    if not email:
+        return jsonify({"error": "Missing email"}), 400
+    if not all(start and end for start, end in pairs):
+        return jsonify({"error": "Every pair needs start_address and end_address"}), 400
+    if len(pairs) > MAX_BATCH_PAIRS:
+        return jsonify({"error": f"At most {MAX_BATCH_PAIRS} pairs per batch"}), 400
+    if path_format not in ('json', 'polyline'):
+        return jsonify({"error": "format must be json or polyline"}), 400
+
+    # כל כתובת עוברת geocoding פעם אחת בלבד, כולן במקביל לבדיקת המשתמש
+    user_future = io_pool.submit(find_user_id, email)
+    addresses = list(dict.fromkeys(address for pair in pairs for address in pair))
+    geocoded = io_pool.map(geocode_address, addresses)
+    try:
+        user_id = user_future.result()
+    except mysql.connector.Error as err:
+        return jsonify({"error": f"Database error: {str(err)}"}), 500
+    if user_id is None:
+        return jsonify({"error": "User not found"}), 404
+    coords = dict(zip(addresses, geocoded))
+    located = [c for c in coords.values() if c]
+    if not located:
+        return jsonify({"error": "Could not geocode any address"}), 400
+
+    bbox = (min(lat for lat, _ in located), min(lon for _, lon in located),
+            max(lat for lat, _ in located), max(lon for _, lon in located))
+    # כתובת אחת רחוקה הייתה הופכת את האזור לשאילתת Overpass בגודל של מדינה
+    if bbox[2] - bbox[0] > MAX_BATCH_SPAN or bbox[3] - bbox[1] > MAX_BATCH_SPAN:
+        return jsonify({"error": f"Addresses of a batch must lie within {MAX_BATCH_SPAN} degrees of each other"}), 400
+    region = get_region_graph(*bbox)
+    if region is None:
+        return jsonify({"error": "Failed to fetch OSM data"}), 500
+    if not region.graph.number_of_nodes():
+        return jsonify({"error": "No road data found"}), 500
+
+    nodes = {address: nearest_node(region.graph, (c[1], c[0])) for address, c in coords.items() if c}
+    graph, _ = simplify_graph(region.graph, region.node_data, target_nodes=300, keep_nodes=nodes.values())
+
+    by_origin = {}
+    for start, end in pairs:
+        by_origin.setdefault(start, []).append(end)
+
+    def generate():
+        for origin, destinations in by_origin.items():
+            if origin not in nodes:
+                yield json.dumps({"origin": origin, "error": "Could not geocode address"}, ensure_ascii=False) + "\n"
+                continue
+            routes = one_to_many(graph, nodes[origin], [nodes[d] for d in destinations if d in nodes], max_slope)
+            results = []
+            for destination in destinations:
+                if destination not in nodes:
+                    results.append({"destination": destination, "error": "Could not geocode address"})
+                    continue
+                route = routes.get(nodes[destination])
+                if route is None:
+                    results.append({"destination": destination,
+                                    "error": f"No path with slope <= {max_slope:.2f} degrees"})
+                    continue
+                path, distance, climb = route
+                result = {"destination": destination, "distance": distance, "climb": climb}
+                if include_paths and path_format == 'polyline':
+                    result["path"], result["path_format"] = encode_path(region.node_data, expand_path(graph, path))
+                elif include_paths:
+                    result["path"] = path_coords(expand_path(graph, path))
+                results.append(result)
+            yield json.dumps({"origin": origin, "results": results}, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
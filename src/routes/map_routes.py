@@ -1,66 +1,97 @@
-from flask import Blueprint, render_template
-from db.DB import get_db_connection
-from work_calculate_ways.osm import osm_to_graph,fetch_osm_data_bbox
-import requests
+from flask import Blueprint, render_template, request, make_response
+from db.DB import db_connection, fetch_one
+from work_calculate_ways.pathCodec import decode_route
+from work_calculate_ways.regionCache import get_region_graph
+from work_calculate_ways.spatialIndex import get_spatial_index
+from collections import OrderedDict
+import hashlib
 import json
+import os
+import threading
 
 map_bp = Blueprint('map', __name__)
 
+# The road network around a saved route is clipped out of the cached region graph
+# (regionCache) with a bbox query on its spatial index, instead of refetching
+# Overpass. Rendered pages are kept per route and validated with an ETag built from
+# the stored route row alone, checked before the region graph is touched, so an
+# unchanged route answers 304 (or a cached page) even when its region was evicted.
+CLIP_PADDING = 0.01
+MAX_VIEWS = int(os.environ.get("VIEW_CACHE_SIZE", 256))
+
+_views = OrderedDict()  # route_id -> (etag, html), least recently used first
+_views_lock = threading.Lock()
+
+
+def clip_graph(region, min_lat, min_lon, max_lat, max_lon):
+    """The nodes and edges of a region graph inside the bbox, in the format view_path.html draws."""
+    graph, node_data = region.graph, region.node_data
+    inside = set(get_spatial_index(graph).within_bbox(min_lat, min_lon, max_lat, max_lon))
+    graph_data = {"nodes": [], "edges": []}
+    for node in inside:
+        info = node_data[node]
+        graph_data["nodes"].append({"id": str(node), "lat": info["latitude"], "lon": info["longitude"]})
+        for neighbor in graph.neighbors(node):
+            # כל קשת פעם אחת, ורק אם שני הקצוות בתוך החיתוך
+            if neighbor in inside and node < neighbor:
+                other = node_data[neighbor]
+                graph_data["edges"].append({
+                    "from": {"lat": info["latitude"], "lon": info["longitude"]},
+                    "to": {"lat": other["latitude"], "lon": other["longitude"]}
+                })
+    return graph_data
+
+
 @map_bp.route('/view_path/<int:route_id>', methods=['GET'])
 def view_path(route_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT r.start_lat, r.start_lon, r.end_lat, r.end_lon, r.max_slope, r.total_slope, rp.path_json "
-                   "FROM routes r JOIN route_paths rp ON r.route_id = rp.route_id WHERE r.route_id = %s", (route_id,))
-    route = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with db_connection() as conn:
+        route = fetch_one(conn, "route_with_path", (route_id,))
 
     if not route:
         return "מסלול לא נמצא", 404
 
-    path_coords = json.loads(route['path_json'])
-
-    # קבל נתוני OSM עבור אזור המסלול
-    start_lat, start_lon = route['start_lat'], route['start_lon']
-    end_lat, end_lon = route['end_lat'], route['end_lon']
-    # חשב גבולות (bounding box) סביב המסלול
-    lat_min = min(start_lat, end_lat) - 0.01
-    lat_max = max(start_lat, end_lat) + 0.01
-    lon_min = min(start_lon, end_lon) - 0.01
-    lon_max = max(start_lon, end_lon) + 0.01
-
-    osm_data = fetch_osm_data_bbox(lat_min, lon_min, lat_max, lon_max)
-    if not osm_data:
-     return "❌ Cant load Overpass API", 500
-
-    G, node_data = osm_to_graph(osm_data)
+    stored_path = route['path_polyline'] if route['path_polyline'] is not None else route['path_json']
+    etag = hashlib.blake2b(repr((route_id, stored_path, route['max_slope'], route['start_lat'], route['start_lon'],
+                                 route['end_lat'], route['end_lon'])).encode(), digest_size=12).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
 
-    # המר את ה-Graph לפורמט JSON
-    graph_data = {
-        "nodes": [],
-        "edges": []
-    }
+    with _views_lock:
+        cached = _views.get(route_id)
+        if cached is not None:
+            _views.move_to_end(route_id)
+    if cached is not None and cached[0] == etag:
+        html = cached[1]
+    else:
+        # גבולות (bounding box) סביב המסלול
+        start_lat, start_lon = route['start_lat'], route['start_lon']
+        end_lat, end_lon = route['end_lat'], route['end_lon']
+        bbox = (min(start_lat, end_lat) - CLIP_PADDING, min(start_lon, end_lon) - CLIP_PADDING,
+                max(start_lat, end_lat) + CLIP_PADDING, max(start_lon, end_lon) + CLIP_PADDING)
 
-    # התאם את הפורמט של הצמתים למה ש-`view_path.html` מצפה
-    for node in G.nodes(data=True):
-        node_id = str(node[0])  # המר ל-string כי node הוא טאפל (lon, lat)
-        node_info = node_data[node[0]]  # קבל את המידע ממילון node_data
-        lat = node_info.get('latitude')
-        lon = node_info.get('longitude')
-        if lat is not None and lon is not None:
-            graph_data["nodes"].append({"id": node_id, "lat": lat, "lon": lon})
+        # הגרף של האזור כבר נמצא בזיכרון מחישוב המסלול, ונבנה רק אם הוא נזרק מהמטמון
+        region = get_region_graph(min(start_lat, end_lat), min(start_lon, end_lon),
+                                  max(start_lat, end_lat), max(start_lon, end_lon))
+        if region is None:
+            return "❌ Cant load Overpass API", 500
 
-    for edge in G.edges(data=True):
-        node1, node2 = edge[0], edge[1]
-        node1_data = node_data[node1]
-        node2_data = node_data[node2]
-        lat1, lon1 = node1_data.get('latitude'), node1_data.get('longitude')
-        lat2, lon2 = node2_data.get('latitude'), node2_data.get('longitude')
-        if lat1 and lon1 and lat2 and lon2:
-            graph_data["edges"].append({
-                "from": {"lat": lat1, "lon": lon1},
-                "to": {"lat": lat2, "lon": lon2}
-            })
+        # מסלולים חדשים שמורים כ-polyline, ישנים שעוד לא עברו migration עדיין כ-JSON
+        if route['path_polyline'] is not None:
+            path_coords = decode_route(route['path_polyline'], route['path_format'])
+        else:
+            path_coords = json.loads(route['path_json'])
+        graph_data = clip_graph(region, *bbox)
+        html = render_template('view_path.html', path_coords=path_coords, max_slope=route['max_slope'],
+                               graph_data=graph_data)
+        with _views_lock:
+            _views[route_id] = (etag, html)
+            _views.move_to_end(route_id)
+            while len(_views) > MAX_VIEWS:
+                _views.popitem(last=False)
 
-    return render_template('view_path.html', path_coords=path_coords, max_slope=route['max_slope'], graph_data=graph_data)
\ No newline at end of file
+    response = make_response(html)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
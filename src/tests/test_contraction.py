@@ -0,0 +1,37 @@
+import os
+
+import networkx as nx
+
+from work_calculate_ways.contraction import (artifact_fingerprint, attach_hierarchies,
+                                             build_contraction_hierarchy, hierarchy_path)
+from work_calculate_ways.csrGraph import CSRGraph
+from work_calculate_ways.graphStore import load_graph_artifact, save_graph_artifact
+
+
+def _line_graph():
+    G = nx.Graph()
+    nodes = [(34.78 + i * 0.001, 32.07) for i in range(4)]
+    for u, v in zip(nodes, nodes[1:]):
+        G.add_edge(u, v, streets={"Main"}, distance=100.0, weight=100.0, slope=1.0, climb=1.0, descent=0.0)
+    node_data = {node: {"latitude": node[1], "longitude": node[0], "elevation": 0.0,
+                        "streets": {"Main"}, "highway": "residential"} for node in G.nodes}
+    return G, node_data
+
+
+def test_hierarchy_of_a_rewritten_artifact_is_not_attached(tmp_path):
+    artifact_path = str(tmp_path / "city.nbg")
+    save_graph_artifact(*_line_graph(), artifact_path)
+    graph = CSRGraph.from_artifact(load_graph_artifact(artifact_path))
+    hierarchy = build_contraction_hierarchy(graph, "distance")
+    hierarchy.artifact = artifact_fingerprint(artifact_path)
+    hierarchy.save(hierarchy_path(artifact_path, "distance"))
+
+    attach_hierarchies(graph, artifact_path)
+    assert "distance" in graph.hierarchies
+
+    # same node count, but the artifact was written again after the hierarchy was built
+    st = os.stat(artifact_path)
+    os.utime(artifact_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    graph = CSRGraph.from_artifact(load_graph_artifact(artifact_path))
+    attach_hierarchies(graph, artifact_path)
+    assert graph.hierarchies == {}
@@ -0,0 +1,62 @@
+from db import DB
+
+
+class _SnapshotConnection:
+    """A pooled connection with REPEATABLE READ semantics over the committed rows of its pool."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.snapshot = None
+        self.pending = {}
+
+    def ping(self, reconnect=False):
+        pass
+
+    def read(self, key):
+        if self.snapshot is None:
+            self.snapshot = dict(self.pool.committed)
+        return self.pending.get(key, self.snapshot.get(key))
+
+    def write(self, key, value):
+        self.pending[key] = value
+
+    def commit(self):
+        self.pool.committed.update(self.pending)
+        self.pending, self.snapshot = {}, None
+
+    def rollback(self):
+        self.pending, self.snapshot = {}, None
+
+    def close(self):
+        self.pool.connections.append(self)
+
+
+class _Pool:
+    """Hands out connections first in, first out, like a pool under light load."""
+
+    def __init__(self):
+        self.committed = {}
+        self.connections = []
+
+    def get_connection(self):
+        return self.connections.pop(0)
+
+
+def test_read_checkout_does_not_keep_its_snapshot(monkeypatch):
+    pool = _Pool()
+    first, second = _SnapshotConnection(pool), _SnapshotConnection(pool)
+    pool.connections = [first, second]
+    monkeypatch.setattr(DB, "DB_BACKEND", "mysql")
+    monkeypatch.setattr(DB, "get_pool", lambda: pool)
+
+    with DB.db_connection() as conn:
+        assert conn is first
+        assert conn.read("user") is None
+    with DB.db_connection(commit=True) as conn:
+        assert conn is second
+        conn.write("user", 1)
+
+    # the pool hands out the connection that served the read-only checkout again
+    with DB.db_connection() as conn:
+        assert conn is first
+        assert conn.read("user") == 1
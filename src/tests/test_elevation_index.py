@@ -0,0 +1,39 @@
+import pytest
+
+from work_calculate_ways.elevationIndex import ElevationIndex
+
+
+# about 111 m between neighbouring samples along the equator
+SAMPLES = {(0.0, 0.0): 10.0, (0.001, 0.0): 20.0, (0.002, 0.0): 40.0}
+
+
+def test_lookup_many_answers_exact_samples_without_the_spatial_index():
+    index = ElevationIndex(SAMPLES)
+
+    assert index.lookup_many([(0.002, 0.0), (0.0, 0.0)]) == [40.0, 10.0]
+    assert index._index is None
+
+
+def test_lookup_many_nearest_keeps_order_and_falls_back_to_default():
+    index = ElevationIndex(SAMPLES)
+    points = [(0.0011, 0.0), (5.0, 5.0), (0.0, 0.0)]
+
+    assert index.lookup_many(points) == [20.0, 40.0, 10.0]
+    assert index.lookup_many(points, default=0.0, max_distance=100) == [20.0, 0.0, 10.0]
+
+
+def test_lookup_many_interpolated_weights_by_inverse_square_distance():
+    index = ElevationIndex({(0.0, 0.0): 10.0, (0.002, 0.0): 40.0})
+
+    midpoint, near_first = index.lookup_many([(0.001, 0.0), (0.0005, 0.0)], method="interpolated")
+
+    assert midpoint == pytest.approx(25.0)
+    # three times closer to the first sample, so it weighs nine times as much
+    assert near_first == pytest.approx((9 * 10.0 + 40.0) / 10)
+
+
+def test_interpolate_ignores_samples_beyond_max_distance():
+    index = ElevationIndex(SAMPLES)
+
+    assert index.interpolate((0.0001, 0.0), max_distance=50) == 10.0
+    assert index.lookup_many([(1.0, 1.0)], method="interpolated", default=0.0, max_distance=50) == [0.0]
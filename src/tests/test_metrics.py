@@ -0,0 +1,19 @@
+from work_calculate_ways import metrics, regionCache, routeCache
+
+
+def _counter(text, cache, event):
+    prefix = f'bike_cache_events_total{{cache="{cache}",event="{event}"}} '
+    return next(int(line[len(prefix):]) for line in text.splitlines() if line.startswith(prefix))
+
+
+def test_cache_events_are_exported_as_prometheus_counters(monkeypatch):
+    monkeypatch.setattr(routeCache, "DISK_PATH", None)
+    before = metrics.render()
+
+    routeCache.get("no-such-graph|0|0|inf")
+    routeCache.get("no-such-graph|0|0|inf")
+
+    after = metrics.render()
+    assert "# TYPE bike_cache_events_total counter" in after
+    assert _counter(after, "route", "misses") == _counter(before, "route", "misses") + 2
+    assert _counter(after, "region", "hits") == regionCache.get_cache_stats()["hits"]
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+import requests
+
+from work_calculate_ways import osm, osmCache, osmStream
+
+
+WAY = {"type": "way", "id": 1,
+       "geometry": [{"lat": 32.071, "lon": 34.781}, {"lat": 32.072, "lon": 34.782}]}
+BBOX = (32.07, 34.78, 32.073, 34.783)
+
+
+def _offline(*args, **kwargs):
+    raise requests.ConnectionError("Overpass unreachable")
+
+
+def test_stale_tiles_are_served_when_overpass_is_unreachable(tmp_path, monkeypatch):
+    monkeypatch.setattr(osmCache, "CACHE_DIR", str(tmp_path))
+    for key in osmCache.tiles_for_bbox(*BBOX):
+        osmCache.TileWriter(key).commit()
+    writer = osmCache.TileWriter(osmCache.tile_key(32.071, 34.781))
+    writer.write(WAY)
+    writer.commit()
+    # every cached tile is expired, so the cache goes to the network first
+    monkeypatch.setattr(osmCache, "TTL_SECONDS", -1)
+    monkeypatch.setattr(osm.requests, "get", _offline)
+
+    elements = osm.stream_osm_data_bbox(*BBOX)
+
+    assert elements is not None and list(elements) == [WAY]
+
+
+def test_unreachable_overpass_without_cached_tiles_gives_none(tmp_path, monkeypatch):
+    monkeypatch.setattr(osmCache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(osm.requests, "get", _offline)
+
+    assert osm.stream_osm_data_bbox(*BBOX) is None
+
+
+def test_runtime_error_response_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(osmCache, "CACHE_DIR", str(tmp_path))
+    body = ('{"elements": [' + json.dumps(WAY) + '],'
+            '"remark": "runtime error: Query run out of memory using about 2048 MB of RAM."}')
+
+    elements = osmCache.stream_osm_data_bbox(*BBOX, lambda bboxes: osmStream.iter_elements([body]))
+
+    with pytest.raises(ValueError):
+        list(elements)
+    assert not list(tmp_path.glob("*.jsonl"))
@@ -0,0 +1,28 @@
+import pytest
+
+from work_calculate_ways.osmStream import iter_elements
+
+
+HEAD = '{"version": 0.6, "osm3s": {}, "elements": [{"type": "way", "id": 1}, {"type": "way", "id": 2}'
+
+
+def _chunks(text, size=7):
+    return [text[i:i + size].encode() for i in range(0, len(text), size)]
+
+
+def test_elements_are_read_across_chunks():
+    document = HEAD + '], "remark": "runtime remark: Timeout is 180 seconds."}'
+
+    assert [e["id"] for e in iter_elements(_chunks(document))] == [1, 2]
+
+
+def test_runtime_error_remark_rejects_the_response():
+    document = HEAD + '],\n"remark": "runtime error: Query timed out in \\"query\\" at line 3 after 181 seconds."\n}'
+
+    with pytest.raises(ValueError, match="timed out"):
+        list(iter_elements(_chunks(document)))
+
+
+def test_response_cut_off_after_the_elements_array_is_rejected():
+    with pytest.raises(ValueError):
+        list(iter_elements(_chunks(HEAD + '], "remark": "runtime err')))
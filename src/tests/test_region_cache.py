@@ -0,0 +1,19 @@
+from array import array
+
+from work_calculate_ways.csrGraph import CSRGraph
+from work_calculate_ways.regionCache import graph_signature
+
+
+def _triangle(indices, elevation=(0.0, 5.0, 9.0)):
+    # every node is joined to the other two; indices lists each node's arcs in some order
+    n = 3
+    return CSRGraph(array("d", [34.78, 34.79, 34.80]), array("d", [32.07, 32.08, 32.07]), array("d", elevation),
+                    array("i", [0, 2, 4, 6]), array("i", indices),
+                    array("d", [1.0] * 2 * n), array("d", [0.0] * 2 * n), array("d", [1.0] * 2 * n))
+
+
+def test_signature_ignores_arc_order_but_not_content():
+    signature = graph_signature(_triangle([1, 2, 0, 2, 0, 1]))
+
+    assert graph_signature(_triangle([2, 1, 2, 0, 1, 0])) == signature
+    assert graph_signature(_triangle([1, 2, 0, 2, 0, 1], elevation=(0.0, 5.0, 10.0))) != signature
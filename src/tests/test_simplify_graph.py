@@ -0,0 +1,70 @@
+import networkx as nx
+import pytest
+
+from work_calculate_ways.csrGraph import CSRGraph
+from work_calculate_ways.osm import edge_climb, expand_path, simplify_graph
+
+
+def _road_graph(edges):
+    G = nx.Graph()
+    for u, v, distance, rise in edges:
+        climb, descent = (rise, 0.0) if rise > 0 else (0.0, -rise)
+        if v < u:
+            climb, descent = descent, climb
+        G.add_edge(u, v, streets={"Loop"}, distance=distance, weight=distance, slope=1.0,
+                   climb=climb, descent=descent)
+    node_data = {node: {"latitude": node[1], "longitude": node[0], "elevation": 0.0,
+                        "streets": {"Loop"}, "highway": "residential"} for node in G.nodes}
+    return G, node_data
+
+
+def _loop_totals(G, nodes):
+    distance = climb = 0.0
+    for u, v in zip(nodes, nodes[1:]):
+        distance += G.edges[u, v]["distance"]
+        climb += edge_climb(u, v, G.edges[u, v])[0]
+    return distance, climb
+
+
+def test_single_anchor_loop_keeps_its_whole_length():
+    anchor, spur = (0.0, 0.0), (-1.0, 0.0)
+    ring = [anchor, (1.0, 0.0), (2.0, 0.0), (2.0, 1.0), (1.0, 1.0), (0.0, 1.0), anchor]
+    edges = [(u, v, 100.0 + i, 3.0 if i % 2 else -1.0) for i, (u, v) in enumerate(zip(ring, ring[1:]))]
+    G, node_data = _road_graph(edges + [(spur, anchor, 50.0, 0.0)])
+
+    H, simplified_data = simplify_graph(G, node_data, target_nodes=1, start_node=spur)
+
+    loop_edges = [(u, v) for u, v in H.edges if u != spur and v != spur]
+    assert len(loop_edges) == 3
+    kept = [node for node in H.nodes if node not in (anchor, spur)]
+    assert len(kept) == 2 and set(simplified_data) == set(H.nodes)
+
+    # walking the three contracted edges around the loop covers the original ring exactly
+    first, second = sorted(kept, key=ring.index)
+    path = [anchor, first, second, anchor]
+    assert _loop_totals(H, path) == _loop_totals(G, ring)
+    assert expand_path(H, path) == ring
+
+
+def test_csr_graph_contracts_like_networkx():
+    # a ring through one anchor, a spur, and two roads between the same two nodes
+    elevation = {(0.0, 0.0): 10.0, (1.0, 0.0): 14.0, (2.0, 0.0): 12.0, (2.0, 1.0): 20.0, (1.0, 1.0): 11.0,
+                 (0.0, 1.0): 9.0, (-1.0, 0.0): 10.0, (-2.0, 0.0): 15.0, (-2.0, -1.0): 13.0, (-1.0, -1.0): 12.0}
+    ring = [(0.0, 0.0), (1.0, 0.0), (2.0, 0.0), (2.0, 1.0), (1.0, 1.0), (0.0, 1.0), (0.0, 0.0)]
+    roads = [(-1.0, 0.0), (-2.0, 0.0), (-2.0, -1.0), (-1.0, -1.0), (0.0, 0.0)]
+    edges = list(zip(ring, ring[1:])) + [((0.0, 0.0), (-1.0, 0.0))] + list(zip(roads, roads[1:]))
+    G, node_data = _road_graph([(u, v, 100.0 + i, elevation[v] - elevation[u]) for i, (u, v) in enumerate(edges)])
+    for node, info in node_data.items():
+        info["elevation"] = elevation[node]
+    C = CSRGraph.from_networkx(G, node_data)
+
+    for target in (1, 100):
+        H, simplified_data = simplify_graph(G, node_data, target_nodes=target, start_node=(-1.0, 0.0))
+        H_csr, csr_data = simplify_graph(C, node_data, target_nodes=target, start_node=(-1.0, 0.0))
+        assert set(H_csr.nodes) == set(H.nodes) and set(csr_data) == set(simplified_data)
+        assert {frozenset(edge) for edge in H_csr.edges} == {frozenset(edge) for edge in H.edges}
+        for u, v, data in H.edges(data=True):
+            csr_edge = H_csr.edges[u, v]
+            for key in ("distance", "weight", "slope", "climb", "descent"):
+                assert csr_edge[key] == pytest.approx(data[key])
+            assert set(csr_edge["streets"]) == set(data["streets"])
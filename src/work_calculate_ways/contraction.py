@@ -0,0 +1,266 @@
+import heapq
+import logging
+import os
+import sys
+from array import array
+
+from work_calculate_ways.graphStore import write_sections, map_sections
+from work_calculate_ways.metrics import record_search
+
+logger = logging.getLogger(__name__)
+
+# Contraction Hierarchies over a CSRGraph. Nodes are contracted one by one in order of
+# importance; whenever removing a node would lengthen a shortest path between two of its
+# remaining neighbors, a shortcut edge is added. A query then only relaxes edges towards
+# more important nodes from both ends and meets near the top of the hierarchy.
+WITNESS_SETTLE_LIMIT = 500
+METRICS = ("distance", "slope")
+
+
+def hierarchy_path(artifact_path, metric):
+    return f"{os.path.splitext(artifact_path)[0]}.{metric}.ch"
+
+
+def artifact_fingerprint(artifact_path):
+    """[size, mtime_ns] of a graph artifact; rewriting the artifact changes it."""
+    st = os.stat(artifact_path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class ContractionHierarchy:
+    """
+    The upward graph of a contracted road graph. For every node, up_indices lists its
+    neighbors of higher rank, with up_cost the edge cost and up_middle the contracted node
+    a shortcut bypasses (-1 for an original edge). artifact is the artifact_fingerprint
+    of the graph artifact it was built from, if any.
+    """
+
+    def __init__(self, metric, rank, up_indptr, up_indices, up_cost, up_middle, max_edge_cost, artifact=None):
+        self.metric = metric
+        self.rank = rank
+        self.up_indptr = up_indptr
+        self.up_indices = up_indices
+        self.up_cost = up_cost
+        self.up_middle = up_middle
+        self.max_edge_cost = max_edge_cost
+        self.num_nodes = len(rank)
+        self.artifact = artifact
+
+    def save(self, path):
+        write_sections(path, {
+            "rank": self.rank, "up_indptr": self.up_indptr, "up_indices": self.up_indices,
+            "up_cost": self.up_cost, "up_middle": self.up_middle,
+        }, {"metric": self.metric, "num_nodes": self.num_nodes, "max_edge_cost": self.max_edge_cost,
+            "artifact": self.artifact})
+        logger.info("💾 Saved %s contraction hierarchy to %s", self.metric, path)
+
+    @classmethod
+    def load(cls, path):
+        header, s = map_sections(path)
+        return cls(header["metric"], s["rank"], s["up_indptr"], s["up_indices"], s["up_cost"],
+                   s["up_middle"], header["max_edge_cost"], header.get("artifact"))
+
+    def _up_arc(self, a, b):
+        """Index of the upward arc joining a and b, stored at the lower ranked of the two."""
+        if self.rank[a] > self.rank[b]:
+            a, b = b, a
+        for k in range(self.up_indptr[a], self.up_indptr[a + 1]):
+            if self.up_indices[k] == b:
+                return k
+        raise KeyError((a, b))
+
+    def _unpack(self, a, b, out):
+        """Append the original nodes between a and b (excluding a) to out."""
+        stack = [(a, b)]
+        while stack:
+            a, b = stack.pop()
+            middle = self.up_middle[self._up_arc(a, b)]
+            if middle < 0:
+                out.append(b)
+            else:
+                stack.append((middle, b))
+                stack.append((a, middle))
+
+    def query(self, source, target):
+        """Bidirectional upward Dijkstra. Returns the unpacked list of node ids, or None."""
+        if source == target:
+            return [source]
+        up_indptr, up_indices, up_cost = self.up_indptr, self.up_indices, self.up_cost
+        dist = ({source: 0.0}, {target: 0.0})
+        pred = ({source: -1}, {target: -1})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meeting = float("inf"), -1
+        expanded, pushes = 0, 2
+
+        while heaps[0] or heaps[1]:
+            for side in (0, 1):
+                heap = heaps[side]
+                if not heap:
+                    continue
+                if heap[0][0] >= best:
+                    heap.clear()
+                    continue
+                d, u = heapq.heappop(heap)
+                if d > dist[side][u]:
+                    continue  # stale heap entry
+                expanded += 1
+                other = dist[1 - side].get(u)
+                if other is not None and d + other < best:
+                    best, meeting = d + other, u
+                for k in range(up_indptr[u], up_indptr[u + 1]):
+                    v = up_indices[k]
+                    nd = d + up_cost[k]
+                    if nd < dist[side].get(v, float("inf")):
+                        dist[side][v] = nd
+                        pred[side][v] = u
+                        heapq.heappush(heap, (nd, v))
+                        pushes += 1
+
+        record_search("contraction_hierarchy", expanded, pushes)
+        if meeting < 0:
+            return None
+        up_path = [meeting]
+        while pred[0][up_path[-1]] != -1:
+            up_path.append(pred[0][up_path[-1]])
+        up_path.reverse()
+        node = meeting
+        while pred[1][node] != -1:
+            node = pred[1][node]
+            up_path.append(node)
+
+        path = [up_path[0]]
+        for a, b in zip(up_path, up_path[1:]):
+            self._unpack(a, b, path)
+        return path
+
+
+def _witness_distances(adj, source, skip, targets, max_cost):
+    """Dijkstra from source in the remaining graph without skip, bounded by max_cost."""
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    remaining = set(targets)
+    settled = 0
+    while heap and remaining:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        if d > max_cost:
+            break
+        remaining.discard(u)
+        settled += 1
+        if settled > WITNESS_SETTLE_LIMIT:
+            break
+        for v, (cost, _) in adj[u].items():
+            if v == skip:
+                continue
+            nd = d + cost
+            if nd < dist.get(v, float("inf")):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+def _shortcuts(adj, v):
+    """The shortcuts needed to contract v, as a list of (u, w, cost)."""
+    neighbors = list(adj[v].items())
+    shortcuts = []
+    for i, (u, (cost_u, _)) in enumerate(neighbors):
+        others = neighbors[i + 1:]
+        if not others:
+            continue
+        max_cost = cost_u + max(cost for _, (cost, _) in others)
+        witness = _witness_distances(adj, u, v, [w for w, _ in others], max_cost)
+        for w, (cost_w, _) in others:
+            through_v = cost_u + cost_w
+            if witness.get(w, float("inf")) > through_v:
+                shortcuts.append((u, w, through_v))
+    return shortcuts
+
+
+def build_contraction_hierarchy(graph, metric="distance"):
+    """Contract a CSRGraph for one of its per-arc cost arrays ("distance" or "slope")."""
+    costs = getattr(graph, metric)
+    n = graph.num_nodes
+    adj = [dict() for _ in range(n)]
+    for u in range(n):
+        for k in range(graph.indptr[u], graph.indptr[u + 1]):
+            v = graph.indices[k]
+            if v != u and costs[k] < adj[u].get(v, (float("inf"),))[0]:
+                adj[u][v] = (costs[k], -1)
+                adj[v][u] = (costs[k], -1)
+    max_edge_cost = max(costs) if len(costs) else 0.0
+
+    deleted_neighbors = [0] * n
+
+    def priority(v):
+        return len(_shortcuts(adj, v)) - len(adj[v]) + deleted_neighbors[v]
+
+    heap = [(priority(v), v) for v in range(n)]
+    heapq.heapify(heap)
+    rank = array("i", [0] * n)
+    up = [None] * n
+    contracted = 0
+    while heap:
+        _, v = heapq.heappop(heap)
+        if up[v] is not None:
+            continue
+        # lazy update: re-evaluate and postpone v if it is no longer the least important node
+        current = priority(v)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, v))
+            continue
+
+        for u, w, cost in _shortcuts(adj, v):
+            if cost < adj[u].get(w, (float("inf"),))[0]:
+                adj[u][w] = (cost, v)
+                adj[w][u] = (cost, v)
+        up[v] = adj[v]
+        rank[v] = contracted
+        contracted += 1
+        for u in up[v]:
+            del adj[u][v]
+            deleted_neighbors[u] += 1
+        adj[v] = {}
+        if contracted % 10000 == 0:
+            logger.info("⏳ Contracted %d/%d nodes", contracted, n)
+
+    up_indptr, up_indices = array("i", [0]), array("i")
+    up_cost, up_middle = array("d"), array("i")
+    for v in range(n):
+        for w, (cost, middle) in up[v].items():
+            up_indices.append(w)
+            up_cost.append(cost)
+            up_middle.append(middle)
+        up_indptr.append(len(up_indices))
+    logger.info("✅ Built %s contraction hierarchy with %d upward edges for %d nodes", metric, len(up_indices), n)
+    return ContractionHierarchy(metric, rank, up_indptr, up_indices, up_cost, up_middle, max_edge_cost)
+
+
+def attach_hierarchies(graph, artifact_path):
+    """
+    Attach every hierarchy prebuilt for artifact_path to the graph loaded from it. A
+    hierarchy built from an earlier version of the artifact is ignored.
+    """
+    fingerprint = artifact_fingerprint(artifact_path)
+    for metric in METRICS:
+        path = hierarchy_path(artifact_path, metric)
+        if os.path.exists(path):
+            hierarchy = ContractionHierarchy.load(path)
+            if hierarchy.artifact == fingerprint and hierarchy.num_nodes == graph.num_nodes:
+                graph.hierarchies[metric] = hierarchy
+                logger.info("📂 Loaded %s contraction hierarchy from %s", metric, path)
+            else:
+                logger.warning("⚠️ Ignoring stale contraction hierarchy %s", path)
+
+
+if __name__ == "__main__":
+    from work_calculate_ways.graphStore import graph_artifact_path, load_graph_artifact
+    from work_calculate_ways.csrGraph import CSRGraph
+    from city import city_name
+
+    artifact_path = sys.argv[1] if len(sys.argv) > 1 else graph_artifact_path(city_name)
+    graph = CSRGraph.from_artifact(load_graph_artifact(artifact_path))
+    for metric in METRICS:
+        hierarchy = build_contraction_hierarchy(graph, metric)
+        hierarchy.artifact = artifact_fingerprint(artifact_path)
+        hierarchy.save(hierarchy_path(artifact_path, metric))
@@ -0,0 +1,241 @@
+import logging
+from array import array
+from math import radians, sin, cos, asin, sqrt
+
+from work_calculate_ways.geometry import climb_descent
+from work_calculate_ways.search import astar, bidirectional_astar, pareto_search
+
+logger = logging.getLogger(__name__)
+
+
+class CSRGraph:
+    """
+    Read-only road graph with integer node ids and contiguous per-arc arrays.
+
+    Arcs of node i are indices[indptr[i]:indptr[i + 1]], and distance/slope/weight
+    hold the matching edge attributes. Every undirected edge is stored as two arcs.
+    climb holds the meters climbed going along each arc, derived once from elevation.
+    Nodes can be addressed either by integer id or by their (lon, lat) tuple, so the
+    graph can be passed wherever pathFinding expects a networkx graph for routing.
+    ids, when given, is an existing (lon, lat) -> id map to share, such as NodeTable.ids.
+    """
+
+    def __init__(self, lon, lat, elevation, indptr, indices, distance, slope, weight,
+                 arc_street_sets=None, street_set=None, ids=None):
+        self.lon = lon
+        self.lat = lat
+        self.elevation = elevation
+        self.indptr = indptr
+        self.indices = indices
+        self.distance = distance
+        self.slope = slope
+        self.weight = weight
+        self.arc_street_sets = arc_street_sets
+        self.street_set = street_set
+        self.num_nodes = len(lon)
+        # contraction hierarchies by metric name, see contraction.attach_hierarchies
+        self.hierarchies = {}
+        self._ids = ids
+        # derived arrays of the searches, built on first use: cached region graphs are
+        # only contracted (osm.simplify_graph), never searched directly
+        self._lon_rad = self._lat_rad = self._cos_lat = None
+        self._climb = None
+
+    @property
+    def climb(self):
+        if self._climb is None:
+            climb = array("d", bytes(8 * len(self.indices)))
+            indptr, indices, elevation = self.indptr, self.indices, self.elevation
+            for u in range(self.num_nodes):
+                for k in range(indptr[u], indptr[u + 1]):
+                    rise = elevation[indices[k]] - elevation[u]
+                    if rise > 0:
+                        climb[k] = rise
+            self._climb = climb
+        return self._climb
+
+    def _build_radians(self):
+        lat_rad = array("d", (radians(x) for x in self.lat))
+        self._lon_rad = array("d", (radians(x) for x in self.lon))
+        self._lat_rad = lat_rad
+        self._cos_lat = array("d", (cos(x) for x in lat_rad))
+
+    @classmethod
+    def from_networkx(cls, G, node_data):
+        nodes = list(G.nodes)
+        index = {node: i for i, node in enumerate(nodes)}
+        lon, lat, elevation = array("d"), array("d"), array("d")
+        indptr, indices = array("i", [0]), array("i")
+        distance, slope, weight = array("d"), array("d"), array("d")
+        arc_streets = []
+        for node in nodes:
+            info = node_data.get(node, {})
+            lon.append(info.get("longitude", node[0]))
+            lat.append(info.get("latitude", node[1]))
+            elevation.append(info.get("elevation", 0.0))
+            for neighbor, data in G.adj[node].items():
+                indices.append(index[neighbor])
+                distance.append(data.get("distance", 0.0))
+                slope.append(data.get("slope", 0.0))
+                weight.append(data.get("weight", 0.0))
+                arc_streets.append(data.get("streets", set()))
+            indptr.append(len(indices))
+        return cls(lon, lat, elevation, indptr, indices, distance, slope, weight,
+                   list(range(len(arc_streets))), lambda k: arc_streets[k], index)
+
+    @classmethod
+    def from_artifact(cls, artifact, ids=None):
+        """Wrap a memory-mapped GraphArtifact without copying its arrays."""
+        return cls(artifact.lon, artifact.lat, artifact.elevation, artifact.indptr, artifact.indices,
+                   artifact.distance, artifact.slope, artifact.weight,
+                   artifact.arc_streets, artifact.street_set, ids)
+
+    # ---- node addressing ----
+
+    def coord(self, i):
+        return self.lon[i], self.lat[i]
+
+    def node_id(self, node):
+        if isinstance(node, int):
+            return node if 0 <= node < self.num_nodes else None
+        if self._ids is None:
+            self._ids = {self.coord(i): i for i in range(self.num_nodes)}
+        return self._ids.get(tuple(node))
+
+    def __contains__(self, node):
+        return self.node_id(node) is not None
+
+    def __len__(self):
+        return self.num_nodes
+
+    # ---- networkx style read API ----
+
+    @property
+    def nodes(self):
+        return [self.coord(i) for i in range(self.num_nodes)]
+
+    def number_of_nodes(self):
+        return self.num_nodes
+
+    def number_of_edges(self):
+        return len(self.indices) // 2
+
+    def arc(self, u, v):
+        """Return the arc index of edge u -> v (integer ids), or -1."""
+        indices = self.indices
+        for k in range(self.indptr[u], self.indptr[u + 1]):
+            if indices[k] == v:
+                return k
+        return -1
+
+    def neighbors(self, node):
+        u = self.node_id(node)
+        ids = [self.indices[k] for k in range(self.indptr[u], self.indptr[u + 1])]
+        return ids if isinstance(node, int) else [self.coord(v) for v in ids]
+
+    def has_edge(self, u, v):
+        u, v = self.node_id(u), self.node_id(v)
+        return u is not None and v is not None and self.arc(u, v) >= 0
+
+    def edge_data(self, u, v):
+        a, b = self.node_id(u), self.node_id(v)
+        k = self.arc(a, b) if a is not None and b is not None else -1
+        if k < 0:
+            raise KeyError((u, v))
+        climb, descent = climb_descent(self.coord(a), self.coord(b), self.elevation[a], self.elevation[b])
+        data = {"distance": self.distance[k], "slope": self.slope[k], "weight": self.weight[k],
+                "climb": climb, "descent": descent}
+        if self.arc_street_sets is not None:
+            data["streets"] = self.street_set(self.arc_street_sets[k])
+        return data
+
+    @property
+    def edges(self):
+        return _EdgeView(self)
+
+    # ---- routing ----
+
+    def haversine(self, u, v):
+        if self._cos_lat is None:
+            self._build_radians()
+        dlon = self._lon_rad[v] - self._lon_rad[u]
+        dlat = self._lat_rad[v] - self._lat_rad[u]
+        a = sin(dlat / 2) ** 2 + self._cos_lat[u] * self._cos_lat[v] * sin(dlon / 2) ** 2
+        return 2 * asin(sqrt(a)) * 6371000
+
+    def arcs(self, cost, max_cost=float("inf")):
+        """A neighbors(u) function over one of the per-arc cost arrays, for the search core."""
+        indptr, indices = self.indptr, self.indices
+        if max_cost == float("inf"):
+            return lambda u: zip(indices[indptr[u]:indptr[u + 1]], cost[indptr[u]:indptr[u + 1]])
+
+        def neighbors(u):
+            start, end = indptr[u], indptr[u + 1]
+            return [(v, c) for v, c in zip(indices[start:end], cost[start:end]) if c <= max_cost]
+        return neighbors
+
+    def _route(self, start, goal, search):
+        s, t = self.node_id(start), self.node_id(goal)
+        if s is None or t is None:
+            logger.warning("⚠️ Start or goal node is not in the graph.")
+            return None
+        path = search(s, t)
+        if path is None or isinstance(start, int):
+            return path
+        return [self.coord(i) for i in path]
+
+    def shortest_path(self, start, goal, bidirectional=False):
+        hierarchy = self.hierarchies.get("distance")
+        if hierarchy is not None:
+            return self._route(start, goal, hierarchy.query)
+        neighbors = self.arcs(self.distance)
+        if bidirectional:
+            return self._route(start, goal, lambda s, t: bidirectional_astar(
+                neighbors, s, t, estimate=self.haversine)[0])
+        return self._route(start, goal, lambda s, t: astar(
+            neighbors, s, t, heuristic=lambda v: self.haversine(v, t))[0])
+
+    def flattest_path(self, start, goal, max_slope=float("inf"), bidirectional=False):
+        hierarchy = self.hierarchies.get("slope")
+        # the hierarchy is built without a slope limit, so it only applies when no edge is excluded
+        if hierarchy is not None and max_slope >= hierarchy.max_edge_cost:
+            return self._route(start, goal, hierarchy.query)
+        search = bidirectional_astar if bidirectional else astar
+        return self._route(start, goal, lambda s, t: search(self.arcs(self.slope, max_slope), s, t)[0])
+
+    def pareto_paths(self, start, goal, max_slope=float("inf"), epsilon=0.0):
+        """Pareto front of distance against climb, as [(path, distance, climb)]; see search.pareto_search."""
+        s, t = self.node_id(start), self.node_id(goal)
+        if s is None or t is None:
+            logger.warning("⚠️ Start or goal node is not in the graph.")
+            return []
+        indptr, indices, distance, climb, slope = self.indptr, self.indices, self.distance, self.climb, self.slope
+
+        def neighbors(u):
+            a, b = indptr[u], indptr[u + 1]
+            return [(v, d, c) for v, d, c, sl in zip(indices[a:b], distance[a:b], climb[a:b], slope[a:b])
+                    if sl <= max_slope]
+
+        front = pareto_search(neighbors, s, t, heuristic=lambda v: self.haversine(v, t), epsilon=epsilon)
+        if isinstance(start, int):
+            return front
+        return [([self.coord(i) for i in path], d, c) for path, d, c in front]
+
+
+class _EdgeView:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, edge):
+        return self.graph.edge_data(*edge)
+
+    def __contains__(self, edge):
+        return self.graph.has_edge(*edge)
+
+    def __iter__(self):
+        graph = self.graph
+        for u in range(graph.num_nodes):
+            for k in range(graph.indptr[u], graph.indptr[u + 1]):
+                v = graph.indices[k]
+                if u <= v:
+                    yield graph.coord(u), graph.coord(v)
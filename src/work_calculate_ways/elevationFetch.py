@@ -0,0 +1,106 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from work_calculate_ways import elevationStore
+
+logger = logging.getLogger(__name__)
+
+# Elevation fetch pipeline: only coordinates missing from the elevation store are
+# requested, in batches that run concurrently under a shared token bucket, with
+# retry/backoff per batch. Every finished batch is appended to the store right away.
+ELEVATION_API_URL = os.environ.get("ELEVATION_API_URL", "https://api.open-elevation.com/api/v1/lookup")
+BATCH_SIZE = 1000
+MAX_CONCURRENCY = 4
+REQUESTS_PER_SECOND = 1.0
+BURST = 2
+MAX_RETRIES = 4
+BACKOFF_SECONDS = 1.0
+TIMEOUT_SECONDS = 10
+
+
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a request may be sent."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_bucket = TokenBucket(REQUESTS_PER_SECOND, BURST)
+
+
+def fetch_batch(batch, url=None, bucket=None):
+    """Fetch one batch of (lon, lat) points. Returns {(lon, lat): elevation}, empty on failure."""
+    url = url or ELEVATION_API_URL
+    bucket = bucket or _bucket
+    locations = [{"latitude": lat, "longitude": lon} for lon, lat in batch]
+    for attempt in range(MAX_RETRIES + 1):
+        bucket.acquire()
+        try:
+            response = requests.post(url, json={"locations": locations}, timeout=TIMEOUT_SECONDS)
+            if response.status_code == 200:
+                # key results by the requested coordinates so they match graph nodes exactly
+                data = response.json().get("results", [])
+                return {coord: item["elevation"] for coord, item in zip(batch, data)
+                        if item.get("elevation") is not None}
+            retryable = response.status_code == 429 or response.status_code >= 500
+            logger.warning("❌ Failed to fetch elevation data (status %d): %s", response.status_code, response.text[:200])
+            if not retryable:
+                return {}
+        except requests.RequestException as e:
+            logger.warning("❌ Elevation API error: %s", e)
+        if attempt < MAX_RETRIES:
+            time.sleep(BACKOFF_SECONDS * 2 ** attempt * (1 + random.random()))
+    return {}
+
+
+def fetch_missing_elevations(coords, url=None, max_concurrency=MAX_CONCURRENCY):
+    """
+    Elevations for coords as {(lon, lat): elevation}. Points already in the store are
+    answered locally; only the rest go to the elevation API.
+    """
+    known = elevationStore.get_elevations()
+    results = {}
+    missing = []
+    for coord in dict.fromkeys(coords):
+        if coord in known:
+            results[coord] = known[coord]
+        else:
+            missing.append(coord)
+    if not missing:
+        return results
+
+    batches = [missing[i:i + BATCH_SIZE] for i in range(0, len(missing), BATCH_SIZE)]
+    logger.info("🌍 Fetching elevation for %d missing points in %d batches (%d already known)...",
+                len(missing), len(batches), len(results))
+    fetched_count = 0
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = [executor.submit(fetch_batch, batch, url) for batch in batches]
+        for future in as_completed(futures):
+            fetched = future.result()
+            elevationStore.add_elevations(fetched)
+            results.update(fetched)
+            fetched_count += len(fetched)
+    logger.info("✅ Successfully fetched %d elevations.", fetched_count)
+    return results
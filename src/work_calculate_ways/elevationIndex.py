@@ -0,0 +1,99 @@
+import threading
+
+from work_calculate_ways.spatialIndex import GridIndex
+
+# Elevation lookups over the known elevation samples (lon, lat) -> meters.
+# Points are answered by exact match first, then from the spatial index.
+INTERPOLATION_NEIGHBORS = 4
+
+
+def parse_coordinate_key(key):
+    """Parse a "(x, y)" key as written to elevation.json."""
+    x, y = key.strip().strip("()").split(",")
+    return float(x), float(y)
+
+
+class ElevationIndex:
+    def __init__(self, elevations):
+        self.elevations = elevations
+        # a snapshot: list() copies the keys without releasing the GIL, so samples that
+        # elevationStore.add_elevations appends meanwhile cannot break the iteration
+        points = list(elevations)
+        # samples added to elevations later are answered by exact match only, until a rebuild
+        self.size = len(points)
+        self._points = points
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    @property
+    def index(self):
+        # built on the first point without an exact sample, so bulk lookups of known points skip it
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = GridIndex.from_points(self._points)
+                    self._points = None
+        return self._index
+
+    def __len__(self):
+        return self.size
+
+    def nearest(self, point, max_distance=float("inf")):
+        """Elevation of the closest sample, or None. Returns (elevation, coordinate, distance_m)."""
+        elevation = self.elevations.get(point)
+        if elevation is not None:
+            return elevation, point, 0.0
+        found = self.index.nearest_k(point, 1)
+        if not found or found[0][0] > max_distance:
+            return None, None, None
+        distance, coord = found[0]
+        return self.elevations[coord], coord, distance
+
+    def interpolate(self, point, k=INTERPOLATION_NEIGHBORS, max_distance=float("inf")):
+        """Inverse distance weighted elevation of the k closest samples, or None."""
+        elevation = self.elevations.get(point)
+        if elevation is not None:
+            return elevation
+        found = [(d, c) for d, c in self.index.nearest_k(point, k) if d <= max_distance]
+        if not found:
+            return None
+        if found[0][0] == 0:
+            return self.elevations[found[0][1]]
+        weights = [1 / (d * d) for d, _ in found]
+        return sum(w * self.elevations[c] for w, (_, c) in zip(weights, found)) / sum(weights)
+
+    def lookup_many(self, points, method="nearest", default=None, max_distance=float("inf")):
+        """
+        Elevations for a whole array of points, in order. Exact samples are answered in one
+        pass; only the remaining points go to the spatial index.
+        """
+        results = list(map(self.elevations.get, points))
+        for i, elevation in enumerate(results):
+            if elevation is None:
+                if method == "interpolated":
+                    elevation = self.interpolate(points[i], max_distance=max_distance)
+                else:
+                    elevation = self.nearest(points[i], max_distance)[0]
+                results[i] = default if elevation is None else elevation
+        return results
+
+
+_cached = (None, None)
+_build_lock = threading.Lock()
+
+
+def get_elevation_index(elevation_dict):
+    """
+    Index of a (lon, lat) -> elevation dict, reused while the same dict is passed in and
+    rebuilt once samples were added to it.
+    """
+    global _cached
+    source, index = _cached
+    if source is elevation_dict and len(index) == len(elevation_dict):
+        return index
+    with _build_lock:
+        source, index = _cached
+        if source is not elevation_dict or len(index) != len(elevation_dict):
+            index = ElevationIndex(elevation_dict)
+            _cached = (elevation_dict, index)
+    return index
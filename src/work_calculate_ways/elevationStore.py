@@ -0,0 +1,88 @@
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+
+from work_calculate_ways.elevationIndex import parse_coordinate_key
+
+logger = logging.getLogger(__name__)
+
+# Elevation samples live in a SQLite table with typed lon/lat/elevation columns and an
+# indexed grid cell key for queries by area. Each process loads the table once into
+# memory and appends new samples to both, so requests never parse elevation files.
+STORE_PATH = "elevation.sqlite"
+LEGACY_JSON_PATH = "elevation.json"
+CELL_SIZE = 0.01  # degrees
+CELL_ROW = 1_000_000
+
+_elevations = None
+_lock = threading.Lock()
+
+
+def cell_key(lon, lat):
+    return math.floor(lat / CELL_SIZE) * CELL_ROW + math.floor(lon / CELL_SIZE)
+
+
+def _connect():
+    conn = sqlite3.connect(STORE_PATH, timeout=30)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS elevation (
+            lon REAL NOT NULL,
+            lat REAL NOT NULL,
+            elevation REAL NOT NULL,
+            cell INTEGER NOT NULL,
+            PRIMARY KEY (lon, lat)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS elevation_cell ON elevation (cell)")
+    return conn
+
+
+def _write(conn, elevations):
+    conn.executemany(
+        "INSERT OR REPLACE INTO elevation (lon, lat, elevation, cell) VALUES (?, ?, ?, ?)",
+        ((lon, lat, elev, cell_key(lon, lat)) for (lon, lat), elev in elevations.items()))
+    conn.commit()
+
+
+def _migrate_legacy_json(conn):
+    """Import the str((lon, lat))-keyed elevation.json the first time the store is created."""
+    if not os.path.exists(LEGACY_JSON_PATH):
+        return
+    with open(LEGACY_JSON_PATH, "r") as f:
+        raw = json.load(f)
+    _write(conn, {parse_coordinate_key(k): v for k, v in raw.items() if v is not None})
+    logger.info("✅ Imported %d elevations from %s into %s", len(raw), LEGACY_JSON_PATH, STORE_PATH)
+
+
+def get_elevations():
+    """All known elevations as {(lon, lat): elevation}, loaded once per process."""
+    global _elevations
+    if _elevations is None:
+        with _lock:
+            if _elevations is None:
+                conn = _connect()
+                try:
+                    if conn.execute("SELECT COUNT(*) FROM elevation").fetchone()[0] == 0:
+                        _migrate_legacy_json(conn)
+                    _elevations = {(lon, lat): elev for lon, lat, elev in
+                                   conn.execute("SELECT lon, lat, elevation FROM elevation")}
+                finally:
+                    conn.close()
+    return _elevations
+
+
+def add_elevations(elevations):
+    """Persist new {(lon, lat): elevation} samples and add them to the in-process copy."""
+    if not elevations:
+        return
+    known = get_elevations()
+    with _lock:
+        conn = _connect()
+        try:
+            _write(conn, elevations)
+        finally:
+            conn.close()
+        known.update(elevations)
@@ -0,0 +1,53 @@
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from math import sin, cos
+
+# Local stand-in for the open-elevation lookup API, for tests and benchmarks:
+#   python -m work_calculate_ways.elevationStub [port]
+#   ELEVATION_API_URL=http://127.0.0.1:<port>/api/v1/lookup python app.py
+
+
+def synthetic_elevation(lat, lon):
+    """Deterministic rolling terrain, in meters."""
+    return round(40 + 25 * sin(lat * 700) + 15 * cos(lon * 900), 1)
+
+
+class ElevationStubHandler(BaseHTTPRequestHandler):
+    elevation = staticmethod(synthetic_elevation)
+
+    def do_POST(self):
+        if self.path != "/api/v1/lookup":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        results = [{"latitude": loc["latitude"], "longitude": loc["longitude"],
+                    "elevation": self.elevation(loc["latitude"], loc["longitude"])}
+                   for loc in body.get("locations", [])]
+        payload = json.dumps({"results": results}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, elevation=None):
+    """Serve the stub on a background thread. Returns (server, lookup_url)."""
+    handler = ElevationStubHandler
+    if elevation is not None:
+        handler = type("CustomElevationStubHandler", (ElevationStubHandler,),
+                       {"elevation": staticmethod(elevation)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/v1/lookup"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8090
+    print(f"Starting elevation stub on 127.0.0.1:{port}")
+    ThreadingHTTPServer(("127.0.0.1", port), ElevationStubHandler).serve_forever()
@@ -1,6 +1,43 @@
+import logging
+
 import requests
 
+import city
+from work_calculate_ways import geocodeCache, streetIndex
+from work_calculate_ways.geocodeCache import normalize_query
+from work_calculate_ways.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Two tiers before Nominatim: cached results by normalized query (memory, then the
+# SQLite file), then the local street index built from the loaded graphs.
+
+
 def get_bbox_from_city_name(city_name):
+    query = normalize_query(city_name or "")
+    found, bbox = geocodeCache.get("bbox", query)
+    if found:
+        return bbox
+    bbox = fetch_bbox_from_city_name(city_name)
+    geocodeCache.put("bbox", query, bbox)
+    return bbox
+
+@timed("geocode")
+def geocode_address(address):
+    query = normalize_query(address or "")
+    found, coords = geocodeCache.get("address", query)
+    if found:
+        return coords
+    coords = streetIndex.lookup(address or "", city.city_name)
+    if coords is not None:
+        # תשובה מקומית לא נשמרת בקובץ, כי אינדקס הרחובות תלוי בגרפים שנטענו
+        geocodeCache.put("address", query, coords, persist=False)
+        return coords
+    coords = fetch_geocode_address(address)
+    geocodeCache.put("address", query, coords)
+    return coords
+
+def fetch_bbox_from_city_name(city_name):
     url = "https://nominatim.openstreetmap.org/search"
     params = {
         "q": city_name,
@@ -24,13 +61,14 @@ def get_bbox_from_city_name(city_name):
             min_lon, max_lon = float(bbox[2]), float(bbox[3])
             return min_lat, min_lon, max_lat, max_lon
         else:
-            print(f"❌ No bounding box found for {city_name}")
+            logger.warning("❌ No bounding box found for %s", city_name)
             return None
     except Exception as e:
-        print(f"❌ Error fetching bbox for {city_name}: {str(e)}")
+        logger.error("❌ Error fetching bbox for %s: %s", city_name, e)
         return None
 
-def geocode_address(address):
+@timed("nominatim")
+def fetch_geocode_address(address):
     url = "https://nominatim.openstreetmap.org/search"
     params = {
         "q": address,
@@ -47,8 +85,8 @@ def geocode_address(address):
             result = response.json()[0]
             return float(result["lat"]), float(result["lon"])
         else:
-            print(f"❌ Geocoding failed for {address}: {response.text}")
+            logger.warning("❌ Geocoding failed for %s: %s", address, response.text)
             return None
     except Exception as e:
-        print(f"❌ Geocoding error for {address}: {str(e)}")
+        logger.error("❌ Geocoding error for %s: %s", address, e)
         return None
\ No newline at end of file
@@ -0,0 +1,95 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from work_calculate_ways import metrics
+
+# Geocoding results by normalized query: an in-process LRU in front of a SQLite file
+# that survives restarts. Failed lookups are only remembered in memory, briefly, so a
+# Nominatim outage never gets persisted.
+STORE_PATH = os.environ.get("GEOCODE_CACHE_DB", "geocode.sqlite")
+MAX_ENTRIES = 5000
+TTL_SECONDS = 30 * 24 * 3600
+NEGATIVE_TTL_SECONDS = 600
+
+_entries = OrderedDict()  # (kind, query) -> (value, expires)
+_lock = threading.Lock()
+cache_stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+metrics.register_cache("geocode", cache_stats, _lock)
+
+
+def normalize_query(text):
+    """Lowercase, drop punctuation and collapse whitespace, so spelling variants share entries."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def _connect():
+    conn = sqlite3.connect(STORE_PATH, timeout=30)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS geocode (
+            kind TEXT NOT NULL,
+            query TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created REAL NOT NULL,
+            PRIMARY KEY (kind, query)
+        ) WITHOUT ROWID
+    ''')
+    return conn
+
+
+def _remember(key, value, ttl):
+    with _lock:
+        _entries[key] = (value, time.time() + ttl)
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def get(kind, query):
+    """(found, value) for a normalized query; value is None for a remembered failure."""
+    key = (kind, query)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[1] > time.time():
+            _entries.move_to_end(key)
+            cache_stats["hits"] += 1
+            return True, entry[0]
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT value, created FROM geocode WHERE kind = ? AND query = ?", key).fetchone()
+    finally:
+        conn.close()
+    if row is not None and row[1] + TTL_SECONDS > time.time():
+        value = tuple(json.loads(row[0]))
+        _remember(key, value, row[1] + TTL_SECONDS - time.time())
+        with _lock:
+            cache_stats["disk_hits"] += 1
+        return True, value
+    with _lock:
+        cache_stats["misses"] += 1
+    return False, None
+
+
+def put(kind, query, value, persist=True):
+    if value is None:
+        _remember((kind, query), None, NEGATIVE_TTL_SECONDS)
+        return
+    _remember((kind, query), value, TTL_SECONDS)
+    if not persist:
+        return
+    conn = _connect()
+    try:
+        conn.execute("INSERT OR REPLACE INTO geocode (kind, query, value, created) VALUES (?, ?, ?, ?)",
+                     (kind, query, json.dumps(value), time.time()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_cache_stats():
+    with _lock:
+        return dict(cache_stats, entries=len(_entries))
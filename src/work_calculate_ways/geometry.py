@@ -0,0 +1,61 @@
+import numpy as np
+from math import degrees, atan
+
+# Batch edge geometry over coordinate arrays. Every function takes NumPy arrays (or
+# anything np.asarray accepts) of equal length and returns one value per edge.
+EARTH_RADIUS = 6371000
+CLIMB_WEIGHT = 9  # meters of distance one meter of climb is worth in "weight"
+
+
+def haversine_many(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def slope_many(distance, elev_diff):
+    """Slope angle in degrees for horizontal distances and absolute elevation differences."""
+    distance = np.asarray(distance, dtype=np.float64)
+    elev_diff = np.abs(np.asarray(elev_diff, dtype=np.float64))
+    safe = np.where(distance == 0, 1.0, distance)
+    return np.where(distance == 0, 0.0, np.degrees(np.arctan(elev_diff / safe)))
+
+
+def weight_many(distance, elev_diff):
+    return np.asarray(distance, dtype=np.float64) + np.abs(np.asarray(elev_diff, dtype=np.float64)) * CLIMB_WEIGHT
+
+
+def climb_many(elev_diff):
+    """Meters climbed and descended along edges with signed elevation differences."""
+    elev_diff = np.asarray(elev_diff, dtype=np.float64)
+    return np.maximum(elev_diff, 0.0), np.maximum(-elev_diff, 0.0)
+
+
+def edge_attributes(u_coords, v_coords, u_elev, v_elev):
+    """
+    distance, slope, weight, climb and descent arrays for edges u -> v, where
+    u_coords/v_coords are (n, 2) arrays of (lon, lat) and u_elev/v_elev the node
+    elevations. climb and descent are measured going from u to v.
+    """
+    u_coords = np.asarray(u_coords, dtype=np.float64).reshape(-1, 2)
+    v_coords = np.asarray(v_coords, dtype=np.float64).reshape(-1, 2)
+    distance = haversine_many(u_coords[:, 0], u_coords[:, 1], v_coords[:, 0], v_coords[:, 1])
+    elev_diff = np.asarray(v_elev, dtype=np.float64) - np.asarray(u_elev, dtype=np.float64)
+    climb, descent = climb_many(elev_diff)
+    return distance, slope_many(distance, elev_diff), weight_many(distance, elev_diff), climb, descent
+
+
+def slope_angle(distance, elev_diff):
+    """Scalar slope_many, for single edges whose distance is already known."""
+    if distance == 0:
+        return 0.0
+    return degrees(atan(abs(elev_diff) / distance))
+
+
+def climb_descent(u, v, elev_u, elev_v):
+    """
+    Scalar climb and descent of edge (u, v). Undirected edges store them going from the
+    smaller (lon, lat) node to the larger one, whichever order the edge was added in.
+    """
+    elev_diff = elev_v - elev_u if u <= v else elev_u - elev_v
+    return max(elev_diff, 0.0), max(-elev_diff, 0.0)
@@ -0,0 +1,194 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from work_calculate_ways.nodeTable import NodeTable, StringTable
+
+logger = logging.getLogger(__name__)
+
+# On-disk graph artifact:
+#   MAGIC | uint32 header length | JSON header | 8 byte aligned sections
+# The header maps every section name to [offset, typecode, count], so a loader can
+# memory-map the file and expose each section as a typed memoryview without copying.
+MAGIC = b"NBGRAPH\0"
+FORMAT_VERSION = 1
+GRAPH_DIR = "graphs"
+
+
+def graph_artifact_path(name):
+    return os.path.join(GRAPH_DIR, f"{name or 'default'}.nbg")
+
+
+def _encode_strings(strings):
+    blob = bytearray()
+    offsets = array("i", [0])
+    for s in strings:
+        blob += s.encode("utf-8")
+        offsets.append(len(blob))
+    return array("B", bytes(blob)), offsets
+
+
+def save_graph_artifact(G, node_data, path):
+    """Serialize a road graph built by osm_to_graph into a compact binary artifact."""
+    nodes = list(G.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    names = StringTable()
+    street_sets = StringTable()  # interns sorted tuples of name ids
+
+    def street_set_id(streets):
+        return street_sets.intern(tuple(sorted(names.intern(s) for s in streets)))
+
+    lon = array("d")
+    lat = array("d")
+    elevation = array("d")
+    node_streets = array("i")
+    node_highway = array("i")
+    for node in nodes:
+        info = node_data.get(node, {})
+        lon.append(info.get("longitude", node[0]))
+        lat.append(info.get("latitude", node[1]))
+        elevation.append(info.get("elevation", 0.0))
+        node_streets.append(street_set_id(info.get("streets", ())))
+        node_highway.append(names.intern(info.get("highway", "unknown")))
+
+    # every undirected edge is stored as two arcs
+    indptr = array("i", [0])
+    indices = array("i")
+    distance = array("d")
+    slope = array("d")
+    weight = array("d")
+    arc_streets = array("i")
+    for node in nodes:
+        for neighbor, data in G.adj[node].items():
+            indices.append(index[neighbor])
+            distance.append(data.get("distance", 0.0))
+            slope.append(data.get("slope", 0.0))
+            weight.append(data.get("weight", 0.0))
+            arc_streets.append(street_set_id(data.get("streets", ())))
+        indptr.append(len(indices))
+
+    set_indptr = array("i", [0])
+    set_members = array("i")
+    for members in street_sets.strings:
+        set_members.extend(members)
+        set_indptr.append(len(set_members))
+    names_blob, names_offsets = _encode_strings(names.strings)
+
+    sections = {
+        "lon": lon, "lat": lat, "elevation": elevation,
+        "node_streets": node_streets, "node_highway": node_highway,
+        "indptr": indptr, "indices": indices,
+        "distance": distance, "slope": slope, "weight": weight,
+        "arc_streets": arc_streets,
+        "street_set_indptr": set_indptr, "street_set_members": set_members,
+        "names_blob": names_blob, "names_offsets": names_offsets,
+    }
+    write_sections(path, sections, {"num_nodes": len(nodes), "num_arcs": len(indices)})
+    logger.info("💾 Saved graph artifact with %d nodes and %d edges to %s", len(nodes), len(indices) // 2, path)
+
+
+def write_sections(path, sections, meta):
+    """Write named arrays to path in the artifact layout, with meta merged into the header."""
+    layout = {}
+    offset = 0
+    for name, arr in sections.items():
+        layout[name] = [offset, arr.typecode, len(arr)]
+        offset += -(-len(arr) * arr.itemsize // 8) * 8
+    header = {"version": FORMAT_VERSION, "byteorder": sys.byteorder, "sections": layout, **meta}
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 4 + len(header_bytes)) // 8) * 8
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        for name, arr in sections.items():
+            f.seek(data_start + layout[name][0])
+            arr.tofile(f)
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def map_sections(path):
+    """Memory-map a file written by write_sections. Returns (header, {name: memoryview})."""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    buf = memoryview(mapped)
+    if bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"❌ {path} is not a graph artifact")
+    (header_len,) = struct.unpack_from("<I", buf, len(MAGIC))
+    header_end = len(MAGIC) + 4 + header_len
+    header = json.loads(bytes(buf[len(MAGIC) + 4:header_end]))
+    if header["version"] != FORMAT_VERSION or header["byteorder"] != sys.byteorder:
+        raise ValueError(f"❌ Unsupported graph artifact {path}")
+    data_start = -(-header_end // 8) * 8
+
+    sections = {}
+    for name, (offset, typecode, count) in header["sections"].items():
+        start = data_start + offset
+        size = count * array(typecode).itemsize
+        sections[name] = buf[start:start + size].cast(typecode)
+    return header, sections
+
+
+class GraphArtifact:
+    """A memory-mapped graph artifact. Every section is a read-only typed memoryview."""
+
+    def __init__(self, path):
+        self.path = path
+        self.header, sections = map_sections(path)
+        self.num_nodes = self.header["num_nodes"]
+        self.num_arcs = self.header["num_arcs"]
+        for name, view in sections.items():
+            setattr(self, name, view)
+
+        blob = bytes(self.names_blob)
+        self.names = [blob[self.names_offsets[i]:self.names_offsets[i + 1]].decode("utf-8")
+                      for i in range(len(self.names_offsets) - 1)]
+
+    def coord(self, i):
+        return self.lon[i], self.lat[i]
+
+    def street_set(self, set_id):
+        start, end = self.street_set_indptr[set_id], self.street_set_indptr[set_id + 1]
+        return {self.names[self.street_set_members[k]] for k in range(start, end)}
+
+    def to_node_table(self):
+        """The node_data of the graph, with node ids matching the artifact's."""
+        node_data = NodeTable()
+        for i in range(self.num_nodes):
+            node_data.add(self.coord(i), self.lat[i], self.lon[i], self.elevation[i],
+                          self.street_set(self.node_streets[i]), self.names[self.node_highway[i]])
+        return node_data
+
+
+def load_graph_artifact(path):
+    artifact = GraphArtifact(path)
+    logger.info("📂 Loaded graph artifact with %d nodes from %s", artifact.num_nodes, path)
+    return artifact
+
+
+if __name__ == "__main__":
+    from work_calculate_ways.geoCoding import get_bbox_from_city_name
+    from work_calculate_ways.osm import stream_osm_data_bbox, elements_to_graph
+    from work_calculate_ways.osmStream import iter_file_elements
+    from city import city_name
+
+    # python graphStore.py [city name | overpass.json] [artifact path]
+    name = sys.argv[1] if len(sys.argv) > 1 else city_name
+    if name.endswith(".json"):
+        elements = iter_file_elements(name)
+        name = os.path.splitext(os.path.basename(name))[0]
+    else:
+        bbox = get_bbox_from_city_name(name)
+        if not bbox:
+            sys.exit(f"❌ No bounding box found for '{name}'")
+        elements = stream_osm_data_bbox(*bbox)
+        if elements is None:
+            sys.exit(f"❌ Failed to fetch OSM data for '{name}'")
+    G, node_data = elements_to_graph(elements)
+    save_graph_artifact(G, node_data, sys.argv[2] if len(sys.argv) > 2 else graph_artifact_path(name))
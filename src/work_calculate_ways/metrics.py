@@ -0,0 +1,149 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Timing spans and search counters, kept as in-process histograms and rendered in the
+# Prometheus text format for GET /metrics. A span times one stage of a request; the
+# search counters of everything that runs inside it are added to it, and the finished
+# span is logged at DEBUG. METRICS=0 turns spans into no-ops. The event counters of the
+# in-process caches are rendered alongside, as registered by each cache module.
+ENABLED = os.environ.get("METRICS", "1") != "0"
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (10, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for label_values, values in series:
+            labels = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, label_values))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {values[-1]}')
+            braced = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{braced} {values[-2]}")
+            lines.append(f"{self.name}_count{braced} {values[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("bike_stage_duration_seconds", "Duration of each stage of a request.",
+                          ("stage",), SECONDS_BUCKETS)
+SEARCH_EXPANDED = Histogram("bike_search_nodes_expanded", "Nodes (or labels) settled per graph search.",
+                            ("search",), COUNT_BUCKETS)
+SEARCH_PUSHES = Histogram("bike_search_heap_pushes", "Heap pushes per graph search.",
+                          ("search",), COUNT_BUCKETS)
+HISTOGRAMS = [STAGE_SECONDS, SEARCH_EXPANDED, SEARCH_PUSHES]
+CACHE_EVENTS = "bike_cache_events_total"
+
+_caches = {}  # cache name -> (event counts dict, lock it is updated under)
+
+_local = threading.local()
+
+
+class Span:
+    def __init__(self, stage):
+        self.stage = stage
+        self.counters = {}
+        self.seconds = None
+
+
+@contextmanager
+def span(stage):
+    """with span("simplify"): ... times the block into the stage histogram."""
+    if not ENABLED:
+        yield None
+        return
+    current = Span(stage)
+    stack = getattr(_local, "spans", None)
+    if stack is None:
+        stack = _local.spans = []
+    stack.append(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - started
+        stack.pop()
+        STAGE_SECONDS.observe(current.seconds, stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            counters = "".join(f" {name}={value}" for name, value in current.counters.items())
+            logger.debug("⏱️ %s took %.1f ms%s", stage, current.seconds * 1000, counters)
+
+
+def timed(stage):
+    """Decorator form of span."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_search(search, expanded, pushes):
+    """Counters of one finished search, added to the histograms and to the innermost open span."""
+    if not ENABLED:
+        return
+    SEARCH_EXPANDED.observe(expanded, search)
+    SEARCH_PUSHES.observe(pushes, search)
+    stack = getattr(_local, "spans", None)
+    if stack:
+        counters = stack[-1].counters
+        counters[f"{search}_expanded"] = counters.get(f"{search}_expanded", 0) + expanded
+        counters[f"{search}_pushes"] = counters.get(f"{search}_pushes", 0) + pushes
+
+
+def register_cache(name, counts, lock):
+    """Export a cache's {event: count} dict, which it only updates under lock, as counters."""
+    _caches[name] = (counts, lock)
+
+
+def _render_caches():
+    lines = [f"# HELP {CACHE_EVENTS} Hits, misses, evictions and other events of the in-process caches.",
+             f"# TYPE {CACHE_EVENTS} counter"]
+    for name, (counts, lock) in sorted(_caches.items()):
+        with lock:
+            counts = dict(counts)
+        for event, value in counts.items():
+            lines.append(f'{CACHE_EVENTS}{{cache="{name}",event="{event}"}} {value}')
+    return lines
+
+
+def render():
+    """All histograms and cache counters in the Prometheus text exposition format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.extend(_render_caches())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,247 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+
+# node_data as a struct of arrays: every (lon, lat) node gets a small integer id that
+# indexes parallel arrays of latitude, longitude, elevation and highway, and a run of
+# interned street name ids in one flat array. A node costs a few dozen bytes instead of
+# a dict and a set of its own. Street sets of edges are interned too, so every edge of a
+# street shares one frozenset. A finished table can be sorted by (lon, lat), which drops
+# the dict from node to id as well (sorted_by_node). Lookups return NodeRecord views
+# that read like the old per-node dicts:
+#   node_data[node]["elevation"], node_data.get(node, {}).get("streets", ())
+FIELDS = ("latitude", "longitude", "elevation", "streets", "highway")
+
+
+class StringTable:
+    """Interns strings to small integer ids."""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, s):
+        if s not in self.ids:
+            self.ids[s] = len(self.strings)
+            self.strings.append(s)
+        return self.ids[s]
+
+
+class NodeRecord(Mapping):
+    """Read/write view of one node of a NodeTable, with the keys of the old node_data dicts."""
+    __slots__ = ("table", "id")
+
+    def __init__(self, table, node_id):
+        self.table = table
+        self.id = node_id
+
+    def __getitem__(self, key):
+        table, i = self.table, self.id
+        if key == "latitude":
+            return table.lat[i]
+        if key == "longitude":
+            return table.lon[i]
+        if key == "elevation":
+            return table.elevation[i]
+        if key == "streets":
+            return table.node_streets(i)
+        if key == "highway":
+            return table.names.strings[table.highway[i]]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self.table.set_field(self.id, key, value)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class SortedNodeIds(Mapping):
+    """(lon, lat) -> id of a table whose lon/lat arrays are sorted by (lon, lat)."""
+    __slots__ = ("lon", "lat")
+
+    def __init__(self, lon, lat):
+        self.lon = lon
+        self.lat = lat
+
+    def __getitem__(self, node):
+        try:
+            lon, lat = node
+        except (TypeError, ValueError):
+            raise KeyError(node) from None
+        lons, lats = self.lon, self.lat
+        start = bisect_left(lons, lon)
+        end = bisect_right(lons, lon, start)
+        i = bisect_left(lats, lat, start, end)
+        if i < end and lats[i] == lat:
+            return i
+        raise KeyError(node)
+
+    def __iter__(self):
+        return zip(self.lon, self.lat)
+
+    def __len__(self):
+        return len(self.lon)
+
+
+class NodeTable(Mapping):
+    """node -> NodeRecord mapping over parallel arrays. See the module comment."""
+
+    def __init__(self, names=None, street_sets=None):
+        self.ids = {}  # (lon, lat) -> node id, in insertion order
+        self.lat = array("d")
+        self.lon = array("d")
+        self.elevation = array("d")
+        self.highway = array("i")
+        # the streets of node i are street_names[street_start[i]:street_start[i] + street_count[i]]
+        self.street_start = array("i")
+        self.street_count = array("H")
+        self.street_names = array("i")
+        # tables may be shared with the table a subset was taken from; they only grow
+        self.names = StringTable() if names is None else names
+        self.street_sets = StringTable() if street_sets is None else street_sets  # sorted tuples of name ids
+        self._frozen = {}  # street set id -> frozenset, shared by every edge with that set
+
+    # ---- building ----
+
+    def add(self, node, latitude, longitude, elevation=0.0, streets=(), highway="unknown"):
+        """Add a node, or overwrite all of its fields. Returns its id."""
+        i = self.ids.get(node)
+        if i is None:
+            i = self.ids[node] = len(self.lat)
+            self.lat.append(latitude)
+            self.lon.append(longitude)
+            self.elevation.append(elevation)
+            self.highway.append(self.names.intern(highway))
+            self.street_start.append(0)
+            self.street_count.append(0)
+        else:
+            self.lat[i], self.lon[i], self.elevation[i] = latitude, longitude, elevation
+            self.highway[i] = self.names.intern(highway)
+        self._set_streets(i, {self.names.intern(s) for s in streets})
+        return i
+
+    def _set_streets(self, i, name_ids):
+        # a new run at the end; a replaced run is left behind unused
+        self.street_start[i] = len(self.street_names)
+        self.street_count[i] = len(name_ids)
+        self.street_names.extend(name_ids)
+
+    def add_street(self, i, name):
+        name_id = self.names.intern(name)
+        start, count = self.street_start[i], self.street_count[i]
+        run = self.street_names[start:start + count]
+        if name_id in run:
+            return
+        if start + count == len(self.street_names):
+            self.street_names.append(name_id)
+            self.street_count[i] = count + 1
+        else:
+            self._set_streets(i, run.tolist() + [name_id])
+
+    def set_field(self, i, key, value):
+        if key == "latitude":
+            self.lat[i] = value
+        elif key == "longitude":
+            self.lon[i] = value
+        elif key == "elevation":
+            self.elevation[i] = value
+        elif key == "streets":
+            self._set_streets(i, {self.names.intern(s) for s in value})
+        elif key == "highway":
+            self.highway[i] = self.names.intern(value)
+        else:
+            raise KeyError(key)
+
+    def subset(self, nodes):
+        """A new table with only the given nodes, sharing this table's string tables."""
+        table = NodeTable(self.names, self.street_sets)
+        for node in nodes:
+            i = self.ids.get(node)
+            if i is None:
+                continue
+            table.ids[node] = len(table.lat)
+            table._append_row(self, i)
+        return table
+
+    def sorted_by_node(self):
+        """
+        A copy ordered by (lon, lat), whose ids are found by binary search over its
+        lon/lat arrays instead of a dict holding a tuple per node (see SortedNodeIds).
+        No nodes can be added to the copy. Returns (table, order), where order[i] is
+        the id in this table of node i of the copy.
+        """
+        lon, lat = self.lon, self.lat
+        order = sorted(range(len(lon)), key=lambda i: (lon[i], lat[i]))
+        table = NodeTable(self.names, self.street_sets)
+        for i in order:
+            table._append_row(self, i)
+        table.ids = SortedNodeIds(table.lon, table.lat)
+        return table, order
+
+    def _append_row(self, other, i):
+        self.lat.append(other.lat[i])
+        self.lon.append(other.lon[i])
+        self.elevation.append(other.elevation[i])
+        self.highway.append(other.highway[i])
+        start, count = other.street_start[i], other.street_count[i]
+        self.street_start.append(len(self.street_names))
+        self.street_count.append(count)
+        self.street_names.extend(other.street_names[start:start + count])
+
+    # ---- streets ----
+
+    def node_streets(self, i):
+        start = self.street_start[i]
+        names = self.names.strings
+        return frozenset(names[k] for k in self.street_names[start:start + self.street_count[i]])
+
+    def street_set_id(self, streets):
+        return self.street_sets.intern(tuple(sorted({self.names.intern(s) for s in streets})))
+
+    def with_street(self, set_id, name):
+        """Id of the street set set_id plus name."""
+        members = self.street_sets.strings[set_id]
+        name_id = self.names.intern(name)
+        if name_id in members:
+            return set_id
+        return self.street_sets.intern(tuple(sorted(members + (name_id,))))
+
+    def street_set(self, set_id):
+        names = self.names.strings
+        return frozenset(names[k] for k in self.street_sets.strings[set_id])
+
+    def shared_street_set(self, set_id):
+        """street_set, built once per id, for edge attributes."""
+        streets = self._frozen.get(set_id)
+        if streets is None:
+            streets = self._frozen[set_id] = self.street_set(set_id)
+        return streets
+
+    # ---- mapping ----
+
+    def __getitem__(self, node):
+        return NodeRecord(self, self.ids[node])
+
+    def __setitem__(self, node, info):
+        self.add(node, info["latitude"], info["longitude"], info.get("elevation", 0.0),
+                 info.get("streets", ()), info.get("highway", "unknown"))
+
+    def get(self, node, default=None):
+        i = self.ids.get(node)
+        return default if i is None else NodeRecord(self, i)
+
+    def __contains__(self, node):
+        return node in self.ids
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
@@ -1,64 +1,63 @@
 import requests
 import networkx as nx
+import numpy as np
+from array import array
 from math import sqrt, radians, sin, cos, asin, degrees, atan
 
 import city
+from work_calculate_ways import osmCache, osmStream, elevationFetch, geometry
+from work_calculate_ways.csrGraph import CSRGraph
+from work_calculate_ways.elevationIndex import ElevationIndex
+from work_calculate_ways.metrics import span, timed
+from work_calculate_ways.nodeTable import NodeTable
+from work_calculate_ways.spatialIndex import get_spatial_index
 from city import city_name
-import os
-import json
-import time
+import logging
 
-def fetch_osm_data_bbox(min_lat, min_lon, max_lat, max_lon):
-    query = f"""
-    [out:json];
-    (
+logger = logging.getLogger(__name__)
+
+OVERPASS_URL = "http://overpass-api.de/api/interpreter"
+# Overpass's own default query timeout; requests applies it to the connect and to every read
+OVERPASS_TIMEOUT_SECONDS = 180
+# meters; nodes with no elevation sample this close keep 0.0
+ELEVATION_FILL_DISTANCE = 200
+
+def build_overpass_query(bboxes):
+    ways = "".join(f"""
       way["highway"~"cycleway|residential|tertiary|secondary|primary"]
       ["bicycle"!~"no"]
-      ["access"!~"private"]({min_lat},{min_lon},{max_lat},{max_lon});
+      ["access"!~"private"]({min_lat},{min_lon},{max_lat},{max_lon});"""
+                   for min_lat, min_lon, max_lat, max_lon in bboxes)
+    return f"""
+    [out:json];
+    ({ways}
     );
     out geom;
     """
-    response = requests.get("http://overpass-api.de/api/interpreter", params={"data": query})
+
+def stream_osm_data_bboxes(bboxes):
+    """
+    Fetch the road ways of several bboxes from Overpass in a single request, as an
+    iterator over the elements parsed while the body downloads, or None on failure.
+    """
+    query = build_overpass_query(bboxes)
+    try:
+        response = requests.get(OVERPASS_URL, params={"data": query}, stream=True,
+                                timeout=OVERPASS_TIMEOUT_SECONDS)
+    except requests.RequestException as e:
+        logger.error("❌ Failed to fetch data: %s", e)
+        return None
     if response.status_code == 200:
-        return response.json()
+        return osmStream.iter_elements(response.iter_content(osmStream.CHUNK_SIZE))
     else:
-        print("❌ Failed to fetch data:", response.text)
+        logger.error("❌ Failed to fetch data: %s", response.text)
         return None
 
-def fetch_elevation_data(coords):
-    url = "https://api.open-elevation.com/api/v1/lookup"
-    results = {}
-    if os.path.exists("elevation.json"):
-        with open("elevation.json", "r") as f:
-            existing_data = json.load(f)
-    else:
-        existing_data = {}
-    def chunked(lst, size=1000):
-        for i in range(0, len(lst), size):
-            yield lst[i:i + size]
-
-    for batch in chunked(coords, 1000):
-        locations = [{"latitude": lat, "longitude": lon} for lon, lat in batch]
-        try:
-            print(f"🌍 Fetching elevation for {len(locations)} points...")
-            response = requests.post(url, json={"locations": locations}, timeout=10)
-            if response.status_code == 200:
-                data = response.json().get("results", [])
-                for item in data:
-                    coord = (item["longitude"], item["latitude"])
-                    results[coord] = item["elevation"]
-                    existing_data[str(coord)] = item["elevation"]
-                print(f"✅ Successfully fetched {len(data)} elevations.")
-            else:
-                print(f"❌ Failed to fetch elevation data (status {response.status_code}):", response.text)
-        except Exception as e:
-            print("❌ Elevation API error:", str(e))
-        with open("elevation.json", "w") as f:
-            json.dump(existing_data, f)
-
-        time.sleep(1)  # Delay to avoid getting blocked
+def stream_osm_data_bbox(min_lat, min_lon, max_lat, max_lon):
+    return osmCache.stream_osm_data_bbox(min_lat, min_lon, max_lat, max_lon, stream_osm_data_bboxes)
 
-    return results
+def fetch_elevation_data(coords):
+    return elevationFetch.fetch_missing_elevations(coords)
 
 def haversine_distance(coord1, coord2):
     lon1, lat1 = map(radians, coord1)
@@ -78,152 +77,409 @@ def calculate_slope(coord1, coord2, elevation1, elevation2):
     slope_angle = degrees(atan(elevation_diff / horizontal_distance))
     return slope_angle
 
+class GraphBuilder:
+    """
+    Builds a road graph from Overpass ways fed one at a time, so ways can be parsed
+    from a stream and dropped right away. Nodes and edges are collected as they come;
+    elevations of the pending nodes are fetched once, in build().
+    """
+
+    def __init__(self):
+        self.node_data = NodeTable()
+        self.edges = {}  # (u, v) -> street set id in node_data
+        self.pending = set()
+
+    def add_way(self, element):
+        if element.get("type") != "way" or "geometry" not in element:
+            return
+        street_name = element.get("tags", {}).get("name", "unknown")
+        highway_type = element.get("tags", {}).get("highway", "unknown")
+        node_data, ids = self.node_data, self.node_data.ids
+        street_set = node_data.street_set_id((street_name,))
+        previous = None
+        for coord in element["geometry"]:
+            node = (coord["lon"], coord["lat"])
+            i = ids.get(node)
+            if i is None:
+                node_data.add(node, coord["lat"], coord["lon"], 0.0, (street_name,), highway_type)
+                self.pending.add(node)
+            else:
+                node_data.add_street(i, street_name)
+            if previous is not None:
+                # edges are kept smaller node first, the orientation climb/descent are measured in
+                u, v = (previous, node) if previous < node else (node, previous)
+                known = self.edges.get((u, v))
+                self.edges[u, v] = street_set if known is None else node_data.with_street(known, street_name)
+            previous = node
+
+    def add_ways(self, elements):
+        for element in elements:
+            self.add_way(element)
+        return self
+
+    def _fetch_elevations(self):
+        node_data = self.node_data
+        if self.pending:
+            with span("elevation_fetch"):
+                pending = list(self.pending)
+                elevation_data = fetch_elevation_data(pending)
+                # nodes the elevation API did not answer take the interpolated elevation of nearby nodes
+                elevations = ElevationIndex(elevation_data).lookup_many(
+                    pending, method="interpolated", default=0.0, max_distance=ELEVATION_FILL_DISTANCE)
+            ids = node_data.ids
+            for node, elevation in zip(pending, elevations):
+                node_data.elevation[ids[node]] = elevation
+            self.pending = set()
+
+    def _edge_attributes(self, edge_list):
+        # distance, slope, weight, climb and descent of all edges in one vectorized pass
+        node_data = self.node_data
+        return geometry.edge_attributes(
+            [u for u, _ in edge_list], [v for _, v in edge_list],
+            [node_data.elevation[node_data.ids[u]] for u, _ in edge_list],
+            [node_data.elevation[node_data.ids[v]] for _, v in edge_list])
+
+    def build(self):
+        node_data, edges = self.node_data, self.edges
+        self._fetch_elevations()
+
+        with span("graph_build"):
+            edge_list = list(edges)
+            attributes = self._edge_attributes(edge_list)
+            G = nx.Graph()
+            G.add_nodes_from(node_data)
+            G.add_edges_from(
+                (u, v, {"streets": node_data.shared_street_set(edges[u, v]),
+                        "distance": d, "slope": s, "weight": w, "climb": c, "descent": dc})
+                for (u, v), d, s, w, c, dc in zip(edge_list, *(a.tolist() for a in attributes)))
+
+        logger.info("✅ Built graph with %d nodes and %d edges", G.number_of_nodes(), G.number_of_edges())
+        return G, node_data
+
+    def build_csr(self):
+        """
+        Like build, but as a CSRGraph over node_data sorted by (lon, lat), so neither
+        holds a tuple or a dict entry per node (see NodeTable.sorted_by_node). Returns
+        (graph, sorted node_data); their node ids are the same.
+        """
+        edges = self.edges
+        self._fetch_elevations()
+
+        with span("graph_build"):
+            edge_list = list(edges)
+            distance, slope, weight, _, _ = self._edge_attributes(edge_list)
+            node_data, order = self.node_data.sorted_by_node()
+            new_ids = np.empty(len(order), dtype=np.int64)
+            new_ids[order] = np.arange(len(order))
+            ids = self.node_data.ids
+            ends = new_ids[np.fromiter((ids[node] for edge in edge_list for node in edge), dtype=np.int64,
+                                       count=2 * len(edge_list))].reshape(-1, 2)
+            # both arcs of every edge, grouped by their tail node
+            tails, heads = ends.ravel(), ends[:, ::-1].ravel()
+            arc_order = np.argsort(tails, kind="stable")
+            indptr = np.zeros(len(order) + 1, dtype=np.int32)
+            np.cumsum(np.bincount(tails, minlength=len(order)), out=indptr[1:])
+            street_sets = np.fromiter(edges.values(), dtype=np.int32, count=len(edge_list))
+
+            def arcs(values, typecode):
+                return array(typecode, np.repeat(values, 2)[arc_order].astype(typecode).tobytes())
+
+            G = CSRGraph(node_data.lon, node_data.lat, node_data.elevation,
+                         array("i", indptr.tobytes()), array("i", heads[arc_order].astype("i").tobytes()),
+                         arcs(distance, "d"), arcs(slope, "d"), arcs(weight, "d"),
+                         arcs(street_sets, "i"), node_data.shared_street_set, node_data.ids)
+
+        logger.info("✅ Built graph with %d nodes and %d edges", G.number_of_nodes(), G.number_of_edges())
+        return G, node_data
+
+
+def elements_to_graph(elements):
+    """Road graph from an iterable of Overpass elements, consumed in a single pass."""
+    builder = GraphBuilder()
+    # the ways stream in from Overpass or the tile cache while they are parsed, so the
+    # fetch is timed together with the parsing
+    with span("overpass_fetch"):
+        builder.add_ways(elements)
+    return builder.build()
+
+
+def elements_to_csr_graph(elements):
+    """elements_to_graph, building a CSRGraph."""
+    builder = GraphBuilder()
+    with span("overpass_fetch"):
+        builder.add_ways(elements)
+    return builder.build_csr()
+
+
 def osm_to_graph(osm_data):
-    G = nx.Graph()
-    node_data = {}
     if "elements" not in osm_data:
-        print("❌ No road data found!")
-        return G, node_data
+        logger.warning("❌ No road data found!")
+        return nx.Graph(), {}
+    return elements_to_graph(osm_data["elements"])
+
+def _is_chain_node(G, node, keep):
+    """A degree-2 node whose two edges share a street can be contracted away."""
+    if node in keep or G.degree(node) != 2 or len(G.adj[node]) != 2:
+        return False
+    first, second = G.adj[node].values()
+    return bool(first["streets"] & second["streets"])
+
+
+def _chain_edge(G, chain):
+    """Attributes of one edge replacing the path chain[0] -> ... -> chain[-1] of G."""
+    distance = weight = climb = descent = 0.0
+    max_slope = 0.0
+    streets = set()
+    for u, v in zip(chain, chain[1:]):
+        data = G.edges[u, v]
+        distance += data["distance"]
+        weight += data.get("weight", data["distance"])
+        max_slope = max(max_slope, data.get("slope", 0.0))
+        streets |= data["streets"]
+        up, down = edge_climb(u, v, data)
+        climb += up
+        descent += down
+    if chain[-1] < chain[0]:
+        climb, descent = descent, climb
+    # slope is the steepest segment, so max_slope filters stay exact on contracted edges
+    return {"streets": streets, "distance": distance, "slope": max_slope, "weight": weight,
+            "climb": climb, "descent": descent, "geometry": list(chain)}
+
+
+def _walk_chain(G, anchor, first, chain_nodes):
+    """Follow chain nodes from anchor through first until the next kept node."""
+    chain = [anchor, first]
+    previous, node = anchor, first
+    while node in chain_nodes and node != anchor:
+        next_node = next(n for n in G.adj[node] if n != previous)
+        previous, node = node, next_node
+        chain.append(node)
+    return chain
+
+
+def _csr_edge(G, coords, u, k):
+    """Attributes of arc k of a CSRGraph, from node u, as the edge dict of a networkx graph."""
+    v = G.indices[k]
+    climb, descent = geometry.climb_descent(coords[u], coords[v], G.elevation[u], G.elevation[v])
+    return {"streets": G.street_set(G.arc_street_sets[k]), "distance": G.distance[k], "slope": G.slope[k],
+            "weight": G.weight[k], "climb": climb, "descent": descent}
+
+
+def _csr_chain_edge(G, coords, chain, arcs):
+    """_chain_edge over the arcs of a CSRGraph; chain holds node ids and arcs the arc after each."""
+    distance = weight = climb = descent = 0.0
+    max_slope = 0.0
+    streets = set()
+    elevation = G.elevation
+    for u, k in zip(chain, arcs):
+        distance += G.distance[k]
+        weight += G.weight[k]
+        max_slope = max(max_slope, G.slope[k])
+        streets |= G.street_set(G.arc_street_sets[k])
+        rise = elevation[G.indices[k]] - elevation[u]
+        climb += max(rise, 0.0)
+        descent += max(-rise, 0.0)
+    if coords[chain[-1]] < coords[chain[0]]:
+        climb, descent = descent, climb
+    return {"streets": streets, "distance": distance, "slope": max_slope, "weight": weight,
+            "climb": climb, "descent": descent, "geometry": [coords[i] for i in chain]}
+
+
+def _contract_csr(G, keep, H, contract=True):
+    """
+    The contraction of simplify_graph over the integer ids and arc arrays of a CSRGraph,
+    added to the networkx graph H with (lon, lat) nodes. Without contract, every edge
+    is copied as it is.
+    """
+    indptr, indices = G.indptr, G.indices
+    coords = G.nodes
+    keep = {i for i in (G.node_id(node) for node in keep) if i is not None}
+
+    def is_chain_node(i):
+        a = indptr[i]
+        if i in keep or indptr[i + 1] - a != 2 or indices[a] == indices[a + 1]:
+            return False
+        return bool(G.street_set(G.arc_street_sets[a]) & G.street_set(G.arc_street_sets[a + 1]))
+
+    chain_nodes = {i for i in range(G.num_nodes) if is_chain_node(i)} if contract else set()
+    visited = set()
+
+    def walk(anchor, k):
+        chain, arcs = [anchor], [k]
+        previous, node = anchor, indices[k]
+        while node in chain_nodes and node != anchor:
+            a = indptr[node]
+            k = a if indices[a] != previous else a + 1
+            chain.append(node)
+            arcs.append(k)
+            previous, node = node, indices[k]
+        chain.append(node)
+        return chain, arcs
+
+    def add_piece(chain, arcs, start, end):
+        H.add_edge(coords[chain[start]], coords[chain[end]],
+                   **_csr_chain_edge(G, coords, chain[start:end + 1], arcs[start:end]))
+
+    def add_chain(chain, arcs):
+        if len(chain) == 2:
+            H.add_edge(coords[chain[0]], coords[chain[1]], **_csr_edge(G, coords, chain[0], arcs[0]))
+            return
+        visited.update(chain[1:-1])
+        u, v, last = chain[0], chain[-1], len(chain) - 1
+        if u == v:
+            # a loop: keep two of its nodes, so its three edges are all distinct
+            first, second = max(1, len(chain) // 3), max(2, 2 * len(chain) // 3)
+            add_piece(chain, arcs, 0, first)
+            add_piece(chain, arcs, first, second)
+            add_piece(chain, arcs, second, last)
+            return
+        if H.has_edge(coords[u], coords[v]) or G.arc(u, v) >= 0:
+            # a second road between the same nodes: keep its middle node
+            middle = len(chain) // 2
+            add_piece(chain, arcs, 0, middle)
+            add_piece(chain, arcs, middle, last)
+            return
+        add_piece(chain, arcs, 0, last)
 
-    all_coords = set()
-    for element in osm_data["elements"]:
-        if element["type"] == "way" and "geometry" in element:
-            for coord in element["geometry"]:
-                all_coords.add((coord["lon"], coord["lat"]))
-
-    elevation_data = fetch_elevation_data(list(all_coords))
-
-    for element in osm_data["elements"]:
-        if element["type"] == "way" and "geometry" in element:
-            street_name = element.get("tags", {}).get("name", "unknown")
-            highway_type = element.get("tags", {}).get("highway", "unknown")
-            nodes = []
-            for coord in element["geometry"]:
-                node = (coord["lon"], coord["lat"])
-                if node not in G:
-                    elevation = elevation_data.get(node, 0.0)
-                    G.add_node(node)
-                    node_data[node] = {
-                        "latitude": coord["lat"],
-                        "longitude": coord["lon"],
-                        "elevation": elevation,
-                        "streets": set(),
-                        "highway": highway_type
-                    }
-                node_data[node]["streets"].add(street_name)
-                nodes.append(node)
-
-            for i in range(len(nodes) - 1):
-                if G.has_edge(nodes[i], nodes[i + 1]):
-                    if "streets" not in G.edges[nodes[i], nodes[i + 1]]:
-                        G.edges[nodes[i], nodes[i + 1]]["streets"] = set()
-                    G.edges[nodes[i], nodes[i + 1]]["streets"].add(street_name)
-                else:
-                    G.add_edge(nodes[i], nodes[i + 1], streets={street_name})
-
-    for u, v in G.edges():
-        distance = haversine_distance(u, v)
-        elev_diff = abs(node_data[v]["elevation"] - node_data[u]["elevation"])
-        slope = calculate_slope(u, v, node_data[u]["elevation"], node_data[v]["elevation"])
-        weight = distance + elev_diff * 9
-        G.edges[u, v]["distance"] = distance
-        G.edges[u, v]["slope"] = slope
-        G.edges[u, v]["weight"] = weight
-
-    print(f"✅ Built graph with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges")
-    return G, node_data
-
-def simplify_graph(G, node_data, target_nodes=300, start_node=None, goal_node=None):
-    to_remove = []
-    remaining_nodes = G.number_of_nodes()
-    distance_threshold = 0.0001
-
-    while remaining_nodes > target_nodes:
-        print(f"Current nodes: {remaining_nodes}, targeting {target_nodes}")
-        removed_in_this_pass = False
-
-        for node in list(G.nodes):
-            if node == start_node or node == goal_node:
+    def contract_from(anchor):
+        H.add_node(coords[anchor])
+        for k in range(indptr[anchor], indptr[anchor + 1]):
+            neighbor = indices[k]
+            # a direct edge between two anchors is added from the one with the smaller id;
+            # a CSRGraph has no parallel edges, so H holds no other edge between them
+            if neighbor in visited or (neighbor not in chain_nodes and neighbor < anchor):
                 continue
-            degree = G.degree(node)
-            if degree == 2:
-                neighbors = list(G.neighbors(node))
-                if len(neighbors) != 2:
+            add_chain(*walk(anchor, k))
+
+    for anchor in range(G.num_nodes):
+        if anchor not in chain_nodes:
+            contract_from(anchor)
+    # rings made only of chain nodes have no anchor yet
+    for node in chain_nodes:
+        if node not in visited:
+            visited.add(node)
+            contract_from(node)
+
+
+@timed("simplify")
+def simplify_graph(G, node_data, target_nodes=300, start_node=None, goal_node=None, keep_nodes=()):
+    """
+    Contract every maximal chain of degree-2 nodes into a single edge, in one pass over
+    the graph. Contracted edges sum distance, weight, climb and descent along the chain, carry the
+    steepest segment as their slope and keep the chain's nodes in "geometry" (see
+    expand_path). start_node, goal_node and keep_nodes are never contracted, and
+    contraction never disconnects anything, so only the component holding start_node
+    (or the largest one) is kept. G may also be a CSRGraph, as regionCache keeps them.
+    Returns a new (networkx graph, node_data); G and node_data are left untouched.
+    """
+    keep = {node for node in (start_node, goal_node) if node is not None}
+    keep.update(keep_nodes)
+    H = nx.Graph()
+
+    if isinstance(G, CSRGraph):
+        _contract_csr(G, keep, H, contract=G.number_of_nodes() > target_nodes)
+    elif G.number_of_nodes() <= target_nodes:
+        H.add_nodes_from(G.nodes)
+        H.add_edges_from(G.edges(data=True))
+    else:
+        logger.debug("Current nodes: %d, targeting %d", G.number_of_nodes(), target_nodes)
+        chain_nodes = {node for node in G.nodes if _is_chain_node(G, node, keep)}
+        anchors = [node for node in G.nodes if node not in chain_nodes]
+        visited = set()
+
+        def add_chain(chain):
+            visited.update(chain[1:-1])
+            u, v = chain[0], chain[-1]
+            if len(chain) == 2:
+                H.add_edge(u, v, **G.edges[u, v])
+                return
+            if u == v:
+                # a loop: keep two of its nodes, so its three edges are all distinct
+                first, second = max(1, len(chain) // 3), max(2, 2 * len(chain) // 3)
+                H.add_edge(u, chain[first], **_chain_edge(G, chain[:first + 1]))
+                H.add_edge(chain[first], chain[second], **_chain_edge(G, chain[first:second + 1]))
+                H.add_edge(chain[second], v, **_chain_edge(G, chain[second:]))
+                return
+            if H.has_edge(u, v) or G.has_edge(u, v):
+                # a second road between the same nodes: keep its middle node
+                middle = len(chain) // 2
+                H.add_edge(u, chain[middle], **_chain_edge(G, chain[:middle + 1]))
+                H.add_edge(chain[middle], v, **_chain_edge(G, chain[middle:]))
+                return
+            H.add_edge(u, v, **_chain_edge(G, chain))
+
+        def contract_from(anchor):
+            H.add_node(anchor)
+            for neighbor in list(G.adj[anchor]):
+                if neighbor in visited or (neighbor not in chain_nodes and H.has_edge(anchor, neighbor)):
                     continue
-                edge1_streets = G.edges[node, neighbors[0]]["streets"]
-                edge2_streets = G.edges[node, neighbors[1]]["streets"]
-                common_streets = edge1_streets.intersection(edge2_streets)
-
-                if common_streets:
-                    pos1 = neighbors[0]
-                    pos2 = neighbors[1]
-                    dist = sqrt((pos2[0] - pos1[0]) ** 2 + (pos2[1] - pos1[1]) ** 2)
-                    if dist < distance_threshold:
-                        new_distance = haversine_distance(pos1, pos2)
-                        new_elev_diff = abs(node_data[pos2]["elevation"] - node_data[pos1]["elevation"])
-                        new_slope = calculate_slope(pos1, pos2, node_data[pos1]["elevation"],
-                                                   node_data[pos2]["elevation"])
-                        new_weight = new_distance + new_elev_diff * 9
-                        G.add_edge(pos1, pos2, streets=common_streets, distance=new_distance, slope=new_slope,
-                                   weight=new_weight)
-                        to_remove.append(node)
-                        removed_in_this_pass = True
-
-        if start_node and goal_node and removed_in_this_pass:
-            temp_graph = G.copy()
-            temp_graph.remove_nodes_from(to_remove)
-            if not nx.has_path(temp_graph, start_node, goal_node):
-                print(f"⚠️ Removing {len(to_remove)} nodes would disconnect the path. Skipping...")
-                removed_in_this_pass = False
-            else:
-                for node in to_remove:
-                    if node in node_data:
-                        del node_data[node]
-
-        if not removed_in_this_pass:
-            print("⚠️ No more nodes to remove. Increasing threshold...")
-            distance_threshold *= 2
-            if distance_threshold > 0.05:
-                print("⚠️ Maximum threshold reached. Stopping.")
-                break
-
-        if removed_in_this_pass:
-            G.remove_nodes_from(to_remove)
-            remaining_nodes = G.number_of_nodes()
-            print(f"Removed {len(to_remove)} nodes. Remaining: {remaining_nodes}")
-            to_remove = []
-
-    if not nx.is_connected(G):
-        largest_component = max(nx.connected_components(G), key=len)
-        G = G.subgraph(largest_component).copy()
-        nodes_to_keep = set(G.nodes)
-        node_data = {k: v for k, v in node_data.items() if k in nodes_to_keep}
+                add_chain(_walk_chain(G, anchor, neighbor, chain_nodes))
+
+        for anchor in anchors:
+            contract_from(anchor)
+        # rings made only of chain nodes have no anchor yet
+        for node in chain_nodes:
+            if node not in visited:
+                visited.add(node)
+                contract_from(node)
+
+    if H.number_of_nodes() and not nx.is_connected(H):
+        if start_node is not None and start_node in H:
+            component = nx.node_connected_component(H, start_node)
+        else:
+            component = max(nx.connected_components(H), key=len)
+        H = H.subgraph(component).copy()
 
     to_remove_endpoints = []
-    for node in G.nodes:
-        if node == start_node or node == goal_node:
+    for node in H.nodes:
+        if node in keep:
             continue
-        if G.degree(node) == 1:
-            neighbors = list(G.neighbors(node))
-            if len(neighbors) == 1 and G.degree(neighbors[0]) <= 2:
+        if H.degree(node) == 1:
+            neighbor = next(iter(H.adj[node]))
+            if H.degree(neighbor) <= 2:
                 to_remove_endpoints.append(node)
-    G.remove_nodes_from(to_remove_endpoints)
-    for node in to_remove_endpoints:
-        if node in node_data:
-            del node_data[node]
+    H.remove_nodes_from(to_remove_endpoints)
+
+    if isinstance(node_data, NodeTable):
+        simplified_data = node_data.subset(H.nodes)
+    else:
+        simplified_data = {node: node_data[node] for node in H.nodes if node in node_data}
+    logger.debug("✅ Final nodes: %d", H.number_of_nodes())
+    return H, simplified_data
 
-    print(f"✅ Final nodes: {G.number_of_nodes()}")
-    return G, node_data
+
+def edge_climb(u, v, data):
+    """(climb, descent) in meters when going from u to v over an edge with attributes data."""
+    climb, descent = data.get("climb", 0.0), data.get("descent", 0.0)
+    return (climb, descent) if u <= v else (descent, climb)
+
+
+def expand_path(G, path):
+    """The original road nodes along a path through a simplified graph, in order."""
+    if not path:
+        return path
+    expanded = [path[0]]
+    for u, v in zip(path[:-1], path[1:]):
+        shape = G.edges[u, v].get("geometry") if G.has_edge(u, v) else None
+        if not shape:
+            expanded.append(v)
+            continue
+        if shape[0] != u:
+            shape = shape[::-1]
+        expanded.extend(shape[1:])
+    return expanded
 
 def connect_to_nearest_node(G, node_data, point):
-    closest = min(G.nodes, key=lambda n: haversine_distance(n, point))
+    index = get_spatial_index(G)
+    closest = index.nearest(point)
     elev1 = node_data.get(point, {}).get("elevation", 0.0)
     elev2 = node_data[closest]["elevation"]
-    slope = calculate_slope(point, closest, elev1, elev2)
     distance = haversine_distance(point, closest)
-    weight = distance + abs(elev2 - elev1) * 9
+    slope = geometry.slope_angle(distance, elev2 - elev1)
+    weight = distance + abs(elev2 - elev1) * geometry.CLIMB_WEIGHT
 
     G.add_node(point)
+    index.add(point)
     node_data[point] = {
         "latitude": point[1],
         "longitude": point[0],
@@ -231,4 +487,6 @@ def connect_to_nearest_node(G, node_data, point):
         "streets": set(["virtual"]),
         "highway": "virtual"
     }
-    G.add_edge(point, closest, distance=distance, slope=slope, weight=weight, streets=set(["virtual"]))
\ No newline at end of file
+    climb, descent = geometry.climb_descent(point, closest, elev1, elev2)
+    G.add_edge(point, closest, distance=distance, slope=slope, weight=weight, climb=climb, descent=descent,
+               streets=set(["virtual"]))
\ No newline at end of file
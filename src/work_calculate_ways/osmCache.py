@@ -0,0 +1,227 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from work_calculate_ways import metrics
+
+logger = logging.getLogger(__name__)
+
+# Overpass results are cached per tile of a fixed lat/lon grid, so that any bbox
+# query can be assembled from tiles that were already fetched for earlier requests.
+CACHE_DIR = "osm_cache"
+TILE_SIZE = 0.05  # degrees
+TTL_SECONDS = 7 * 24 * 3600
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+cache_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+metrics.register_cache("osm_tile", cache_stats, _stats_lock)
+
+
+def _count(event, n=1):
+    with _stats_lock:
+        cache_stats[event] += n
+
+
+def get_cache_stats():
+    with _stats_lock:
+        return dict(cache_stats)
+
+
+def tile_key(lat, lon):
+    return math.floor(lat / TILE_SIZE), math.floor(lon / TILE_SIZE)
+
+
+def tile_bbox(key):
+    """Return (min_lat, min_lon, max_lat, max_lon) of a tile."""
+    ty, tx = key
+    return ty * TILE_SIZE, tx * TILE_SIZE, (ty + 1) * TILE_SIZE, (tx + 1) * TILE_SIZE
+
+
+def tiles_for_bbox(min_lat, min_lon, max_lat, max_lon):
+    min_ty, min_tx = tile_key(min_lat, min_lon)
+    max_ty, max_tx = tile_key(max_lat, max_lon)
+    return [(ty, tx) for ty in range(min_ty, max_ty + 1) for tx in range(min_tx, max_tx + 1)]
+
+
+def _tile_path(key):
+    return os.path.join(CACHE_DIR, f"{key[0]}_{key[1]}.jsonl")
+
+
+def element_bounds(element):
+    """Return (min_lat, min_lon, max_lat, max_lon) of a way, from Overpass bounds or its geometry."""
+    bounds = element.get("bounds")
+    if bounds:
+        return bounds["minlat"], bounds["minlon"], bounds["maxlat"], bounds["maxlon"]
+    lats = [c["lat"] for c in element.get("geometry", [])]
+    lons = [c["lon"] for c in element.get("geometry", [])]
+    if not lats:
+        return None
+    return min(lats), min(lons), max(lats), max(lons)
+
+
+def bboxes_overlap(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def open_tile(key, allow_expired=False):
+    """
+    Open a cached tile for reading. Returns an iterator over its elements, read one line
+    at a time, or None if the tile is missing or expired.
+    """
+    path = _tile_path(key)
+    try:
+        f = open(path, "r", encoding="utf-8")
+    except OSError:
+        return None
+    try:
+        header = json.loads(f.readline())
+        if not allow_expired and time.time() - header["fetched_at"] > TTL_SECONDS:
+            _count("expired")
+            f.close()
+            return None
+    except (OSError, ValueError, KeyError):
+        f.close()
+        return None
+    # mtime doubles as the last access time for LRU eviction
+    os.utime(path, None)
+
+    def elements():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    return elements()
+
+
+class TileWriter:
+    """Writes a tile one element at a time; the tile only replaces the cached one on commit()."""
+
+    def __init__(self, key):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = _tile_path(key)
+        self.tmp_path = f"{self.path}.{os.getpid()}.{id(self)}.tmp"
+        self.file = open(self.tmp_path, "w", encoding="utf-8")
+        self.file.write(json.dumps({"tile": list(key), "fetched_at": time.time()}) + "\n")
+
+    def write(self, element):
+        self.file.write(json.dumps(element, separators=(",", ":")) + "\n")
+
+    def commit(self):
+        self.file.close()
+        # atomic so that concurrent workers never read a half written tile
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+def evict():
+    """Drop expired tiles, then least recently used tiles until the cache fits MAX_CACHE_BYTES."""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    now = time.time()
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".jsonl"):
+            continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in sorted(entries):
+        expired = now - mtime > TTL_SECONDS
+        if not expired and total <= MAX_CACHE_BYTES:
+            break
+        try:
+            os.remove(path)
+            _count("evictions")
+            total -= size
+        except OSError:
+            pass
+
+
+def _save_fetched(elements, missing):
+    """Pass fetched elements through while writing each into the missing tiles it overlaps."""
+    writers = {key: TileWriter(key) for key in missing}
+    bboxes = {key: tile_bbox(key) for key in missing}
+    complete = False
+    try:
+        for element in elements:
+            bounds = element_bounds(element)
+            if bounds is None:
+                continue
+            for key, writer in writers.items():
+                if bboxes_overlap(bounds, bboxes[key]):
+                    writer.write(element)
+            yield element
+        complete = True
+    finally:
+        # a response that was cut off, or not read to the end, must not become a cached tile
+        for writer in writers.values():
+            writer.commit() if complete else writer.discard()
+    evict()
+
+
+def stream_osm_data_bbox(min_lat, min_lon, max_lat, max_lon, stream_tiles):
+    """
+    The Overpass elements of a bbox as an iterator, from cached tiles, each read line by
+    line. Missing or expired tiles are fetched in a single round trip by
+    stream_tiles(list_of_bboxes), which must return an iterator over the elements or None
+    on failure; they are written to the cache as they stream in. Returns None when
+    neither the network nor stale tiles can serve the bbox.
+    """
+    requested = (min_lat, min_lon, max_lat, max_lon)
+    keys = tiles_for_bbox(*requested)
+
+    tiles = {}
+    missing = []
+    for key in keys:
+        tile = open_tile(key)
+        if tile is None:
+            missing.append(key)
+        else:
+            tiles[key] = tile
+    _count("hits", len(tiles))
+    _count("misses", len(missing))
+
+    fetched = ()
+    if missing:
+        logger.info("🧱 OSM tile cache: %d hits, %d misses", len(tiles), len(missing))
+        stream = stream_tiles([tile_bbox(key) for key in missing])
+        if stream is None:
+            # serve stale tiles rather than failing the request
+            for key in missing:
+                stale = open_tile(key, allow_expired=True)
+                if stale is None:
+                    return None
+                tiles[key] = stale
+        else:
+            fetched = _save_fetched(stream, missing)
+
+    def elements():
+        seen = set()
+        sources = [tiles[key] for key in keys if key in tiles]
+        sources.append(fetched)
+        for source in sources:
+            for element in source:
+                element_id = (element.get("type"), element.get("id"))
+                if element_id in seen:
+                    continue
+                bounds = element_bounds(element)
+                if bounds is None or not bboxes_overlap(bounds, requested):
+                    continue
+                seen.add(element_id)
+                yield element
+    return elements()
@@ -0,0 +1,99 @@
+import codecs
+import json
+
+# Incremental reader for Overpass JSON. Only the "elements" array is walked, one
+# element at a time with JSONDecoder.raw_decode, so a response never has to be held
+# whole in memory: the buffer only keeps the element being parsed plus one chunk.
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def iter_elements(chunks):
+    """
+    Yield the elements of an Overpass JSON document given as an iterable of bytes or
+    str chunks. Raises ValueError if the document has no "elements" array, is cut off,
+    or ends with a runtime error remark.
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    def text_chunks():
+        for chunk in chunks:
+            text = utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                yield text
+        tail = utf8.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    source = text_chunks()
+    buffer = ""
+    index = 0
+
+    def more():
+        nonlocal buffer, index
+        chunk = next(source, None)
+        if chunk is None:
+            return False
+        buffer = buffer[index:] + chunk
+        index = 0
+        return True
+
+    # skip everything up to the opening bracket of the elements array
+    while True:
+        start = buffer.find('"elements"', index)
+        if start >= 0:
+            bracket = buffer.find("[", start)
+            if bracket >= 0:
+                index = bracket + 1
+                break
+            index = start
+        else:
+            # keep a tail in case the key is split between chunks
+            index = max(index, len(buffer) - len('"elements"'))
+        if not more():
+            raise ValueError("Overpass response has no elements array")
+
+    while True:
+        while index < len(buffer) and buffer[index] in _WHITESPACE + ",":
+            index += 1
+        if index == len(buffer):
+            if not more():
+                raise ValueError("Overpass response ended inside the elements array")
+            continue
+        if buffer[index] == "]":
+            _check_remark(buffer[index + 1:] + "".join(source))
+            return
+        try:
+            element, end = _decoder.raw_decode(buffer, index)
+        except json.JSONDecodeError:
+            # the element continues in the next chunk
+            if not more():
+                raise ValueError("Overpass response ended inside an element")
+            continue
+        index = end
+        yield element
+
+
+def _check_remark(tail):
+    """
+    Overpass reports runtime errors (timeouts, out of memory) in a "remark" after the
+    elements array of a 200 response, whose elements are then incomplete.
+    """
+    rest = tail.strip()
+    if rest.startswith(","):
+        rest = rest[1:]
+    try:
+        fields = json.loads("{" + rest)
+    except json.JSONDecodeError:
+        raise ValueError("Overpass response ended after the elements array")
+    remark = fields.get("remark") or ""
+    if remark.startswith("runtime error"):
+        raise ValueError(f"Overpass query failed: {remark}")
+
+
+def iter_file_elements(path, chunk_size=CHUNK_SIZE):
+    """Yield the elements of an Overpass JSON file without loading it whole."""
+    with open(path, "rb") as f:
+        yield from iter_elements(iter(lambda: f.read(chunk_size), b""))
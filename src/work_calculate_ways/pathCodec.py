@@ -0,0 +1,83 @@
+# Compact route encoding for storage and responses: the encoded polyline algorithm
+# (zigzag deltas in 5 bit chunks, as printable ASCII) at 6 decimal places, which is
+# about 10 cm. The "polyline6e" format interleaves a third value per point, the
+# elevation in decimeters.
+PRECISION = 6
+ELEVATION_FACTOR = 10
+FORMAT = "polyline6"
+FORMAT_WITH_ELEVATION = "polyline6e"
+
+
+def _encode_values(rows, factors):
+    out = []
+    previous = [0] * len(factors)
+    for row in rows:
+        for i, factor in enumerate(factors):
+            scaled = int(round(row[i] * factor))
+            value = scaled - previous[i]
+            previous[i] = scaled
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+    return "".join(out)
+
+
+def _decode_values(encoded, factors):
+    rows = []
+    previous = [0] * len(factors)
+    dimensions = len(factors)
+    index, length = 0, len(encoded)
+    row = []
+    while index < length:
+        shift = result = 0
+        while True:
+            byte = ord(encoded[index]) - 63
+            index += 1
+            result |= (byte & 0x1f) << shift
+            shift += 5
+            if byte < 0x20:
+                break
+        value = ~(result >> 1) if result & 1 else result >> 1
+        i = len(row)
+        previous[i] += value
+        row.append(previous[i] / factors[i])
+        if len(row) == dimensions:
+            rows.append(tuple(row))
+            row = []
+    return rows
+
+
+def encode_path(points, elevations=None):
+    """Encode (lat, lon) points, with one elevation per point when given."""
+    factor = 10 ** PRECISION
+    if elevations is None:
+        return _encode_values(points, (factor, factor))
+    return _encode_values(((lat, lon, elev) for (lat, lon), elev in zip(points, elevations)),
+                          (factor, factor, ELEVATION_FACTOR))
+
+
+def decode_path(encoded, with_elevation=False):
+    """(lat, lon) tuples, or (lat, lon, elevation) when encoded with elevations."""
+    factor = 10 ** PRECISION
+    factors = (factor, factor, ELEVATION_FACTOR) if with_elevation else (factor, factor)
+    return _decode_values(encoded, factors)
+
+
+def encode_route(path_coords, elevations=None):
+    """Encode a path as [{"latitude", "longitude"}] the routes return. Returns (encoded, format)."""
+    points = [(p["latitude"], p["longitude"]) for p in path_coords]
+    if elevations is None:
+        return encode_path(points), FORMAT
+    return encode_path(points, elevations), FORMAT_WITH_ELEVATION
+
+
+def decode_route(encoded, path_format):
+    """Back to [{"latitude", "longitude"}], plus "elevation" for polyline6e."""
+    if path_format == FORMAT_WITH_ELEVATION:
+        return [{"latitude": lat, "longitude": lon, "elevation": elev}
+                for lat, lon, elev in decode_path(encoded, with_elevation=True)]
+    if path_format != FORMAT:
+        raise ValueError(f"Unknown path format {path_format!r}")
+    return [{"latitude": lat, "longitude": lon} for lat, lon in decode_path(encoded)]
@@ -1,55 +1,77 @@
-import ast
-import networkx as nx
-import heapq
-import math
 from work_calculate_ways.geoCoding import (geocode_address,get_bbox_from_city_name)
 from work_calculate_ways.osm import (haversine_distance,
-                                     calculate_slope,
-                                     osm_to_graph,
-                                     fetch_osm_data_bbox,
+                                     elements_to_graph,
+                                     stream_osm_data_bbox,
                                      connect_to_nearest_node,
                                      simplify_graph,
-                                     fetch_elevation_data)
-import json
+                                     expand_path,
+                                     edge_climb)
+from work_calculate_ways.graphStore import graph_artifact_path, load_graph_artifact, save_graph_artifact
+from work_calculate_ways.csrGraph import CSRGraph
+from work_calculate_ways.contraction import attach_hierarchies
+from work_calculate_ways.search import astar, bidirectional_astar, pareto_search, shortest_path_tree, tree_path
+from work_calculate_ways.spatialIndex import nearest_node
+from work_calculate_ways.elevationIndex import get_elevation_index
+from work_calculate_ways.regionCache import add_region, graph_bbox
+from work_calculate_ways.metrics import timed
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from city import city_name
 
+logger = logging.getLogger(__name__)
+
 G = None
 node_data = None
+# הגרף המלא של העיר (ללא פישוט) בייצוג מערכים, ממופה ישירות מקובץ ה-artifact
+csr_graph = None
+# מסלולים שהטיפוס שלהם קרוב עד 5% לזה של מסלול קצר יותר לא נשמרים בחזית
+PARETO_EPSILON = 0.05
 
 def init_graph_from_city():
-    global G, node_data
-    print(f"📍 Using city_name: {city_name}")
-    bbox = get_bbox_from_city_name(city_name)
-    if not bbox or len(bbox) != 4:
-        raise ValueError(f"❌ No bounding box found for '{city_name}'")
-    min_lat, min_lon, max_lat, max_lon = bbox
-    osm_data = fetch_osm_data_bbox(min_lat, min_lon, max_lat, max_lon)
-    G, node_data = osm_to_graph(osm_data)
-    G, node_data = simplify_graph(G, node_data, target_nodes=300)
-
-def shortest_path(G, start, goal):
+    global G, node_data, csr_graph
+    logger.info("📍 Using city_name: %s", city_name)
+    artifact_path = graph_artifact_path(city_name)
+    if not os.path.exists(artifact_path):
+        bbox = get_bbox_from_city_name(city_name)
+        if not bbox or len(bbox) != 4:
+            raise ValueError(f"❌ No bounding box found for '{city_name}'")
+        min_lat, min_lon, max_lat, max_lon = bbox
+        elements = stream_osm_data_bbox(min_lat, min_lon, max_lat, max_lon)
+        if elements is None:
+            raise ValueError(f"❌ Failed to fetch OSM data for '{city_name}'")
+        G, node_data = elements_to_graph(elements)
+        save_graph_artifact(G, node_data, artifact_path)
+    artifact = load_graph_artifact(artifact_path)
+    full_node_data = artifact.to_node_table()
+    csr_graph = CSRGraph.from_artifact(artifact, full_node_data.ids)
+    attach_hierarchies(csr_graph, artifact_path)
+    # הגרף המלא של העיר משרת גם את בקשות ה-API שנופלות בתחומו
+    if full_node_data:
+        add_region(graph_bbox(full_node_data), csr_graph, full_node_data)
+    G, node_data = simplify_graph(csr_graph, full_node_data, target_nodes=300)
+
+@timed("shortest_path")
+def shortest_path(G, start, goal, bidirectional=False):
+    if isinstance(G, CSRGraph):
+        return G.shortest_path(start, goal, bidirectional)
     if start not in G or goal not in G:
-        print("⚠️ Adding start or goal node to graph since not found.")
+        logger.warning("⚠️ Adding start or goal node to graph since not found.")
         G.add_node(start)
         G.add_node(goal)
-    open_set = [(0, start, [start])]
-    g_score = {start: 0}
-    f_score = {start: haversine_distance(start, goal)}
-    while open_set:
-        _, current, path = heapq.heappop(open_set)
-        if current == goal:
-            print(f"✅ Found shortest path with {len(path)} nodes")
-            return path
-        for neighbor in G.neighbors(current):
-            edge_distance = G.edges[current, neighbor]["distance"]
-            tentative_g_score = g_score.get(current, float('inf')) + edge_distance
-            if tentative_g_score < g_score.get(neighbor, float('inf')):
-                new_path = path + [neighbor]
-                g_score[neighbor] = tentative_g_score
-                f_score[neighbor] = tentative_g_score + haversine_distance(neighbor, goal)
-                heapq.heappush(open_set, (f_score[neighbor], neighbor, new_path))
-    print("❌ No path found.")
-    return None
+
+    def neighbors(u):
+        return ((v, data["distance"]) for v, data in G.adj[u].items())
+
+    if bidirectional:
+        path, _ = bidirectional_astar(neighbors, start, goal, estimate=haversine_distance)
+    else:
+        path, _ = astar(neighbors, start, goal, heuristic=lambda v: haversine_distance(v, goal))
+    if path is None:
+        logger.warning("❌ No path found.")
+        return None
+    logger.debug("✅ Found shortest path with %d nodes", len(path))
+    return path
 
 def normalize_coordinate(coord):
     """Normalize a coordinate tuple by rounding lat and lon to 3 decimal places."""
@@ -62,14 +84,7 @@ def get_elevation_by_exact_match(node, elevation_dict):
 
 def get_elevation_by_closest_match(node, elevation_dict):
     """Find the closest elevation point in elevation_dict to the given node."""
-    min_dist = float('inf')
-    closest_elev = None
-    for coord, elev in elevation_dict.items():
-        dist = haversine_distance(node, coord)
-        if dist < min_dist:
-            min_dist = dist
-            closest_elev = elev
-    return closest_elev
+    return get_elevation_index(elevation_dict).nearest(node)[0]
 
 def get_elevation_smart(node, elevation_dict):
     """Get elevation using smart lookup with exact and closest match fallback."""
@@ -88,270 +103,163 @@ def extract_coordinates_from_node(node):
     # Add more extraction logic if node structure changes
     return node
 
-def flattest_path(G, start, goal, max_slope=float('inf'), elevation_dict=None):
+def slope_neighbors(G, max_slope=float('inf')):
+    """neighbors(u) for the search core: each edge's precomputed slope as its cost, steeper edges skipped."""
+    adj = G.adj
+
+    def neighbors(u):
+        for v, data in adj[u].items():
+            slope = data.get("slope")
+            if slope is None or slope > max_slope:
+                continue  # אם אין שיפוע בקשת או שהיא תלולה מדי, דלג
+            yield v, slope
+    return neighbors
+
+@timed("flattest_path")
+def flattest_path(G, start, goal, max_slope=float('inf'), elevation_dict=None, bidirectional=False):
+    """
+    Path with the smallest summed edge slope, using only edges no steeper than max_slope.
+    Slopes come from the graph build, so the graph is not modified; elevation_dict is
+    accepted for older callers and ignored.
+    """
+    if isinstance(G, CSRGraph):
+        return G.flattest_path(start, goal, max_slope, bidirectional)
     if start not in G or goal not in G:
-        print("⚠️ Adding start or goal node to graph since not found.")
-        G.add_node(start)
-        G.add_node(goal)
-
-    # ⬅️ עדכן elevation לכל node מה־elevation_dict
-    if elevation_dict:
-        for node in G.nodes:
-            if node in elevation_dict:
-                G.nodes[node]["elevation"] = elevation_dict[node]
-            else:
-                print(f"⚠️ Missing elevation for node {node}")
-                G.nodes[node]["elevation"] = 0
-
-    # Assign elevations smartly to nodes
-    for node in G.nodes:
-        elev = get_elevation_smart(node, elevation_dict)
-        G.nodes[node]["elevation"] = elev
-
-    # Normalize elevation values for slope calculation
-    elevations = [G.nodes[node]["elevation"] for node in G.nodes]
-    min_elev = min(elevations) if elevations else 0
-    max_elev = max(elevations) if elevations else 0
-    elev_range = max_elev - min_elev if max_elev != min_elev else 1
-
-    # Assign normalized elevation to nodes
-    for node in G.nodes:
-        norm_elev = (G.nodes[node]["elevation"] - min_elev) / elev_range
-        G.nodes[node]["norm_elevation"] = norm_elev
-
-    # ⬅️ חשב ושמור slope לכל edge
-    for u, v in G.edges():
-        elev_u = G.nodes[u].get("norm_elevation", 0)
-        elev_v = G.nodes[v].get("norm_elevation", 0)
-        dist = G.edges[u, v].get("distance", haversine_distance(u, v))
-        if dist == 0:
-            slope = 0
-        else:
-            slope = abs(elev_v - elev_u) / dist
-        # Convert slope to degrees for consistency with other functions
-        slope_degrees = math.degrees(math.atan(slope))  # convert slope (rise/run) to degrees
-        G.edges[u, v]["slope"] = slope_degrees
-
-    # ⬅️ חיפוש במסלול לפי שיפוע מצטבר
-    open_set = [(0, start, [start])]
-    g_score = {start: 0}
-    f_score = {start: 0}
-    while open_set:
-        _, current, path = heapq.heappop(open_set)
-        if current == goal:
-            slopes = [G.edges[u, v]["slope"] for u, v in zip(path[:-1], path[1:]) if G.has_edge(u, v)]
-            for i, (u, v) in enumerate(zip(path[:-1], path[1:])):
-                if G.has_edge(u, v):
-                    print(f"↪️ Segment {i + 1}: {u} -> {v}, slope = {G.edges[u, v]['slope']:.2f}°")
-            if slopes:
-                max_slope_in_path = max(slopes)
-                print(f"✅ Found flattest path. Max segment slope: {max_slope_in_path:.2f}°, Total segments: {len(slopes)}")
-            else:
-                print("⚠️ No slopes found for path segments.")
-            return path
-
-        for neighbor in G.neighbors(current):
-            if "slope" not in G.edges[current, neighbor]:
-                continue  # אם אין שיפוע בקשת, דלג
-            edge_slope = G.edges[current, neighbor]["slope"]
-            if edge_slope > max_slope:
-                continue
-            tentative_g_score = g_score.get(current, float('inf')) + edge_slope
-            if tentative_g_score < g_score.get(neighbor, float('inf')):
-                new_path = path + [neighbor]
-                g_score[neighbor] = tentative_g_score
-                f_score[neighbor] = tentative_g_score
-                heapq.heappush(open_set, (f_score[neighbor], neighbor, new_path))
-
-    print(f"❌ No path found with slope <= {max_slope:.2f} degrees.")
-    return None
-
-
-def merge_paths(shortest_path, flattest_path, G, node_data, start_node, goal_node):
-    merged_graph = nx.Graph()
-    shortest_edges = [(shortest_path[i], shortest_path[i + 1]) for i in range(len(shortest_path) - 1)]
-    flattest_edges = [(flattest_path[i], flattest_path[i + 1]) for i in range(len(flattest_path) - 1)]
-    common_edges = set(shortest_edges).intersection(flattest_edges)
-    print(f"🔗 Found {len(common_edges)} common edges")
-
-    for edge in common_edges:
-        u, v = edge
-        merged_graph.add_edge(u, v)
-        if G.has_edge(u, v):
-            merged_graph.edges[u, v]["distance"] = G.edges[u, v]["distance"]
-            merged_graph.edges[u, v]["slope"] = G.edges[u, v]["slope"]
-            merged_graph.edges[u, v]["streets"] = G.edges[u, v]["streets"]
-        merged_graph.edges[u, v]["is_path"] = True
-
-    shortest_unique = set(shortest_edges) - common_edges
-    flattest_unique = set(flattest_edges) - common_edges
-    unique_edges = shortest_unique.union(flattest_unique)
-
-    for edge in unique_edges:
-        u, v = edge
-        slope = G.edges[u, v]["slope"] if G.has_edge(u, v) else calculate_slope(
-            u, v, node_data[u]["elevation"], node_data[v]["elevation"]
-        )
-        distance = G.edges[u, v]["distance"] if G.has_edge(u, v) else haversine_distance(u, v)
-        merged_graph.add_edge(u, v, slope=slope, distance=distance)
-        if G.has_edge(u, v):
-            merged_graph.edges[u, v]["streets"] = G.edges[u, v]["streets"]
-        merged_graph.edges[u, v]["is_path"] = False
-
-    for node in list(merged_graph.nodes):
-        if merged_graph.degree(node) > 2:
-            neighbors = list(merged_graph.neighbors(node))
-            for i in range(len(neighbors)):
-                for j in range(i + 1, len(neighbors)):
-                    edge1 = (node, neighbors[i]) if (node, neighbors[i]) in merged_graph.edges else (neighbors[i], node)
-                    edge2 = (node, neighbors[j]) if (node, neighbors[j]) in merged_graph.edges else (neighbors[j], node)
-                    if edge1 in merged_graph.edges and edge2 in merged_graph.edges:
-                        slope1 = merged_graph.edges[edge1]["slope"]
-                        distance1 = merged_graph.edges[edge1]["distance"]
-                        combined_weight1 = 0.9 * slope1 + 0.1 * distance1
-                        slope2 = merged_graph.edges[edge2]["slope"]
-                        distance2 = merged_graph.edges[edge2]["distance"]
-                        combined_weight2 = 0.9 * slope2 + 0.1 * distance2
-                        if combined_weight1 > combined_weight2:
-                            merged_graph.edges[edge1]["is_path"] = False
-                            merged_graph.edges[edge2]["is_path"] = True
-                        else:
-                            merged_graph.edges[edge1]["is_path"] = True
-                            merged_graph.edges[edge2]["is_path"] = False
-
-    preferred_graph = nx.Graph()
-    for u, v, data in merged_graph.edges(data=True):
-        if data["is_path"]:
-            preferred_graph.add_edge(u, v, **data)
-
-    path_exists = False
-    if preferred_graph.has_node(start_node) and preferred_graph.has_node(goal_node):
-        try:
-            path = nx.shortest_path(preferred_graph, start_node, goal_node, weight="slope")
-            path_exists = True
-        except nx.NetworkXNoPath:
-            print("⚠️ No path between start and goal with preferred edges only. Connecting subgraphs...")
-
-    if not path_exists:
-        components = list(nx.connected_components(preferred_graph))
-        print(f"⚠️ Found {len(components)} disconnected components")
-        node_to_component = {}
-        for idx, component in enumerate(components):
-            for node in component:
-                node_to_component[node] = idx
-
-        if start_node not in preferred_graph:
-            preferred_graph.add_node(start_node)
-            node_to_component[start_node] = len(components)
-            components.append({start_node})
-        if goal_node not in preferred_graph:
-            preferred_graph.add_node(goal_node)
-            node_to_component[goal_node] = len(components)
-            components.append({goal_node})
-
-        component_graph = nx.Graph()
-        for idx in range(len(components)):
-            component_graph.add_node(idx)
-
-        all_edges = set(shortest_edges).union(flattest_edges)
-        for u, v in all_edges:
-            if u in node_to_component and v in node_to_component:
-                comp_u = node_to_component[u]
-                comp_v = node_to_component[v]
-                if comp_u != comp_v:
-                    if merged_graph.has_edge(u, v):
-                        slope = merged_graph.edges[u, v]["slope"]
-                        component_graph.add_edge(comp_u, comp_v, u=u, v=v, slope=slope,
-                                                distance=merged_graph.edges[u, v]["distance"])
+        logger.warning("⚠️ Start or goal node is not in the graph.")
+        return None
 
-        start_component = node_to_component.get(start_node, None)
-        goal_component = node_to_component.get(goal_node, None)
+    neighbors = slope_neighbors(G, max_slope)
+    if bidirectional:
+        path, _ = bidirectional_astar(neighbors, start, goal)
+    else:
+        path, _ = astar(neighbors, start, goal)
+    if path is None:
+        logger.warning("❌ No path found with slope <= %.2f degrees.", max_slope)
+        return None
 
-        if start_component is None or goal_component is None:
-            print("⚠️ Start or goal node not in any component. Falling back to shortest path...")
-            for u, v in shortest_edges:
-                if merged_graph.has_edge(u, v):
-                    merged_graph.edges[u, v]["is_path"] = True
+    # פירוט המקטעים נבנה רק כשלוג ה-DEBUG פעיל
+    if logger.isEnabledFor(logging.DEBUG):
+        slopes = [G.edges[u, v]["slope"] for u, v in zip(path[:-1], path[1:]) if G.has_edge(u, v)]
+        for i, (u, v) in enumerate(zip(path[:-1], path[1:])):
+            if G.has_edge(u, v):
+                logger.debug("↪️ Segment %d: %s -> %s, slope = %.2f°", i + 1, u, v, G.edges[u, v]['slope'])
+        if slopes:
+            logger.debug("✅ Found flattest path. Max segment slope: %.2f°, Total segments: %d",
+                         max(slopes), len(slopes))
         else:
-            open_set = [(0, start_component, [start_component])]
-            g_score = {start_component: 0}
-            f_score = {start_component: 0}
-            came_from = {}
-            while open_set:
-                _, current, path = heapq.heappop(open_set)
-                if current == goal_component:
-                    break
-                for neighbor in component_graph.neighbors(current):
-                    edge_data = component_graph.edges[current, neighbor]
-                    slope = edge_data["slope"]
-                    tentative_g_score = g_score.get(current, float('inf')) + slope
-                    if tentative_g_score < g_score.get(neighbor, float('inf')):
-                        came_from[neighbor] = (current, edge_data["u"], edge_data["v"])
-                        g_score[neighbor] = tentative_g_score
-                        f_score[neighbor] = tentative_g_score
-                        heapq.heappush(open_set, (f_score[neighbor], neighbor, path + [neighbor]))
-
-            current = goal_component
-            while current in came_from:
-                prev_component, u, v = came_from[current]
-                if merged_graph.has_edge(u, v):
-                    merged_graph.edges[u, v]["is_path"] = True
-                current = prev_component
-
-    print(f"✅ Merged graph: {merged_graph.number_of_nodes()} nodes, {merged_graph.number_of_edges()} edges")
-
-    # שמירת הגרף לקובץ JSON
-    graph_data = {
-        "nodes": [{"id": str(node), "coords": node} for node in merged_graph.nodes],
-        "edges": [{"source": str(u), "target": str(v), "is_path": data["is_path"]} for u, v, data in merged_graph.edges(data=True)]
-    }
-    with open("merged_graph.json", "w", encoding="utf-8") as f:
-        json.dump(graph_data, f, ensure_ascii=False, indent=2)
-    print("💾 Saved merged graph to merged_graph.json")
-
-    return merged_graph
-
-def get_merged_route(start_address, end_address, max_slope=float('inf')):
+            logger.debug("⚠️ No slopes found for path segments.")
+    return path
+
+
+@timed("pareto_search")
+def pareto_paths(G, start, goal, max_slope=float('inf'), epsilon=PARETO_EPSILON):
+    """
+    Every route that is not both longer and hillier than another one, using only edges
+    no steeper than max_slope, as [(path, distance, climb)] by increasing distance.
+    """
+    if isinstance(G, CSRGraph):
+        front = G.pareto_paths(start, goal, max_slope, epsilon)
+    elif start not in G or goal not in G:
+        logger.warning("⚠️ Start or goal node is not in the graph.")
+        return []
+    else:
+        adj = G.adj
+
+        def neighbors(u):
+            for v, data in adj[u].items():
+                if data.get("slope", 0.0) > max_slope:
+                    continue
+                yield v, data["distance"], edge_climb(u, v, data)[0]
+
+        front = pareto_search(neighbors, start, goal, heuristic=lambda v: haversine_distance(v, goal),
+                              epsilon=epsilon)
+    if not front:
+        logger.warning("❌ No path found with slope <= %.2f degrees.", max_slope)
+        return []
+    logger.debug("✅ Found %d Pareto-optimal routes, %.0f-%.0f m, climb %.0f-%.0f m",
+                 len(front), front[0][1], front[-1][1], front[-1][2], front[0][2])
+    return front
+
+def choose_route(front, tradeoff=0.5):
+    """
+    Pick one route of a Pareto front: tradeoff 0 is the shortest route, 1 the one with
+    the least climb, and values in between weigh both after scaling them to the front.
+    """
+    tradeoff = min(max(tradeoff, 0.0), 1.0)
+    distances = [d for _, d, _ in front]
+    climbs = [c for _, _, c in front]
+    min_d, min_c = min(distances), min(climbs)
+    range_d = (max(distances) - min_d) or 1.0
+    range_c = (max(climbs) - min_c) or 1.0
+    return min(front, key=lambda route: (1 - tradeoff) * (route[1] - min_d) / range_d
+               + tradeoff * (route[2] - min_c) / range_c)
+
+@timed("one_to_many")
+def one_to_many(G, origin, destinations, max_slope=float('inf')):
+    """
+    Shortest routes from origin to every destination out of one Dijkstra tree, using
+    only edges no steeper than max_slope. Returns {destination: (path, distance, climb)};
+    unreachable destinations are left out.
+    """
+    if origin not in G:
+        logger.warning("⚠️ Origin node is not in the graph.")
+        return {}
+    adj = G.adj
+
+    def neighbors(u):
+        for v, data in adj[u].items():
+            if data.get("slope", 0.0) <= max_slope:
+                yield v, data["distance"]
+
+    dist, pred = shortest_path_tree(neighbors, origin, [d for d in destinations if d in G])
+    routes = {}
+    for destination in destinations:
+        if destination not in dist:
+            continue
+        path = tree_path(pred, destination)
+        climb = sum(edge_climb(u, v, G.edges[u, v])[0] for u, v in zip(path[:-1], path[1:]))
+        routes[destination] = (path, dist[destination], climb)
+    logger.debug("✅ Routed %d/%d destinations from %s", len(routes), len(destinations), origin)
+    return routes
+
+def get_merged_route(start_address, end_address, max_slope=float('inf'), tradeoff=0.5):
     """קבלת מסלול ממוזג על בסיס כתובות עם שיפוע מרבי."""
     # ודא שהגרף מאותחל לפני שממשיכים
     global G, node_data
     if G is None or node_data is None:
         init_graph_from_city()
 
-    start_coords = geocode_address(start_address)
-    end_coords = geocode_address(end_address)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        start_coords, end_coords = pool.map(geocode_address, (start_address, end_address))
 
     if not start_coords or not end_coords:
-        print("❌ Failed to geocode one or both addresses.")
+        logger.warning("❌ Failed to geocode one or both addresses.")
         return None
 
     start_node = start_coords
     goal_node = end_coords
 
-    if start_node not in G:
-        connect_to_nearest_node(G, node_data, start_node)
-    else:
-        print("✅ start_node already in graph")
-
-    if goal_node not in G:
-        connect_to_nearest_node(G, node_data, goal_node)
+    if csr_graph is not None:
+        # הגרף המלא הוא לקריאה בלבד, לכן מצמידים לצומת הקרוב ביותר במקום להוסיף צומת וירטואלי
+        route_graph = csr_graph
+        start_node = nearest_node(csr_graph, start_node)
+        goal_node = nearest_node(csr_graph, goal_node)
     else:
-        print("✅ goal_node already in graph")
-
-    with open("elevation.json", "r") as f:
-        raw_elevation_data = json.load(f)
-
-    elevation_dict = {ast.literal_eval(k): v for k, v in raw_elevation_data.items()}
+        route_graph = G
+        if start_node not in G:
+            connect_to_nearest_node(G, node_data, start_node)
+        else:
+            logger.debug("✅ start_node already in graph")
 
-    shortest = shortest_path(G, start_node, goal_node)
-    flattest = flattest_path(G, start_node, goal_node, max_slope,elevation_dict)
+        if goal_node not in G:
+            connect_to_nearest_node(G, node_data, goal_node)
+        else:
+            logger.debug("✅ goal_node already in graph")
 
-    if shortest and flattest:
-        merged_graph = merge_paths(shortest, flattest, G, node_data, start_node, goal_node)
-        try:
-            final_path = nx.shortest_path(merged_graph, start_node, goal_node, weight="slope")
-            return [(node[0], node[1]) if isinstance(node, tuple) else node for node in final_path]
-        except nx.NetworkXNoPath:
-            print("❌ No final path found in merged graph.")
-            return None
-    return None
\ No newline at end of file
+    routes = pareto_paths(route_graph, start_node, goal_node, max_slope)
+    if not routes:
+        return None
+    final_path, _, _ = choose_route(routes, tradeoff)
+    if route_graph is G:
+        final_path = expand_path(G, final_path)
+    return [(node[0], node[1]) if isinstance(node, tuple) else node for node in final_path]
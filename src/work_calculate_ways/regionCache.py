@@ -0,0 +1,203 @@
+import hashlib
+import itertools
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import requests
+
+from work_calculate_ways import metrics, routeCache, streetIndex
+from work_calculate_ways.osmCache import tiles_for_bbox
+from work_calculate_ways.osm import stream_osm_data_bbox, elements_to_csr_graph
+from work_calculate_ways.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# In-process cache of built road graphs by bbox. A request is served from any cached
+# region whose bbox covers it; regions are evicted least recently used first once
+# their estimated size exceeds the memory budget. Every region gets a new version
+# number when built, and a content signature that stays the same across processes and
+# rebuilds of unchanged data, so results derived from it (routeCache) can be keyed on it.
+# Graphs are cached as CSRGraph arrays over a NodeTable sorted by node (see
+# osm.GraphBuilder.build_csr), about 200 bytes per node of a street grid.
+MEMORY_BUDGET_BYTES = int(os.environ.get("REGION_CACHE_BYTES", 512 * 1024 * 1024))
+BYTES_PER_NODE = 80  # CSRGraph/NodeTable array rows, spatial and street index entries
+BYTES_PER_EDGE = 70  # two arcs of the per-arc arrays of a CSRGraph
+
+# graphs are built with a wider margin than requests need, so nearby requests hit
+BUILD_PADDING = 0.05
+REQUEST_PADDING = 0.02
+
+
+def graph_signature(graph):
+    """
+    Content hash of a CSRGraph, from the bytes of its node arrays and of its arcs as
+    sorted tail * num_nodes + head keys. Region graphs are built with their nodes sorted
+    by (lon, lat), so the same roads give the same signature in whatever order the
+    ways arrived.
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    for arr in (graph.lon, graph.lat, graph.elevation):
+        digest.update(arr)
+    indptr = np.frombuffer(graph.indptr, dtype=np.int32)
+    tails = np.repeat(np.arange(graph.num_nodes, dtype=np.int64), np.diff(indptr))
+    arcs = tails * graph.num_nodes + np.frombuffer(graph.indices, dtype=np.int32)
+    arcs.sort()
+    digest.update(arcs)
+    return digest.hexdigest()
+
+
+class RegionGraph:
+    def __init__(self, bbox, graph, node_data, version):
+        self.bbox = bbox
+        self.graph = graph
+        self.node_data = node_data
+        self.version = version
+        self.signature = graph_signature(graph)
+        self._slope_levels = None
+        self.size_bytes = graph.number_of_nodes() * BYTES_PER_NODE + graph.number_of_edges() * BYTES_PER_EDGE
+
+    @property
+    def slope_levels(self):
+        """Sorted distinct edge slopes, for routeCache.slope_key. Built on first use."""
+        if self._slope_levels is None:
+            self._slope_levels = sorted(set(self.graph.slope))
+        return self._slope_levels
+
+    def covers(self, min_lat, min_lon, max_lat, max_lon):
+        b = self.bbox
+        return b[0] <= min_lat and b[1] <= min_lon and b[2] >= max_lat and b[3] >= max_lon
+
+
+_regions = OrderedDict()  # version -> RegionGraph, least recently used first
+_lock = threading.Lock()
+_build_locks = {}  # OSM tile set -> [lock, requests holding or waiting for it]
+_versions = itertools.count(1)
+cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+metrics.register_cache("region", cache_stats, _lock)
+
+
+def _count(event):
+    with _lock:
+        cache_stats[event] += 1
+
+
+def find_region(min_lat, min_lon, max_lat, max_lon):
+    """The smallest cached region covering the bbox, or None."""
+    with _lock:
+        covering = [r for r in _regions.values() if r.covers(min_lat, min_lon, max_lat, max_lon)]
+        if not covering:
+            return None
+        region = min(covering, key=lambda r: r.size_bytes)
+        _regions.move_to_end(region.version)
+        return region
+
+
+def add_region(bbox, graph, node_data):
+    region = RegionGraph(bbox, graph, node_data, next(_versions))
+    # שמות הרחובות של כל גרף שבמטמון משמשים לגיאוקודינג מקומי
+    streetIndex.add_streets(region.version, node_data)
+    evicted_regions = []
+    with _lock:
+        _regions[region.version] = region
+        total = sum(r.size_bytes for r in _regions.values())
+        while total > MEMORY_BUDGET_BYTES and len(_regions) > 1:
+            _, evicted = _regions.popitem(last=False)
+            total -= evicted.size_bytes
+            evicted_regions.append(evicted)
+            cache_stats["evictions"] += 1
+            logger.info("♻️ Evicted region graph v%d (%d nodes)", evicted.version, evicted.graph.number_of_nodes())
+    for evicted in evicted_regions:
+        streetIndex.remove_streets(evicted.version)
+    return region
+
+
+def graph_bbox(node_data):
+    """(min_lat, min_lon, max_lat, max_lon) of a graph's nodes."""
+    lats = [info["latitude"] for info in node_data.values()]
+    lons = [info["longitude"] for info in node_data.values()]
+    return min(lats), min(lons), max(lats), max(lons)
+
+
+def invalidate(version=None):
+    """Drop one region by version, or every cached region, with the routes computed on it."""
+    with _lock:
+        if version is None:
+            dropped = list(_regions.values())
+            _regions.clear()
+        else:
+            dropped = [r for r in (_regions.pop(version, None),) if r is not None]
+        cache_stats["invalidations"] += len(dropped)
+    for region in dropped:
+        streetIndex.remove_streets(region.version)
+        routeCache.invalidate(region.signature)
+
+
+@contextmanager
+def _building(tiles):
+    """Holds the build lock of one tile set; builds of other tile sets run concurrently."""
+    with _lock:
+        entry = _build_locks.setdefault(tiles, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _build_locks[tiles]
+
+
+def build_region_graph(min_lat, min_lon, max_lat, max_lon):
+    # הדרכים נקראות מהתגובה או מהמטמון אחת אחת ישר לתוך הגרף, בלי להחזיק את כל ה-JSON
+    try:
+        elements = stream_osm_data_bbox(min_lat, min_lon, max_lat, max_lon)
+        if elements is None:
+            return None
+        return elements_to_csr_graph(elements)
+    except (ValueError, requests.RequestException) as err:
+        # תגובה קטועה או פגומה מתגלה רק באמצע הקריאה
+        logger.warning("❌ Failed to read OSM data for %s: %s", (min_lat, min_lon, max_lat, max_lon), err)
+        return None
+
+
+@timed("region_graph")
+def get_region_graph(min_lat, min_lon, max_lat, max_lon):
+    """
+    A RegionGraph covering the bbox, built and cached on a miss. Returns None when OSM
+    data could not be fetched. Graphs without nodes are returned but not cached.
+    The graph and node_data are shared between requests and must not be mutated.
+    """
+    request_bbox = (min_lat - REQUEST_PADDING, min_lon - REQUEST_PADDING,
+                    max_lat + REQUEST_PADDING, max_lon + REQUEST_PADDING)
+    region = find_region(*request_bbox)
+    if region is not None:
+        _count("hits")
+        return region
+
+    # concurrent requests for the same new region build it once, while a slow fetch of
+    # one region does not hold up builds of others
+    bbox = (min_lat - BUILD_PADDING, min_lon - BUILD_PADDING,
+            max_lat + BUILD_PADDING, max_lon + BUILD_PADDING)
+    with _building(tuple(tiles_for_bbox(*bbox))):
+        region = find_region(*request_bbox)
+        if region is not None:
+            _count("hits")
+            return region
+        _count("misses")
+        built = build_region_graph(*bbox)
+        if built is None:
+            return None
+        graph, node_data = built
+        if not graph.number_of_nodes():
+            return RegionGraph(bbox, graph, node_data, 0)
+        return add_region(bbox, graph, node_data)
+
+
+def get_cache_stats():
+    with _lock:
+        return dict(cache_stats, regions=len(_regions), size_bytes=sum(r.size_bytes for r in _regions.values()))
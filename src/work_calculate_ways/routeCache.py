@@ -0,0 +1,140 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+from work_calculate_ways import metrics
+
+# Cache of computed route fronts, keyed on the graph they were computed on (a content
+# signature, see regionCache.graph_signature), the snapped start/goal nodes and the
+# slope limit. Searches use the exact limit the user asked for; the key uses the
+# largest edge slope of the graph within it, since every limit up to the next edge
+# slope lets the same edges through and gives the same front. Entries live in an
+# in-process LRU; when ROUTE_CACHE_DB points at a SQLite file, they are also shared
+# there between server processes.
+MAX_ENTRIES = int(os.environ.get("ROUTE_CACHE_SIZE", 10000))
+DISK_PATH = os.environ.get("ROUTE_CACHE_DB")
+DISK_MAX_ENTRIES = 200000
+
+_entries = OrderedDict()  # key -> routes, least recently used first
+_lock = threading.Lock()
+_disk_lock = threading.Lock()
+cache_stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+metrics.register_cache("route", cache_stats, _lock)
+
+
+def slope_key(max_slope, slope_levels):
+    """The cache key of a slope limit on a graph whose sorted distinct edge slopes are slope_levels."""
+    if math.isinf(max_slope):
+        return max_slope
+    i = bisect_right(slope_levels, max_slope)
+    return slope_levels[i - 1] if i else -math.inf
+
+
+def route_key(graph_key, start_node, goal_node, max_slope):
+    return f"{graph_key}|{start_node[0]!r},{start_node[1]!r}|{goal_node[0]!r},{goal_node[1]!r}|{max_slope!r}"
+
+
+def _connect():
+    conn = sqlite3.connect(DISK_PATH, timeout=30)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS route_cache (
+            key TEXT PRIMARY KEY,
+            graph TEXT NOT NULL,
+            routes TEXT NOT NULL,
+            created REAL NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS route_cache_graph ON route_cache (graph)")
+    conn.execute("CREATE INDEX IF NOT EXISTS route_cache_created ON route_cache (created)")
+    return conn
+
+
+def _remember(key, routes):
+    with _lock:
+        _entries[key] = routes
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            cache_stats["evictions"] += 1
+
+
+def _disk_get(key):
+    with _disk_lock:
+        conn = _connect()
+        try:
+            row = conn.execute("SELECT routes FROM route_cache WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+    if row is None:
+        return None
+    return [([tuple(node) for node in path], distance, climb) for path, distance, climb in json.loads(row[0])]
+
+
+def _disk_put(key, routes):
+    graph_key = key.split("|", 1)[0]
+    with _disk_lock:
+        conn = _connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO route_cache (key, graph, routes, created) VALUES (?, ?, ?, ?)",
+                         (key, graph_key, json.dumps(routes), time.time()))
+            conn.execute("DELETE FROM route_cache WHERE key IN (SELECT key FROM route_cache "
+                         "ORDER BY created DESC LIMIT -1 OFFSET ?)", (DISK_MAX_ENTRIES,))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def get(key):
+    """Cached routes for a route_key as [(path, distance, climb)], or None."""
+    with _lock:
+        routes = _entries.get(key)
+        if routes is not None:
+            _entries.move_to_end(key)
+            cache_stats["hits"] += 1
+            return routes
+    if DISK_PATH:
+        routes = _disk_get(key)
+        if routes is not None:
+            with _lock:
+                cache_stats["disk_hits"] += 1
+            _remember(key, routes)
+            return routes
+    with _lock:
+        cache_stats["misses"] += 1
+    return None
+
+
+def put(key, routes):
+    _remember(key, routes)
+    if DISK_PATH:
+        _disk_put(key, routes)
+
+
+def invalidate(graph_key=None):
+    """Drop every entry computed on one graph, or the whole cache."""
+    with _lock:
+        stale = [k for k in _entries if graph_key is None or k.split("|", 1)[0] == graph_key]
+        for k in stale:
+            del _entries[k]
+        cache_stats["invalidations"] += len(stale)
+    if DISK_PATH:
+        with _disk_lock:
+            conn = _connect()
+            try:
+                if graph_key is None:
+                    conn.execute("DELETE FROM route_cache")
+                else:
+                    conn.execute("DELETE FROM route_cache WHERE graph = ?", (graph_key,))
+                conn.commit()
+            finally:
+                conn.close()
+
+
+def get_cache_stats():
+    with _lock:
+        return dict(cache_stats, entries=len(_entries))
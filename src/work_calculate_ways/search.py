@@ -0,0 +1,198 @@
+import heapq
+
+from work_calculate_ways.metrics import record_search
+
+# Search core shared by every graph backend. A graph is described by a neighbors(u)
+# function yielding (v, cost) pairs, so the same loops serve networkx graphs, CSR
+# graphs and per-request cost functions. Paths are rebuilt from predecessor maps
+# and nodes are closed once settled, so stale heap entries are skipped. Every search
+# reports how many nodes it settled and heap entries it pushed to metrics.
+
+
+def _zero(_):
+    return 0.0
+
+
+def _path_to(pred, node):
+    path = [node]
+    while pred[node] is not None:
+        node = pred[node]
+        path.append(node)
+    path.reverse()
+    return path
+
+
+def astar(neighbors, source, target, heuristic=None):
+    """
+    A* from source to target. heuristic(v) must never overestimate the remaining
+    cost to target (plain Dijkstra when omitted). Returns (path, cost) or (None, inf).
+    """
+    if heuristic is None:
+        heuristic = _zero
+    g = {source: 0.0}
+    pred = {source: None}
+    closed = set()
+    heap = [(heuristic(source), 0.0, source)]
+    pushes = 1
+    while heap:
+        _, g_u, u = heapq.heappop(heap)
+        if u in closed:
+            continue
+        if u == target:
+            record_search("astar", len(closed) + 1, pushes)
+            return _path_to(pred, u), g_u
+        closed.add(u)
+        for v, cost in neighbors(u):
+            if v in closed:
+                continue
+            tentative = g_u + cost
+            if tentative < g.get(v, float("inf")):
+                g[v] = tentative
+                pred[v] = u
+                heapq.heappush(heap, (tentative + heuristic(v), tentative, v))
+                pushes += 1
+    record_search("astar", len(closed), pushes)
+    return None, float("inf")
+
+
+def bidirectional_astar(neighbors, source, target, estimate=None):
+    """
+    Bidirectional A* on an undirected graph, using the average potential
+    (estimate(v, target) - estimate(v, source)) / 2 so both searches stay consistent.
+    estimate(a, b) must never overestimate the cost between a and b (bidirectional
+    Dijkstra when omitted). Returns (path, cost) or (None, inf).
+    """
+    if source == target:
+        record_search("bidirectional_astar", 1, 0)
+        return [source], 0.0
+
+    def potential(v):
+        return (estimate(v, target) - estimate(v, source)) / 2 if estimate else 0.0
+
+    g = ({source: 0.0}, {target: 0.0})
+    pred = ({source: None}, {target: None})
+    closed = (set(), set())
+    # the backward search uses the negated potential
+    heaps = ([(potential(source), 0.0, source)], [(-potential(target), 0.0, target)])
+    best, meeting = float("inf"), None
+    pushes = 2
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        sign = 1 if side == 0 else -1
+        _, g_u, u = heapq.heappop(heaps[side])
+        if u in closed[side]:
+            continue
+        closed[side].add(u)
+        g_side, g_other = g[side], g[1 - side]
+        for v, cost in neighbors(u):
+            if v in closed[side]:
+                continue
+            tentative = g_u + cost
+            if tentative < g_side.get(v, float("inf")):
+                g_side[v] = tentative
+                pred[side][v] = u
+                heapq.heappush(heaps[side], (tentative + sign * potential(v), tentative, v))
+                pushes += 1
+                if v in g_other and tentative + g_other[v] < best:
+                    best, meeting = tentative + g_other[v], v
+
+    record_search("bidirectional_astar", len(closed[0]) + len(closed[1]), pushes)
+    if meeting is None:
+        return None, float("inf")
+    path = _path_to(pred[0], meeting)
+    node = meeting
+    while pred[1][node] is not None:
+        node = pred[1][node]
+        path.append(node)
+    return path, best
+
+
+def shortest_path_tree(neighbors, source, targets=None):
+    """
+    Dijkstra from source, stopping once every node in targets is settled (or the whole
+    reachable graph when omitted). Returns (dist, pred) over the settled nodes, so the
+    paths to all targets come out of one search via tree_path.
+    """
+    remaining = set(targets) if targets is not None else None
+    g = {source: 0.0}
+    pred = {source: None}
+    dist = {}
+    heap = [(0.0, source)]
+    pushes = 1
+    while heap:
+        g_u, u = heapq.heappop(heap)
+        if u in dist:
+            continue
+        dist[u] = g_u
+        if remaining is not None:
+            remaining.discard(u)
+            if not remaining:
+                break
+        for v, cost in neighbors(u):
+            if v in dist:
+                continue
+            tentative = g_u + cost
+            if tentative < g.get(v, float("inf")):
+                g[v] = tentative
+                pred[v] = u
+                heapq.heappush(heap, (tentative, v))
+                pushes += 1
+    record_search("shortest_path_tree", len(dist), pushes)
+    return dist, {node: pred[node] for node in dist}
+
+
+def tree_path(pred, node):
+    """Path from the root of a shortest_path_tree to node."""
+    return _path_to(pred, node)
+
+
+def pareto_search(neighbors, source, target, heuristic=None, epsilon=0.0):
+    """
+    Bi-criteria label-setting search trading distance against climb. neighbors(u)
+    yields (v, distance, climb) and heuristic(v) must be a consistent lower bound on
+    the remaining distance. Labels are settled by increasing distance, so a label is
+    dominated when a settled label at its node (or at target) already climbs at most
+    (1 + epsilon) times as much. epsilon > 0 thins the front and bounds label counts,
+    but the front becomes approximate, since the slack can add up along a route.
+    Returns the front as [(path, distance, climb)] by increasing distance.
+    """
+    if heuristic is None:
+        heuristic = _zero
+    threshold = 1 + epsilon
+    settled = []  # label index -> (node, parent label index)
+    best_climb = {}  # node -> climb of its last settled label
+    front = []
+    heap = [(heuristic(source), 0.0, 0.0, source, -1)]
+    pushes = 1
+    while heap:
+        _, d_u, c_u, u, parent = heapq.heappop(heap)
+        limit = c_u * threshold
+        if best_climb.get(u, float("inf")) <= limit or best_climb.get(target, float("inf")) <= limit:
+            continue
+        best_climb[u] = c_u
+        settled.append((u, parent))
+        label = len(settled) - 1
+        if u == target:
+            front.append((label, d_u, c_u))
+            continue
+        for v, distance, climb in neighbors(u):
+            c_v = c_u + climb
+            if best_climb.get(v, float("inf")) <= c_v * threshold:
+                continue
+            d_v = d_u + distance
+            heapq.heappush(heap, (d_v + heuristic(v), d_v, c_v, v, label))
+            pushes += 1
+    record_search("pareto", len(settled), pushes)
+
+    routes = []
+    for label, distance, climb in front:
+        path = []
+        while label >= 0:
+            node, label = settled[label]
+            path.append(node)
+        path.reverse()
+        routes.append((path, distance, climb))
+    return routes
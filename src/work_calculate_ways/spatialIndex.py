@@ -0,0 +1,174 @@
+from array import array
+from math import radians, sin, cos, asin, sqrt, floor, pi
+
+from work_calculate_ways.csrGraph import CSRGraph
+
+# Uniform lat/lon grid over (lon, lat) points. Nearest lookups only visit the rings
+# of cells around the query point that can still hold something closer than the
+# best match found so far.
+CELL_SIZE = 0.005  # degrees, ~500m
+EARTH_RADIUS = 6371000
+METERS_PER_DEGREE = EARTH_RADIUS * pi / 180
+
+
+def _haversine(lon1, lat1, lon2, lat2):
+    dlon = radians(lon2 - lon1)
+    dlat = radians(lat2 - lat1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * asin(sqrt(a)) * EARTH_RADIUS
+
+
+class GridIndex:
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.size = 0
+        self.max_abs_lat = 0.0
+        self.bounds = None  # (min_cy, min_cx, max_cy, max_cx)
+
+    @classmethod
+    def from_points(cls, points, items=None, cell_size=CELL_SIZE):
+        index = cls(cell_size)
+        for i, point in enumerate(points):
+            index.add(point, point if items is None else items[i])
+        return index
+
+    def _cell(self, lon, lat):
+        return floor(lat / self.cell_size), floor(lon / self.cell_size)
+
+    def add(self, point, item=None):
+        lon, lat = point
+        cy, cx = self._cell(lon, lat)
+        self.cells.setdefault((cy, cx), []).append((lon, lat, point if item is None else item))
+        self.size += 1
+        self.max_abs_lat = max(self.max_abs_lat, abs(lat))
+        if self.bounds is None:
+            self.bounds = (cy, cx, cy, cx)
+        else:
+            b = self.bounds
+            self.bounds = (min(b[0], cy), min(b[1], cx), max(b[2], cy), max(b[3], cx))
+
+    def _entries(self, cell):
+        """(lon, lat, item) of every point in cell."""
+        return self.cells.get(cell, ())
+
+    def _ring(self, cy, cx, r):
+        if r == 0:
+            yield cy, cx
+            return
+        for x in range(cx - r, cx + r + 1):
+            yield cy - r, x
+            yield cy + r, x
+        for y in range(cy - r + 1, cy + r):
+            yield y, cx - r
+            yield y, cx + r
+
+    def nearest_k(self, point, k):
+        """The k items closest to point, as a list of (distance_m, item) sorted by distance."""
+        if not self.size or k <= 0:
+            return []
+        lon, lat = point
+        cy, cx = self._cell(lon, lat)
+        min_cy, min_cx, max_cy, max_cx = self.bounds
+        max_r = max(abs(cy - min_cy), abs(cy - max_cy), abs(cx - min_cx), abs(cx - max_cx))
+        # a cell r rings away is at least (r - 1) cells away along one axis
+        cell_m = self.cell_size * METERS_PER_DEGREE * cos(radians(min(max(self.max_abs_lat, abs(lat)), 89.0)))
+        found = []
+        r = 0
+        while r <= max_r:
+            if len(found) >= k and (r - 1) * cell_m > found[k - 1][0]:
+                break
+            for cell in self._ring(cy, cx, r):
+                for plon, plat, item in self._entries(cell):
+                    found.append((_haversine(lon, lat, plon, plat), item))
+            found.sort(key=lambda x: x[0])
+            del found[k:]
+            r += 1
+        return found
+
+    def nearest(self, point):
+        found = self.nearest_k(point, 1)
+        return found[0][1] if found else None
+
+    def within_radius(self, point, radius):
+        """All items within radius meters of point, as (distance_m, item) sorted by distance."""
+        lon, lat = point
+        dlat = radius / METERS_PER_DEGREE
+        dlon = dlat / max(cos(radians(min(abs(lat) + dlat, 89.0))), 1e-6)
+        min_cy, min_cx = self._cell(lon - dlon, lat - dlat)
+        max_cy, max_cx = self._cell(lon + dlon, lat + dlat)
+        found = []
+        for y in range(min_cy, max_cy + 1):
+            for x in range(min_cx, max_cx + 1):
+                for plon, plat, item in self._entries((y, x)):
+                    d = _haversine(lon, lat, plon, plat)
+                    if d <= radius:
+                        found.append((d, item))
+        found.sort(key=lambda x: x[0])
+        return found
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        min_cy, min_cx = self._cell(min_lon, min_lat)
+        max_cy, max_cx = self._cell(max_lon, max_lat)
+        found = []
+        for y in range(min_cy, max_cy + 1):
+            for x in range(min_cx, max_cx + 1):
+                for plon, plat, item in self._entries((y, x)):
+                    if min_lat <= plat <= max_lat and min_lon <= plon <= max_lon:
+                        found.append(item)
+        return found
+
+
+class NodeGridIndex(GridIndex):
+    """
+    GridIndex over the nodes of a CSRGraph. Cells hold node ids in compact arrays and
+    coordinates are read from the graph's lon/lat arrays, so the index costs a few
+    bytes per node. Items are the (lon, lat) nodes, as with GridIndex.from_points.
+    """
+
+    def __init__(self, lon, lat, cell_size=CELL_SIZE):
+        super().__init__(cell_size)
+        self.lon = lon
+        self.lat = lat
+
+    @classmethod
+    def from_graph(cls, G, cell_size=CELL_SIZE):
+        index = cls(G.lon, G.lat, cell_size)
+        cells = index.cells
+        for i in range(G.num_nodes):
+            lon, lat = G.lon[i], G.lat[i]
+            cell = index._cell(lon, lat)
+            ids = cells.get(cell)
+            if ids is None:
+                ids = cells[cell] = array("i")
+            ids.append(i)
+            index.max_abs_lat = max(index.max_abs_lat, abs(lat))
+        index.size = G.num_nodes
+        if cells:
+            ys, xs = [y for y, _ in cells], [x for _, x in cells]
+            index.bounds = (min(ys), min(xs), max(ys), max(xs))
+        return index
+
+    def add(self, point, item=None):
+        raise TypeError("NodeGridIndex is read-only, like the CSRGraph it indexes")
+
+    def _entries(self, cell):
+        lon, lat = self.lon, self.lat
+        return ((lon[i], lat[i], (lon[i], lat[i])) for i in self.cells.get(cell, ()))
+
+
+def get_spatial_index(G):
+    """
+    The spatial index of a road graph's (lon, lat) nodes, built on first use and kept
+    on the graph so later requests reuse it. It is rebuilt if the node count changed.
+    """
+    store = G.graph if hasattr(G, "graph") else G.__dict__
+    index = store.get("spatial_index")
+    if index is None or index.size != G.number_of_nodes():
+        index = NodeGridIndex.from_graph(G) if isinstance(G, CSRGraph) else GridIndex.from_points(list(G.nodes))
+        store["spatial_index"] = index
+    return index
+
+
+def nearest_node(G, point):
+    return get_spatial_index(G).nearest(point)
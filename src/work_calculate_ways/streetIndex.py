@@ -0,0 +1,105 @@
+import threading
+from array import array
+from math import cos, radians
+
+from work_calculate_ways.geocodeCache import normalize_query
+
+# Offline geocoder over the street names already collected in node_data["streets"] of
+# the region graphs cached in this process (regionCache adds and removes them). An
+# address resolves to the node nearest the middle of its street. House numbers are not
+# known locally, so an address with one is only answered here when the whole street
+# spans at most MAX_HOUSE_NUMBER_SPAN_M; longer streets are left to Nominatim. Names
+# spread over more than MAX_STREET_SPAN_M (the same street name in two towns) are
+# ambiguous and always left to Nominatim.
+STREET_PREFIXES = {"רחוב", "רח", "street", "st"}
+MAX_STREET_SPAN_M = 5000
+MAX_HOUSE_NUMBER_SPAN_M = 300
+METERS_PER_DEGREE = 111320
+
+_streets = {}  # region key -> (node_data, {normalized street name -> array of node ids})
+_centers = {}  # normalized street name -> ((lat, lon), span in meters), or None when ambiguous
+_lock = threading.Lock()
+
+
+def normalize_street(name):
+    words = normalize_query(name).split()
+    while words and words[0] in STREET_PREFIXES:
+        words = words[1:]
+    return " ".join(words)
+
+
+def add_streets(key, node_data):
+    """Index the streets of a graph's NodeTable under key, replacing what was indexed there."""
+    streets = {}
+    for i in range(len(node_data)):
+        for street in node_data.node_streets(i):
+            if street in ("unknown", "virtual"):
+                continue
+            name = normalize_street(street)
+            if name:
+                streets.setdefault(name, array("i")).append(i)
+    with _lock:
+        _forget(_streets.pop(key, (None, {}))[1])
+        _streets[key] = (node_data, streets)
+        _forget(streets)
+
+
+def remove_streets(key):
+    """Drop the streets indexed under key, once its graph is no longer cached."""
+    with _lock:
+        _forget(_streets.pop(key, (None, {}))[1])
+
+
+def _forget(streets):
+    for name in streets:
+        _centers.pop(name, None)
+
+
+def _street_center(name):
+    nodes = {(node_data.lon[i], node_data.lat[i])
+             for node_data, streets in _streets.values() for i in streets.get(name, ())}
+    if not nodes:
+        return None
+    lons = [lon for lon, _ in nodes]
+    lats = [lat for _, lat in nodes]
+    mid_lon, mid_lat = (min(lons) + max(lons)) / 2, (min(lats) + max(lats)) / 2
+    scale = cos(radians(mid_lat))
+    span = max((max(lons) - min(lons)) * scale, max(lats) - min(lats)) * METERS_PER_DEGREE
+    if span > MAX_STREET_SPAN_M:
+        return None
+    lon, lat = min(nodes, key=lambda n: ((n[0] - mid_lon) * scale) ** 2 + (n[1] - mid_lat) ** 2)
+    return (lat, lon), span
+
+
+def lookup(address, city_name=None):
+    """
+    (lat, lon) for an address like "Street 12, City", or None when the street is not
+    indexed, is ambiguous, is too long to guess a house number on, or the address names
+    a city other than city_name.
+    """
+    parts = [normalize_query(part) for part in address.split(",")]
+    parts = [part for part in parts if part]
+    if not parts:
+        return None
+    city = normalize_query(city_name) if city_name else None
+    if any(part != city and not part.replace(" ", "").isdigit() for part in parts[1:]):
+        return None
+    has_number = any(char.isdigit() for part in parts for char in part)
+    name = normalize_street(" ".join(word for word in parts[0].split() if not word.isdigit()))
+    if not name:
+        return None
+    with _lock:
+        if name not in _centers:
+            _centers[name] = _street_center(name)
+        found = _centers[name]
+    if found is None:
+        return None
+    center, span = found
+    if has_number and span > MAX_HOUSE_NUMBER_SPAN_M:
+        return None
+    return center
+
+
+def number_of_streets():
+    with _lock:
+        return len(set().union(*(streets for _, streets in _streets.values())))